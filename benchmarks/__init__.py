@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Имитация ComfyUI и бенчмарки обработчика без GPU
+"""
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк обработчика против имитации ComfyUI (без GPU)
+
+    python -m benchmarks.bench_handler --jobs 20 --concurrency 1,2,4
+    python -m benchmarks.bench_handler --node-delay KSamplerAdvanced=0.5 --output-kb 2048 --json result.json
+
+Для каждого уровня параллельности выполняет --jobs задач через handler
+и печатает: пропускную способность, задержку задачи, накладные расходы
+обработчика (время задачи за вычетом ожидания планировщика/очереди и
+выполнения графа в ComfyUI) и пик памяти. Регрессия накладных расходов
+видна до выкатки на GPU.
+"""
+from typing import Dict, Any, List, Optional
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_comfy import FakeComfyUI
+
+DEFAULT_WORKFLOW = "wan_A14B_t2i_2+2steps"
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def load_handler(base_url: str, output_root: str):
+    """
+    Импортирует rp_handler, направленный на имитацию ComfyUI
+
+    Модуль настраивается окружением при импорте, поэтому бенчмарк
+    запускается отдельным процессом.
+    """
+    os.environ["COMFY_URL"] = base_url
+    os.environ.setdefault("RESULT_CACHE", "0")
+    os.environ.setdefault("COMFY_HEALTH_INTERVAL", "1")
+
+    import rp_handler
+    from workflows import outputs
+
+    for folder_type in ("output", "temp", "input"):
+        outputs.FOLDERS[folder_type] = os.path.join(output_root, folder_type)
+    rp_handler.workflow_registry.reload()
+    if not rp_handler.wait_for_comfy(timeout=10):
+        raise RuntimeError(f"Имитация ComfyUI не отвечает: {base_url}")
+    rp_handler.health_monitor.start()
+    rp_handler.completion_tracker.start()
+    deadline = time.time() + 10
+    while not rp_handler.completion_tracker.connected and time.time() < deadline:
+        time.sleep(0.05)
+    return rp_handler
+
+
+async def run_job(handler, index: int, workflow_name: str, stream: bool) -> Dict[str, Any]:
+    """Одна задача через handler: время, ошибка, тайминги из metadata"""
+    event = {"id": f"bench-{index}", "input": {
+        "workflow_name": workflow_name,
+        "prompt": f"benchmark prompt {index}",
+        "options": {"seed": index},
+        "stream": stream
+    }}
+    start = time.perf_counter()
+    final = None
+    async for item in handler(event):
+        final = item
+    elapsed = time.perf_counter() - start
+
+    record = {"seconds": elapsed, "error": (final or {}).get("error")}
+    timings = ((final or {}).get("metadata") or {}).get("timings")
+    if timings:
+        stages = timings["stages"]
+        waited = stages.get("schedule", 0.0) + stages.get("queue_wait", 0.0) + stages.get("execution", 0.0)
+        record["overhead"] = max(0.0, elapsed - waited)
+        record["stages"] = stages
+    return record
+
+
+async def run_level(handler, jobs: int, concurrency: int, workflow_name: str, stream: bool) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(index):
+        async with semaphore:
+            return await run_job(handler, index, workflow_name, stream)
+
+    return await asyncio.gather(*(limited(index) for index in range(jobs)))
+
+
+def summarize(records: List[Dict[str, Any]], concurrency: int, wall: float, peak: Optional[int]) -> Dict[str, Any]:
+    ok = [record for record in records if not record["error"]]
+    latencies = [record["seconds"] for record in ok]
+    overheads = [record["overhead"] for record in ok if "overhead" in record]
+    stage_names = sorted({name for record in ok for name in record.get("stages", {})})
+    return {
+        "concurrency": concurrency,
+        "jobs": len(records),
+        "failed": len(records) - len(ok),
+        "wall_seconds": round(wall, 3),
+        "throughput_jobs_per_s": round(len(ok) / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            "p95": round(_percentile(latencies, 95) * 1000, 1) if latencies else None,
+        },
+        "overhead_ms": {
+            "p50": round(statistics.median(overheads) * 1000, 1) if overheads else None,
+            "p95": round(_percentile(overheads, 95) * 1000, 1) if overheads else None,
+            "max": round(max(overheads) * 1000, 1) if overheads else None,
+        },
+        "stages_ms_p50": {
+            name: round(statistics.median(
+                record["stages"][name] for record in ok if name in record.get("stages", {})
+            ) * 1000, 1)
+            for name in stage_names
+        },
+        "python_peak_mb": round(peak / 1024 ** 2, 1) if peak is not None else None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_benchmark(
+    jobs: int = 20,
+    levels: List[int] = (1, 2, 4),
+    node_delays: Optional[Dict[str, float]] = None,
+    default_delay: float = 0.0,
+    output_kb: int = 256,
+    fail_rate: float = 0.0,
+    workflow_name: str = DEFAULT_WORKFLOW,
+    stream: bool = False,
+    trace_memory: bool = False
+) -> Dict[str, Any]:
+    """Запускает имитацию ComfyUI и прогоняет задачи на каждом уровне параллельности"""
+    root = tempfile.mkdtemp(prefix="bench-comfy-")
+    server = FakeComfyUI(
+        os.path.join(root, "output"),
+        node_delays=node_delays,
+        default_delay=default_delay,
+        fail_rate=fail_rate,
+        output_bytes=output_kb * 1024
+    )
+    base_url = server.start()
+    try:
+        rp_handler = load_handler(base_url, root)
+        results = []
+        for concurrency in levels:
+            if trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            records = asyncio.run(run_level(rp_handler.handler, jobs, concurrency, workflow_name, stream))
+            wall = time.perf_counter() - start
+            peak = None
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            results.append(summarize(records, concurrency, wall, peak))
+        return {
+            "workflow": workflow_name,
+            "stream": stream,
+            "output_kb": output_kb,
+            "node_delays": node_delays or {},
+            "default_delay": default_delay,
+            "levels": results
+        }
+    finally:
+        server.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк обработчика против имитации ComfyUI")
+    parser.add_argument("--jobs", type=int, default=20, help="Задач на каждом уровне")
+    parser.add_argument("--concurrency", default="1,2,4", help="Уровни параллельности через запятую")
+    parser.add_argument("--node-delay", action="append", default=[], metavar="CLASS=SECONDS",
+                        help="Задержка узлов класса (можно несколько раз)")
+    parser.add_argument("--default-delay", type=float, default=0.0, help="Задержка остальных узлов, сек")
+    parser.add_argument("--output-kb", type=int, default=256, help="Размер выходного файла, КБ")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Доля задач с ошибкой узла")
+    parser.add_argument("--workflow", default=DEFAULT_WORKFLOW, help="Воркфлоу реестра")
+    parser.add_argument("--stream", action="store_true", help="Потоковый режим ответа")
+    parser.add_argument("--trace-memory", action="store_true", help="Пик памяти Python через tracemalloc (медленнее)")
+    parser.add_argument("--json", help="Сохранить результат в JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    node_delays = {}
+    for item in args.node_delay:
+        class_type, _, seconds = item.partition("=")
+        node_delays[class_type] = float(seconds)
+
+    result = run_benchmark(
+        jobs=args.jobs,
+        levels=[int(level) for level in args.concurrency.split(",") if level],
+        node_delays=node_delays,
+        default_delay=args.default_delay,
+        output_kb=args.output_kb,
+        fail_rate=args.fail_rate,
+        workflow_name=args.workflow,
+        stream=args.stream,
+        trace_memory=args.trace_memory
+    )
+
+    print(f"{'conc':>4} {'jobs':>5} {'fail':>4} {'jobs/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'ovh p50':>8} {'ovh p95':>8} {'rss MB':>7}")
+    for level in result["levels"]:
+        print(
+            f"{level['concurrency']:>4} {level['jobs']:>5} {level['failed']:>4} "
+            f"{level['throughput_jobs_per_s']:>7} {level['latency_ms']['p50']!s:>8} {level['latency_ms']['p95']!s:>8} "
+            f"{level['overhead_ms']['p50']!s:>8} {level['overhead_ms']['p95']!s:>8} {level['max_rss_mb']:>7}"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
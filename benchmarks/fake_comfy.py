@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+"""
+Имитация ComfyUI для тестов и бенчмарков обработчика без GPU
+
+Реализует /prompt, /history, /queue, /ws, /view, /upload/image,
+/system_stats, /object_info и /interrupt. Узлы "выполняются" по очереди
+с заданной задержкой по class_type, события идут в сокет в том же
+порядке, что у ComfyUI (execution_start, execution_cached, executing,
+progress, executed, execution_success/execution_error), узлы с
+неизменившимися входами отмечаются как закэшированные. Узлы сохранения
+пишут собственные выходные файлы в output_dir.
+
+    server = FakeComfyUI(output_dir, node_delays={"KSamplerAdvanced": 0.5})
+    base_url = server.start()
+    ...
+    server.stop()
+"""
+from typing import Dict, Any, Optional, Iterable, List, Set
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+from aiohttp import web, WSMsgType
+
+logger = logging.getLogger(__name__)
+
+# Узлы сохранения: ключ результата в history, расширение файла и тип каталога
+OUTPUT_NODES = {
+    "SaveImage": ("images", "png", "output"),
+    "PreviewImage": ("images", "png", "temp"),
+    "VHS_VideoCombine": ("gifs", "mp4", "output"),
+    "SaveVideo": ("videos", "mp4", "output"),
+    "SaveAnimatedWEBP": ("images", "webp", "output"),
+}
+
+# Узлы с шагами: во время выполнения шлют события progress
+STEP_NODES = {"KSampler", "KSamplerAdvanced", "SamplerCustom", "SamplerCustomAdvanced"}
+
+FILE_HEADERS = {
+    "png": b"\x89PNG\r\n\x1a\n",
+    "webp": b"RIFF\x00\x00\x00\x00WEBP",
+    "mp4": b"\x00\x00\x00\x18ftypmp42",
+}
+
+
+class FakeComfyUI:
+    """
+    HTTP/WebSocket сервер с API ComfyUI, выполняющий графы по таймерам
+
+    Args:
+        output_dir: Каталог выходных файлов (type=output); temp и input - рядом
+        node_delays: Задержка узла по class_type, сек
+        default_delay: Задержка остальных узлов, сек
+        fail_nodes: class_type узлов, выполнение которых завершается ошибкой
+        fail_rate: Доля задач, падающих на случайном узле
+        output_bytes: Размер каждого выходного файла
+        vram_total: Объем "VRAM" в /system_stats
+        seed: Сид генератора для fail_rate
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        node_delays: Optional[Dict[str, float]] = None,
+        default_delay: float = 0.0,
+        fail_nodes: Iterable[str] = (),
+        fail_rate: float = 0.0,
+        output_bytes: int = 64 * 1024,
+        vram_total: int = 32 * 1024 ** 3,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        self.output_dir = output_dir
+        base = os.path.dirname(os.path.abspath(output_dir))
+        self.folders = {
+            "output": output_dir,
+            "temp": os.path.join(base, "temp"),
+            "input": os.path.join(base, "input"),
+        }
+        self.node_delays = node_delays or {}
+        self.default_delay = default_delay
+        self.fail_nodes = set(fail_nodes)
+        self.fail_rate = fail_rate
+        self.output_bytes = output_bytes
+        self.vram_total = vram_total
+        self.host = host
+        self.port = port
+
+        self.history: Dict[str, Dict[str, Any]] = {}
+        self.prompts_received = 0
+        self._random = random.Random(seed)
+        self._pending: List[Dict[str, Any]] = []
+        self._running: Optional[Dict[str, Any]] = None
+        self._number = 0
+        self._signatures: Set[str] = set()
+        self._clients: Dict[str, web.WebSocketResponse] = {}
+        self._interrupted = False
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Запуск и остановка
+    # ------------------------------------------------------------------
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> str:
+        """Запускает сервер в фоновом потоке со своим циклом событий, возвращает адрес"""
+        for folder in self.folders.values():
+            os.makedirs(folder, exist_ok=True)
+        ready = threading.Event()
+        errors: List[BaseException] = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._loop.run_until_complete(self._start())
+            except BaseException as e:  # pragma: no cover - ошибка привязки порта
+                errors.append(e)
+                ready.set()
+                return
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fake-comfy", daemon=True)
+        self._thread.start()
+        ready.wait(10)
+        if errors:
+            raise errors[0]
+        return self.base_url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._stop(), self._loop)
+        future.result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+        self._loop.close()
+        self._loop = None
+
+    async def _start(self):
+        app = web.Application(client_max_size=256 * 1024 ** 2)
+        app.router.add_post("/prompt", self.post_prompt)
+        app.router.add_get("/history", self.get_history)
+        app.router.add_get("/history/{prompt_id}", self.get_history)
+        app.router.add_get("/queue", self.get_queue)
+        app.router.add_get("/ws", self.websocket)
+        app.router.add_get("/view", self.view)
+        app.router.add_post("/upload/image", self.upload_image)
+        app.router.add_get("/system_stats", self.system_stats)
+        app.router.add_get("/object_info", self.object_info)
+        app.router.add_get("/object_info/{node_class}", self.object_info)
+        app.router.add_post("/interrupt", self.interrupt)
+        app.router.add_post("/free", self.free)
+
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.ensure_future(self._execute_loop())
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def _stop(self):
+        self._worker.cancel()
+        for ws in list(self._clients.values()):
+            await ws.close()
+        await self._runner.cleanup()
+
+    # ------------------------------------------------------------------
+    # HTTP API
+    # ------------------------------------------------------------------
+
+    async def post_prompt(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        workflow = body.get("prompt")
+        if not isinstance(workflow, dict) or not workflow:
+            return web.json_response({"error": {"type": "invalid_prompt", "message": "Пустой граф"}}, status=400)
+
+        self.prompts_received += 1
+        self._number += 1
+        item = {
+            "prompt_id": str(uuid.uuid4()),
+            "number": self._number,
+            "workflow": workflow,
+            "client_id": body.get("client_id")
+        }
+        self._pending.append(item)
+        await self._queue.put(item)
+        await self._broadcast_status()
+        return web.json_response({"prompt_id": item["prompt_id"], "number": item["number"], "node_errors": {}})
+
+    async def get_history(self, request: web.Request) -> web.Response:
+        prompt_id = request.match_info.get("prompt_id")
+        if prompt_id is not None:
+            entry = self.history.get(prompt_id)
+            return web.json_response({prompt_id: entry} if entry else {})
+        return web.json_response(self.history)
+
+    async def get_queue(self, request: web.Request) -> web.Response:
+        def row(item):
+            return [item["number"], item["prompt_id"], item["workflow"], {}, []]
+
+        return web.json_response({
+            "queue_running": [row(self._running)] if self._running else [],
+            "queue_pending": [row(item) for item in self._pending]
+        })
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        client_id = request.query.get("clientId") or uuid.uuid4().hex
+        self._clients[client_id] = ws
+        try:
+            await ws.send_str(json.dumps(self._status_message(client_id)))
+            async for message in ws:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            if self._clients.get(client_id) is ws:
+                del self._clients[client_id]
+        return ws
+
+    async def view(self, request: web.Request) -> web.StreamResponse:
+        folder = self.folders.get(request.query.get("type") or "output")
+        path = os.path.normpath(os.path.join(
+            folder or "", request.query.get("subfolder", ""), request.query.get("filename", "")
+        ))
+        if folder is None or os.path.commonpath([folder, path]) != folder or not os.path.isfile(path):
+            return web.json_response({"error": "not found"}, status=404)
+        return web.FileResponse(path)
+
+    async def upload_image(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        image = form.get("image")
+        if image is None or not hasattr(image, "file"):
+            return web.json_response({"error": "image required"}, status=400)
+        subfolder = form.get("subfolder", "")
+        directory = os.path.join(self.folders["input"], subfolder)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, image.filename), "wb") as f:
+            f.write(image.file.read())
+        return web.json_response({"name": image.filename, "subfolder": subfolder, "type": "input"})
+
+    async def system_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "system": {"os": "posix", "comfyui_version": "fake", "python_version": "", "embedded_python": False},
+            "devices": [{
+                "name": "fake", "type": "cuda", "index": 0,
+                "vram_total": self.vram_total, "vram_free": self.vram_total,
+                "torch_vram_total": 0, "torch_vram_free": 0
+            }]
+        })
+
+    async def object_info(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def interrupt(self, request: web.Request) -> web.Response:
+        self._interrupted = True
+        return web.Response()
+
+    async def free(self, request: web.Request) -> web.Response:
+        self._signatures.clear()
+        return web.Response()
+
+    # ------------------------------------------------------------------
+    # Выполнение графов
+    # ------------------------------------------------------------------
+
+    async def _execute_loop(self):
+        while True:
+            item = await self._queue.get()
+            self._pending.remove(item)
+            self._running = item
+            self._interrupted = False
+            try:
+                await self._execute(item)
+            except Exception as e:  # pragma: no cover - ошибка имитации
+                logger.error(f"Ошибка имитации выполнения: {e}")
+            finally:
+                self._running = None
+                await self._broadcast_status()
+
+    async def _execute(self, item: Dict[str, Any]):
+        prompt_id, workflow = item["prompt_id"], item["workflow"]
+        messages: List[list] = []
+
+        async def send(msg_type: str, data: Dict[str, Any], record: bool = False):
+            data = {**data, "prompt_id": prompt_id}
+            if record:
+                data["timestamp"] = int(time.time() * 1000)
+                messages.append([msg_type, data])
+            await self._send(item["client_id"], {"type": msg_type, "data": data})
+
+        signatures = self._node_signatures(workflow)
+        cached = [
+            node_id for node_id, node in workflow.items()
+            if signatures[node_id] in self._signatures and node.get("class_type") not in OUTPUT_NODES
+        ]
+        failing = self._failing_node(workflow, cached)
+
+        await send("execution_start", {}, record=True)
+        await send("execution_cached", {"nodes": cached}, record=True)
+
+        outputs: Dict[str, Any] = {}
+        for node_id, node in workflow.items():
+            if node_id in cached:
+                continue
+            class_type = node.get("class_type")
+            await send("executing", {"node": node_id, "display_node": node_id})
+            await self._run_node(node_id, class_type, send)
+
+            if self._interrupted:
+                await send("execution_interrupted", {"node_id": node_id, "node_type": class_type}, record=True)
+                self._finish(prompt_id, workflow, outputs, messages, "error")
+                return
+            if node_id == failing:
+                await send("execution_error", {
+                    "node_id": node_id, "node_type": class_type,
+                    "exception_type": "RuntimeError", "exception_message": "Имитация ошибки узла",
+                    "traceback": []
+                }, record=True)
+                self._finish(prompt_id, workflow, outputs, messages, "error")
+                return
+
+            if class_type in OUTPUT_NODES:
+                outputs[node_id] = self._write_output(node_id, node)
+                await send("executed", {"node": node_id, "display_node": node_id, "output": outputs[node_id]})
+
+        await send("executing", {"node": None})
+        await send("execution_success", {}, record=True)
+        self._signatures = set(signatures.values())
+        self._finish(prompt_id, workflow, outputs, messages, "success")
+
+    async def _run_node(self, node_id: str, class_type: str, send):
+        delay = self.node_delays.get(class_type, self.default_delay)
+        if class_type not in STEP_NODES or delay <= 0:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return
+        steps = 4
+        for step in range(1, steps + 1):
+            await asyncio.sleep(delay / steps)
+            await send("progress", {"value": step, "max": steps, "node": node_id})
+
+    def _failing_node(self, workflow: Dict[str, Any], cached: List[str]) -> Optional[str]:
+        candidates = [node_id for node_id in workflow if node_id not in cached]
+        for node_id in candidates:
+            if workflow[node_id].get("class_type") in self.fail_nodes:
+                return node_id
+        if candidates and self.fail_rate and self._random.random() < self.fail_rate:
+            return self._random.choice(candidates)
+        return None
+
+    def _write_output(self, node_id: str, node: Dict[str, Any]) -> Dict[str, Any]:
+        key, extension, folder_type = OUTPUT_NODES[node["class_type"]]
+        prefix = str((node.get("inputs") or {}).get("filename_prefix") or "ComfyUI")
+        subfolder, _, name = prefix.rpartition("/")
+        directory = os.path.join(self.folders[folder_type], subfolder)
+        os.makedirs(directory, exist_ok=True)
+
+        counter = 1
+        while os.path.exists(os.path.join(directory, f"{name}_{counter:05d}_.{extension}")):
+            counter += 1
+        filename = f"{name}_{counter:05d}_.{extension}"
+        header = FILE_HEADERS[extension]
+        with open(os.path.join(directory, filename), "wb") as f:
+            f.write(header + os.urandom(max(0, self.output_bytes - len(header))))
+        return {key: [{"filename": filename, "subfolder": subfolder, "type": folder_type}]}
+
+    def _finish(self, prompt_id, workflow, outputs, messages, status):
+        self.history[prompt_id] = {
+            "prompt": [0, prompt_id, workflow, {}, list(outputs)],
+            "outputs": outputs,
+            "status": {"status_str": status, "completed": status == "success", "messages": messages}
+        }
+
+    @staticmethod
+    def _node_signatures(workflow: Dict[str, Any]) -> Dict[str, str]:
+        """Подпись узла: class_type, значения входов и подписи узлов, от которых он зависит"""
+        signatures: Dict[str, str] = {}
+
+        def signature(node_id: str, path: frozenset) -> str:
+            if node_id in signatures:
+                return signatures[node_id]
+            node = workflow.get(node_id) or {}
+            parts = [node.get("class_type")]
+            for name, value in sorted((node.get("inputs") or {}).items()):
+                if isinstance(value, list) and len(value) == 2 and str(value[0]) in workflow and value[0] not in path:
+                    parts.append([name, signature(str(value[0]), path | {node_id}), value[1]])
+                else:
+                    parts.append([name, value])
+            signatures[node_id] = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+            return signatures[node_id]
+
+        for node_id in workflow:
+            signature(node_id, frozenset())
+        return signatures
+
+    # ------------------------------------------------------------------
+    # Сокет
+    # ------------------------------------------------------------------
+
+    def _status_message(self, client_id: Optional[str] = None) -> Dict[str, Any]:
+        remaining = len(self._pending) + (1 if self._running else 0)
+        data = {"status": {"exec_info": {"queue_remaining": remaining}}}
+        if client_id:
+            data["sid"] = client_id
+        return {"type": "status", "data": data}
+
+    async def _broadcast_status(self):
+        message = json.dumps(self._status_message())
+        for ws in list(self._clients.values()):
+            try:
+                await ws.send_str(message)
+            except ConnectionError:
+                pass
+
+    async def _send(self, client_id: Optional[str], message: Dict[str, Any]):
+        targets = [self._clients[client_id]] if client_id in self._clients else (
+            [] if client_id else list(self._clients.values())
+        )
+        raw = json.dumps(message)
+        for ws in targets:
+            try:
+                await ws.send_str(raw)
+            except ConnectionError:
+                pass
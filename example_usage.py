@@ -37,6 +37,21 @@ def save_video(video_base64, output_path):
         f.write(video_data)
     print(f"✅ Видео сохранено: {output_path}")
 
+def final_output(output):
+    """
+    Итоговый элемент ответа обработчика
+
+    Обработчик - генератор (return_aggregate_stream), поэтому /runsync и
+    /status возвращают в output список элементов; с "stream": false в нем
+    один элемент в прежнем формате.
+    """
+    if isinstance(output, list):
+        output = output[-1] if output else {}
+    if "error" in output:
+        print(f"❌ Ошибка обработки: {output['error']}")
+        return None
+    return output
+
 def generate_video(image_path, prompt, options=None):
     """Генерирует видео через RunPod API"""
     
@@ -49,7 +64,8 @@ def generate_video(image_path, prompt, options=None):
         "input": {
             "prompt": prompt,
             "image": image_b64,
-            "options": options or {}
+            "options": options or {},
+            "stream": False
         }
     }
     
@@ -83,7 +99,7 @@ def generate_video(image_path, prompt, options=None):
         print(f"❌ Нет выходных данных: {result}")
         return None
         
-    return result["output"]
+    return final_output(result["output"])
 
 def generate_text_to_video(prompt, options=None):
     """Генерирует видео только из текстового промпта (T2V режим)"""
@@ -92,7 +108,8 @@ def generate_text_to_video(prompt, options=None):
     payload = {
         "input": {
             "prompt": prompt,
-            "options": options or {}
+            "options": options or {},
+            "stream": False
         }
     }
     
@@ -126,7 +143,7 @@ def generate_text_to_video(prompt, options=None):
             print(f"❌ Нет выходных данных: {result}")
             return None
             
-        return result["output"]
+        return final_output(result["output"])
         
     except Exception as e:
         print(f"❌ Ошибка запроса: {e}")
@@ -223,7 +240,8 @@ def async_example():
         "input": {
             "prompt": "A butterfly landing on a flower",
             "image": encode_image("input_image.jpg"),
-            "options": {"width": 832, "height": 832, "length": 81}
+            "options": {"width": 832, "height": 832, "length": 81},
+            "stream": False
         }
     }
     
@@ -244,8 +262,9 @@ def async_example():
         status = status_response.json()
         
         if status["status"] == "COMPLETED":
-            result = status["output"]
-            save_video(result["video"], "output_async.mp4")
+            result = final_output(status["output"])
+            if result:
+                save_video(result["video"], "output_async.mp4")
             break
         elif status["status"] == "FAILED":
             print(f"❌ Задача провалилась: {status.get('error', 'Unknown error')}")
@@ -1,45 +1,95 @@
 #!/usr/bin/env python3
 
 import runpod
-import requests
-import json
+import asyncio
 import base64
-import io
 import time
-from PIL import Image
 import os
 import logging
-from workflows import process_workflow, analyze_workflow, get_workflow_info, WorkflowType
+from workflows import process_workflow, process_batch, analyze_workflow, get_workflow_info, WorkflowHandler
+from workflows import get_client
+from workflows.tracker import CompletionTracker
+from workflows.health import HealthMonitor
+from workflows.storage import get_output_sink
+from workflows.inputs import get_input_store
+from workflows.outputs import collect_output_files, get_output_executor, select_output_files
+from workflows.results import get_result_cache, seed_is_fixed
+from workflows.registry import get_registry
+from workflows.object_info import get_object_info_store
+from workflows.converter import ensure_api_format
+from workflows.plan import compile_workflow
+from workflows.janitor import JOB_CLEANUP, get_janitor
+from workflows.scheduler import ModelAffinityScheduler
+from workflows.tier import get_model_tier
+from workflows.timings import JobTimings
+from workflows.startup import get_startup_report
+from workflows.warmup import WARMUP_WORKFLOW, warm_up
+from workflows.models import load_progress as load_prefetch_progress
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# ComfyUI API endpoint
-COMFY_URL = "http://127.0.0.1:8188"
+# Клиент ComfyUI API (общий на процесс с пакетом workflows, адрес из COMFY_URL)
+comfy_client = get_client()
+COMFY_URL = comfy_client.base_url
 
-def wait_for_comfy():
-    """Ждем пока ComfyUI API станет доступным"""
-    max_attempts = 60
-    for i in range(max_attempts):
-        try:
-            response = requests.get(f"{COMFY_URL}/system_stats", timeout=5)
-            if response.status_code == 200:
-                logger.info("ComfyUI API готов")
-                return True
-        except requests.exceptions.RequestException:
-            logger.info(f"Ждем ComfyUI API... попытка {i+1}/{max_attempts}")
-            time.sleep(5)
-    return False
+# Отслеживание завершения задач через WebSocket ComfyUI (общий на процесс)
+completion_tracker = CompletionTracker(comfy_client)
+
+# Закэшированное состояние готовности ComfyUI (проверяется при старте и в фоне)
+health_monitor = HealthMonitor(
+    comfy_client,
+    interval=float(os.environ.get("COMFY_HEALTH_INTERVAL", "10"))
+)
+
+# Именованные воркфлоу из workflow/ и WORKFLOW_DIRS (загружаются при старте, перечитываются при изменении)
+workflow_registry = get_registry()
+
+# Графы ждут отправки в ComfyUI локально: следующим идет граф с наибольшим
+# пересечением по моделям с последним отправленным (меньше смен UNET/LoRA)
+# Локальный уровень моделей (MODEL_TIER_DIR): модели графов копируются с volume
+# на диск контейнера, пока графы ждут; нужные задачам копии не вытесняются
+model_tier = get_model_tier(needed=lambda: scheduler.needed_models())
+
+scheduler = ModelAffinityScheduler(
+    lambda workflow: queue_workflow(workflow),
+    max_inflight=int(os.environ.get("SCHEDULER_MAX_INFLIGHT", "2")),
+    max_skips=int(os.environ.get("SCHEDULER_MAX_SKIPS", "4")),
+    max_wait=float(os.environ.get("SCHEDULER_MAX_WAIT", "120")),
+    on_pending=model_tier.request if model_tier else None
+)
+
+# Сколько задача ждет восстановления ComfyUI в состоянии degraded
+JOB_READY_TIMEOUT = float(os.environ.get("COMFY_JOB_READY_TIMEOUT", "30"))
+
+# Параллельные задачи: пока одна семплирует на GPU, следующая готовит входные данные
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "2"))
+# Сколько задач может стоять в очереди ComfyUI, прежде чем перестаем брать новые
+MAX_COMFY_QUEUE = int(os.environ.get("MAX_COMFY_QUEUE", "2"))
+# Ниже этого порога свободной VRAM работаем строго по одной задаче
+MIN_FREE_VRAM_GB = float(os.environ.get("MIN_FREE_VRAM_GB", "2"))
+
+# Кэш результатов задач с фиксированным сидом (запрос может отключить его через "cache": false)
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE", "1") != "0"
+
+# Максимальный размер пакета ("batch") в одной задаче
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "16"))
+
+# Размер куска файла в потоковом ответе (кратен 3, чтобы каждый кусок base64 декодировался отдельно)
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", str(768 * 1024))) // 3 * 3
+
+def wait_for_comfy(timeout=300):
+    """Ждем пока ComfyUI API станет доступным (однократно при старте воркера)"""
+    return health_monitor.wait_until_ready(timeout=timeout)
 
 def encode_image_to_base64(image_path):
     """Кодирует изображение в base64"""
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
-# еу
 def upload_image_to_comfy(image_data, filename="input_image.png"):
-    """Загружает изображение в ComfyUI"""
+    """Загружает изображение в ComfyUI через /upload/image"""
     try:
         # Декодируем base64 если нужно
         if isinstance(image_data, str) and image_data.startswith('data:image'):
@@ -51,153 +101,72 @@ def upload_image_to_comfy(image_data, filename="input_image.png"):
         else:
             image_bytes = image_data
             
-        # Сохраняем в input директорию ComfyUI
-        input_dir = "/comfyui/input"
-        os.makedirs(input_dir, exist_ok=True)
-        
-        image_path = os.path.join(input_dir, filename)
-        with open(image_path, "wb") as f:
-            f.write(image_bytes)
-            
-        logger.info(f"Изображение сохранено как {filename}")
-        return filename
+        uploaded = comfy_client.upload_image(image_bytes, filename)
+        logger.info(f"Изображение сохранено как {uploaded['name']}")
+        return uploaded["name"]
         
     except Exception as e:
         logger.error(f"Ошибка загрузки изображения: {e}")
         raise
 
-def create_empty_image(width=832, height=832, filename="empty_image.png"):
-    """Создает черное изображение для T2V режима"""
+def create_empty_image(width=832, height=832):
+    """Черное изображение для T2V режима (создается один раз на размер)"""
     try:
-        # Создаем черное изображение через PIL
-        image = Image.new('RGB', (width, height), color='black')
-        
-        # Сохраняем в input директорию ComfyUI
-        input_dir = "/comfyui/input"
-        os.makedirs(input_dir, exist_ok=True)
-        
-        image_path = os.path.join(input_dir, filename)
-        image.save(image_path)
-        
-        logger.info(f"Создано пустое изображение {width}x{height} как {filename}")
+        filename = get_input_store().placeholder(width, height)
+        logger.info(f"Пустое изображение {width}x{height}: {filename}")
         return filename
         
     except Exception as e:
         logger.error(f"Ошибка создания пустого изображения: {e}")
         raise
 
-def get_output_files_by_type(result, workflow_type):
-    """Получает выходные файлы в зависимости от типа воркфлоု"""
-    output_files = []
-    
+def get_output_files_by_type(result, workflow_type, node_ids=None, graph=None, include_temp=False):
+    """
+    Получает все выходные файлы задачи по метаданным history (subfolder, type).
+    Файлы ожидаемого для типа воркфлоу вида идут первыми (итоговые узлы graph
+    раньше промежуточных); node_ids выбирает узлы. graph - граф исходного
+    воркфлоу задачи: урезанный граф - его подмножество с той же глубиной узлов.
+    include_temp включает превью из temp (для кэша результатов: из него потом
+    выбираются файлы любых узлов).
+    """
     try:
-        # Для видео воркфлоу ищем видеофайлы
-        if workflow_type in [WorkflowType.T2V, WorkflowType.VIDEO_UPSCALE]:
-            for node_id, node_result in result.get("outputs", {}).items():
-                # Ищем видеофайлы
-                if "gifs" in node_result:
-                    for gif_info in node_result["gifs"]:
-                        filename = gif_info["filename"]
-                        output_files.append({
-                            "type": "video",
-                            "filename": filename,
-                            "path": f"/comfyui/output/{filename}"
-                        })
-                # Альтернативный формат для видео
-                elif "videos" in node_result:
-                    for video_info in node_result["videos"]:
-                        filename = video_info["filename"]
-                        output_files.append({
-                            "type": "video",
-                            "filename": filename,
-                            "path": f"/comfyui/output/{filename}"
-                        })
-        
-        # Для изображений воркфлоу ищем изображения
-        elif workflow_type in [WorkflowType.T2I, WorkflowType.IMG2IMG]:
-            for node_id, node_result in result.get("outputs", {}).items():
-                if "images" in node_result:
-                    for img_info in node_result["images"]:
-                        filename = img_info["filename"]
-                        output_files.append({
-                            "type": "image",
-                            "filename": filename,
-                            "path": f"/comfyui/output/{filename}"
-                        })
-        
-        # Для неизвестных типов пробуем найти любые выходные файлы
-        else:
-            for node_id, node_result in result.get("outputs", {}).items():
-                # Сначала видео
-                if "gifs" in node_result:
-                    for gif_info in node_result["gifs"]:
-                        filename = gif_info["filename"]
-                        output_files.append({
-                            "type": "video",
-                            "filename": filename,
-                            "path": f"/comfyui/output/{filename}"
-                        })
-                elif "videos" in node_result:
-                    for video_info in node_result["videos"]:
-                        filename = video_info["filename"]
-                        output_files.append({
-                            "type": "video",
-                            "filename": filename,
-                            "path": f"/comfyui/output/{filename}"
-                        })
-                # Затем изображения
-                elif "images" in node_result:
-                    for img_info in node_result["images"]:
-                        filename = img_info["filename"]
-                        output_files.append({
-                            "type": "image",
-                            "filename": filename,
-                            "path": f"/comfyui/output/{filename}"
-                        })
-                        
+        return collect_output_files(result, workflow_type, node_ids=node_ids, include_temp=include_temp, graph=graph)
     except Exception as e:
         logger.error(f"Ошибка получения выходных файлов: {e}")
-        
-    return output_files
+        return []
 
 def queue_workflow(workflow):
     """Отправляет воркфлоу в очередь ComfyUI"""
     try:
-        response = requests.post(f"{COMFY_URL}/prompt", json={"prompt": workflow})
-        response.raise_for_status()
-        return response.json()["prompt_id"]
+        # client_id нужен, чтобы ComfyUI присылал события задачи в наш сокет
+        response = comfy_client.queue_prompt(workflow, client_id=completion_tracker.client_id)
+        return response["prompt_id"]
     except Exception as e:
         logger.error(f"Ошибка постановки в очередь: {e}")
         raise
 
-def wait_for_completion(prompt_id, timeout=600):
-    """Ждет завершения генерации"""
-    start_time = time.time()
-    
-    while time.time() - start_time < timeout:
-        try:
-            # Проверяем статус через history
-            response = requests.get(f"{COMFY_URL}/history/{prompt_id}")
-            
-            if response.status_code == 200:
-                history = response.json()
-                if prompt_id in history:
-                    # Задача завершена
-                    result = history[prompt_id]
-                    if result.get("status", {}).get("completed", False):
-                        return result
-                    elif "error" in result.get("status", {}):
-                        raise Exception(f"Ошибка генерации: {result['status']['error']}")
-                        
-            time.sleep(5)
-            
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Ошибка проверки статуса: {e}")
-            time.sleep(5)
-    
-    raise TimeoutError(f"Генерация не завершилась за {timeout} секунд")
+def wait_for_completion(prompt_id, timeout=600, on_event=None):
+    """Ждет завершения генерации по событиям WebSocket (с откатом на опрос /history)"""
+    return completion_tracker.wait(prompt_id, timeout=timeout, on_event=on_event)
 
+def execute_workflow(workflow, timeout=600):
+    """Синхронно выполняет граф через планировщик и возвращает запись history (прогрев)"""
+    prompt_id = scheduler.submit(workflow).result()
+    try:
+        return wait_for_completion(prompt_id, timeout=timeout)
+    finally:
+        scheduler.release(prompt_id)
 
+def get_queue_position(prompt_id):
+    """Позиция задачи в очереди ComfyUI: 0 - выполняется, None - уже не в очереди"""
+    queue = comfy_client.get_queue()
+    if any(item[1] == prompt_id for item in queue.get("queue_running", [])):
+        return 0
+    pending = sorted(queue.get("queue_pending", []), key=lambda item: item[0])
+    for position, item in enumerate(pending, start=1):
+        if item[1] == prompt_id:
+            return position
+    return None
 
 def encode_file_to_base64(file_path):
     """Кодирует файл в base64 для возврата"""
@@ -208,27 +177,398 @@ def encode_file_to_base64(file_path):
         logger.error(f"Ошибка кодирования файла {file_path}: {e}")
         return None
 
-def handler(event):
-    """Основной обработчик RunPod с поддержкой произвольных JSON воркфлоу"""
+def concurrency_modifier(current_concurrency):
+    """
+    Сколько задач RunPod может выдать воркеру одновременно.
+
+    Учитывает глубину очереди ComfyUI (из событий сокета) и свободную VRAM
+    (из последнего /system_stats монитора), без сетевых запросов.
+    """
+    if not health_monitor.is_ready():
+        return 1
+    
+    target = MAX_CONCURRENCY
+    
+    queue_remaining = completion_tracker.queue_remaining
+    if scheduler.pending:
+        # Графы, ожидающие отправки планировщиком, - тоже очередь
+        queue_remaining = (queue_remaining or 0) + scheduler.pending
+    if queue_remaining is not None and queue_remaining >= MAX_COMFY_QUEUE:
+        # Очередь ComfyUI и так полна - новые задачи не берем, текущие не отбираем
+        target = min(target, max(1, current_concurrency))
+    
+    vram_free = health_monitor.vram_free()
+    if vram_free is not None and vram_free < MIN_FREE_VRAM_GB * 1024 ** 3:
+        target = 1
+    
+    return max(1, target)
+
+def _progress_event(msg_type, data, prepared_workflow, prompt_id):
+    """Переводит событие сокета ComfyUI в элемент потока ответа (или None)"""
+    node = data.get("node")
+    if msg_type == "execution_start":
+        return {"status": "started", "prompt_id": prompt_id}
+    if msg_type == "execution_cached":
+        return {"status": "cached", "nodes": data.get("nodes", [])}
+    if msg_type == "executing" and node is not None:
+        return {
+            "status": "executing",
+            "node": node,
+            "class_type": prepared_workflow.get(node, {}).get("class_type")
+        }
+    if msg_type == "progress":
+        return {"status": "progress", "node": node, "value": data.get("value"), "max": data.get("max")}
+    if msg_type == "executed":
+        return {"status": "executed", "node": node}
+    return None
+
+async def _stream_progress(prompt_id, prepared_workflow, outcome, listener=None):
+    """
+    Ждет завершения задачи и отдает события прогресса из сокета ComfyUI.
+    Запись history кладется в outcome["result"]; listener получает события
+    в потоке сокета (тайминги узлов).
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    
+    def on_event(msg_type, data):
+        if listener is not None:
+            listener(msg_type, data)
+        loop.call_soon_threadsafe(events.put_nowait, (msg_type, data))
+    
+    wait_task = asyncio.ensure_future(asyncio.to_thread(wait_for_completion, prompt_id, on_event=on_event))
+    
+    while not (wait_task.done() and events.empty()):
+        try:
+            batch = [await asyncio.wait_for(events.get(), timeout=0.5)]
+        except asyncio.TimeoutError:
+            continue
+        while not events.empty():
+            batch.append(events.get_nowait())
+        
+        for index, (msg_type, data) in enumerate(batch):
+            # Из серии progress одного узла отдаем только последнее значение
+            if msg_type == "progress" and index + 1 < len(batch):
+                next_type, next_data = batch[index + 1]
+                if next_type == "progress" and next_data.get("node") == data.get("node"):
+                    continue
+            item = _progress_event(msg_type, data, prepared_workflow, prompt_id)
+            if item is not None:
+                yield item
+    
+    outcome["result"] = await wait_task
+
+async def _stream_file_chunks(file_info, file_index):
+    """Отдает файл упорядоченными кусками base64"""
+    size = os.path.getsize(file_info["path"])
+    chunks_total = max(1, -(-size // STREAM_CHUNK_SIZE))
+    
+    with open(file_info["path"], "rb") as f:
+        for chunk_index in range(chunks_total):
+            chunk = await asyncio.to_thread(f.read, STREAM_CHUNK_SIZE)
+            yield {
+                "status": "output",
+                "file_index": file_index,
+                "type": file_info["type"],
+                "filename": file_info["filename"],
+                "size": size,
+                "chunk_index": chunk_index,
+                "chunks_total": chunks_total,
+                "data": base64.b64encode(chunk).decode("utf-8")
+            }
+
+def _describe_output(file_info, index):
+    """Описание выходного файла для ответа"""
+    return {
+        "file_index": index,
+        "node_id": file_info["node_id"],
+        "type": file_info["type"],
+        "filename": file_info["filename"],
+        "subfolder": file_info["subfolder"]
+    }
+
+async def _upload_outputs(sink, output_files, job_key):
+    """
+    Загружает выходные файлы в хранилище параллельно (общий пул потоков),
+    отдавая описание каждого по мере готовности
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_output_executor()
+    
+    async def upload(index, file_info):
+        # Превью из temp кладем отдельно, чтобы имена не пересеклись с output
+        folder = "" if file_info["folder_type"] == "output" else f"{file_info['folder_type']}/"
+        key = f"{job_key}/{folder}{file_info['filename']}"
+        uploaded = await loop.run_in_executor(executor, sink.upload, file_info["path"], key)
+        return {**_describe_output(file_info, index), **uploaded}
+    
+    for next_done in asyncio.as_completed([upload(i, f) for i, f in enumerate(output_files)]):
+        yield await next_done
+
+async def _encode_outputs(output_files):
+    """Кодирует все выходные файлы в base64 параллельно, сохраняя порядок"""
+    loop = asyncio.get_running_loop()
+    executor = get_output_executor()
+    return await asyncio.gather(*[
+        loop.run_in_executor(executor, encode_file_to_base64, file_info["path"])
+        for file_info in output_files
+    ])
+
+def _resolve_sink(input_data):
+    """Внешнее хранилище выходов задачи (окружение S3_* или output_storage запроса), None - base64"""
+    storage = input_data.get("output_storage")
+    if isinstance(storage, str):
+        storage = {"type": storage}
+    return get_output_sink(storage)
+
+async def _deliver_outputs(sink, output_files, job_key):
+    """Описания выходных файлов в порядке списка: с url (хранилище) или data (base64)"""
+    if sink is not None:
+        outputs = [uploaded async for uploaded in _upload_outputs(sink, output_files, job_key)]
+        outputs.sort(key=lambda item: item["file_index"])
+        return outputs
+    encoded = await _encode_outputs(output_files)
+    return [
+        {**_describe_output(file_info, index), "data": data}
+        for index, (file_info, data) in enumerate(zip(output_files, encoded))
+    ]
+
+def _compile_plan(workflow):
+    """API граф воркфлоу и его план - один раз на задачу"""
+    workflow = ensure_api_format(workflow)
+    return workflow, compile_workflow(workflow)
+
+async def _schedule(workflow):
+    """Передает граф планировщику и ждет его отправки в ComfyUI (prompt_id)"""
+    future = await asyncio.to_thread(scheduler.submit, workflow)
+    return await asyncio.wrap_future(future)
+
+async def _release(prompt_id):
+    """Освобождает место задачи в очереди ComfyUI для следующего графа планировщика"""
+    await asyncio.to_thread(scheduler.release, prompt_id)
+
+async def _handle_batch(event, input_data, workflow, plan, known_type, stream, extra_metadata):
+    """
+    Пакет вариантов одного воркфлоу: все подготовленные графы сразу
+    передаются планировщику, чтобы GPU не простаивал между ними, а
+    результат и ошибка возвращаются по каждому элементу отдельно
+    """
+    items = input_data.get("batch")
+    if not isinstance(items, list) or not items:
+        yield {"error": "Параметр 'batch' должен быть непустым списком"}
+        return
+    if len(items) > BATCH_MAX_SIZE:
+        yield {"error": f"Пакет из {len(items)} элементов превышает BATCH_MAX_SIZE={BATCH_MAX_SIZE}"}
+        return
+    
+    try:
+        prepared_items, workflow_type, metadata = await asyncio.to_thread(
+            process_batch,
+            workflow=workflow,
+            items=items,
+            prompt=input_data.get("prompt"),
+            image_data=input_data.get("image"),
+            video_data=input_data.get("video"),
+            options=input_data.get("options", {}),
+            job_id=event.get("id"),
+            workflow_type=known_type,
+            output_nodes=input_data.get("output_nodes"),
+            plan=plan
+        )
+    except ValueError as e:
+        yield {"error": f"Ошибка валидации воркфлоу: {str(e)}"}
+        return
+    metadata.update(extra_metadata)
+    
+    output_nodes = input_data.get("output_nodes")
+    use_cache = RESULT_CACHE_ENABLED and input_data.get("cache", True) is not False
+    result_cache = get_result_cache()
+    
+    # Хранилище проверяем до планировщика: ошибка настроек не должна оставлять графы в очереди
+    sink = _resolve_sink(input_data)
+    job_key = event.get("id") or f"batch-{int(time.time())}"
+    
+    async def finish(item):
+        """Результат элемента пакета; ошибки не выходят за пределы элемента"""
+        index = item["index"]
+        if "error" in item:
+            return {"index": index, "error": item["error"]}
+        try:
+            if item.get("cached"):
+                output_files = select_output_files(item["cached"]["files"], output_nodes)
+            else:
+                try:
+                    item["prompt_id"] = await asyncio.wrap_future(item["scheduled"])
+                except Exception as e:
+                    raise Exception(f"Ошибка постановки в очередь: {e}")
+                try:
+                    result = await asyncio.to_thread(wait_for_completion, item["prompt_id"])
+                finally:
+                    item["released"] = True
+                    await _release(item["prompt_id"])
+                output_files = get_output_files_by_type(result, workflow_type, output_nodes, graph=plan.graph)
+                if item["cache_key"] and output_files:
+                    await asyncio.to_thread(
+                        result_cache.store, item["cache_key"],
+                        get_output_files_by_type(result, workflow_type, graph=plan.graph, include_temp=True), item["prompt_id"]
+                    )
+            if not output_files:
+                raise ValueError("Выходные файлы не найдены")
+            outputs = await _deliver_outputs(sink, output_files, f"{job_key}/{index}")
+        except Exception as e:
+            logger.error(f"Ошибка элемента пакета {index}: {e}")
+            return {"index": index, "prompt_id": item["prompt_id"], "error": str(e)}
+        return {
+            "index": index,
+            "prompt_id": item["prompt_id"],
+            "prompt": item["prompt"],
+            "seed": item["options"].get("seed"),
+            "outputs": outputs,
+            "files_count": len(outputs),
+            "metadata": item["metadata"]
+        }
+    
     try:
-        # Проверяем доступность ComfyUI
-        if not wait_for_comfy():
-            return {"error": "ComfyUI API недоступен"}
+        # Кэш проверяем и все промахи передаем планировщику до ожидания первого результата
+        for item in prepared_items:
+            if "error" in item:
+                continue
+            item["cache_key"] = None
+            # Кэшируются только элементы с сидом клиента, а не подставленным пакетом
+            if use_cache and item["seed_fixed"]:
+                item["cache_key"] = await asyncio.to_thread(result_cache.key, item["workflow"])
+                item["cached"] = await asyncio.to_thread(result_cache.lookup, item["cache_key"])
+            item["metadata"]["result_cache"] = (
+                "hit" if item.get("cached") else ("miss" if item["cache_key"] else "bypass")
+            )
+            if item.get("cached"):
+                item["prompt_id"] = item["cached"].get("prompt_id")
+                continue
+            item["prompt_id"] = None
+            item["scheduled"] = await asyncio.to_thread(scheduler.submit, item["workflow"])
+        
+        scheduled = sum(1 for item in prepared_items if item.get("scheduled") is not None)
+        logger.info(f"Пакет передан планировщику: {scheduled} из {len(prepared_items)} элементов")
+        if stream:
+            yield {"status": "queued", "batch_size": len(prepared_items), "scheduled": scheduled}
         
+        results = []
+        for next_done in asyncio.as_completed([finish(item) for item in prepared_items]):
+            item_result = await next_done
+            results.append(item_result)
+            if stream:
+                yield {"status": "item", **item_result}
+    finally:
+        # Элементы, ожидание которых не состоялось, не должны занимать место в очереди планировщика
+        scheduler.cancel(*[
+            item["scheduled"] for item in prepared_items
+            if item.get("scheduled") is not None and not item.get("released")
+        ])
+    results.sort(key=lambda item: item["index"])
+    
+    if stream:
+        # Данные файлов уже отданы в элементах потока
+        for item_result in results:
+            for output in item_result.get("outputs", []):
+                output.pop("data", None)
+    failed = sum(1 for item_result in results if "error" in item_result)
+    response = {
+        "items": results,
+        "completed": len(results) - failed,
+        "failed": failed,
+        "workflow_type": workflow_type.value,
+        "metadata": metadata
+    }
+    if stream:
+        response["status"] = "completed"
+    yield response
+
+async def handler(event):
+    """
+    Основной обработчик RunPod с поддержкой произвольных JSON воркфлоу.
+
+    Генератор: по умолчанию отдает позицию в очереди, прогресс узлов и шагов,
+    затем файлы кусками base64 и итоговый элемент со status=completed.
+    С `"stream": false` отдает один элемент в прежнем формате ответа;
+    RunPod агрегирует элементы генератора, так что /runsync возвращает
+    список и в этом случае (из одного элемента).
+    """
+    try:
         # Получаем входные данные
         input_data = event["input"]
+        stream = input_data.get("stream", True)
         
-        # Специальная команда для анализа воркфлоу
+        # Специальная команда для анализа воркфлоу (только CPU, ComfyUI не нужен)
         if input_data.get("action") == "analyze_workflow":
             workflow = input_data.get("workflow")
             if not workflow:
-                return {"error": "Для анализа требуется воркфлоу в параметре 'workflow'"}
-            return {"workflow_info": get_workflow_info(workflow)}
+                yield {"error": "Для анализа требуется воркфлоу в параметре 'workflow'"}
+                return
+            yield {"workflow_info": get_workflow_info(workflow)}
+            return
         
-        # Получаем обязательный параметр workflow (полный JSON)
+        # Метрики воркера: планировщик (смены моделей), очередь и состояние ComfyUI
+        if input_data.get("action") == "metrics":
+            yield {"metrics": {
+                "scheduler": scheduler.stats(),
+                "comfy_queue_remaining": completion_tracker.queue_remaining,
+                "health": health_monitor.snapshot(),
+                "startup": get_startup_report().as_dict(),
+                "prefetch": load_prefetch_progress(),
+                "model_tier": model_tier.stats() if model_tier else None,
+                "disk": get_janitor().stats()
+            }}
+            return
+        
+        # Список воркфлоу реестра
+        if input_data.get("action") == "list_workflows":
+            yield {"workflows": workflow_registry.list()}
+            return
+        
+        # Проверяем закэшированное состояние ComfyUI; в degraded ждем восстановления
+        if not health_monitor.is_ready() and not await asyncio.to_thread(health_monitor.wait_ready, JOB_READY_TIMEOUT):
+            yield {"error": "ComfyUI API недоступен", "health": health_monitor.snapshot()}
+            return
+        
+        # Воркфлоу: полный JSON в 'workflow' или имя из реестра в 'workflow_name'
         workflow = input_data.get("workflow")
+        known_type = None
+        workflow_name = input_data.get("workflow_name")
+        if not workflow and workflow_name:
+            try:
+                registered = workflow_registry.get(workflow_name, input_data.get("workflow_version"))
+            except ValueError as e:
+                yield {"error": str(e)}
+                return
+            workflow = registered.workflow
+            known_type = registered.workflow_type
         if not workflow:
-            return {"error": "Параметр 'workflow' обязателен и должен содержать полный JSON воркфлоу ComfyUI"}
+            yield {"error": "Параметр 'workflow' (полный JSON воркфлоу ComfyUI) или 'workflow_name' обязателен"}
+            return
+        
+        # Разбивка времени задачи по этапам и узлам: metadata.timings и строка лога
+        timings = JobTimings()
+        
+        # План (граф связей и индексы подстановки) строится один раз на задачу и передается
+        # в анализ, подготовку и сбор выходных файлов; у воркфлоу реестра он уже готов
+        if known_type is not None:
+            plan = registered.plan
+        else:
+            try:
+                with timings.stage("prepare"):
+                    workflow, plan = await asyncio.to_thread(_compile_plan, workflow)
+            except ValueError as e:
+                yield {"error": f"Ошибка валидации воркфлоу: {str(e)}"}
+                return
+        
+        # Пакет вариантов: список переопределений prompt/options для одного воркфлоу
+        if "batch" in input_data:
+            extra_metadata = {}
+            if workflow_name and known_type is not None:
+                extra_metadata = {"workflow_name": workflow_name, "workflow_version": registered.version}
+            async for item in _handle_batch(event, input_data, workflow, plan, known_type, stream, extra_metadata):
+                yield item
+            return
         
         # Получаем остальные параметры
         prompt = input_data.get("prompt")
@@ -240,56 +580,197 @@ def handler(event):
         if prompt:
             logger.info(f"Промпт: {prompt}")
         
-        # Обрабатываем воркфлоу
+        # Обрабатываем воркфлоу: декодирование и сохранение входов идут в потоке,
+        # параллельно с выполнением предыдущей задачи на GPU
         try:
-            prepared_workflow, workflow_type, metadata = process_workflow(
+            prepared_workflow, workflow_type, metadata = await asyncio.to_thread(
+                process_workflow,
                 workflow=workflow,
                 prompt=prompt,
                 image_data=image_data,
                 video_data=video_data,
-                options=options
+                options=options,
+                job_id=event.get("id"),
+                workflow_type=known_type,
+                timings=timings,
+                output_nodes=input_data.get("output_nodes"),
+                plan=plan
             )
         except ValueError as e:
-            return {"error": f"Ошибка валидации воркфлоу: {str(e)}"}
+            yield {"error": f"Ошибка валидации воркфлоу: {str(e)}"}
+            return
+        timings.workflow = prepared_workflow
         
         logger.info(f"Воркфлоу обработан: тип={workflow_type.value}, узлов={metadata['node_count']}")
+        if workflow_name and known_type is not None:
+            metadata["workflow_name"] = workflow_name
+            metadata["workflow_version"] = registered.version
         
-        # Отправляем в очередь ComfyUI
-        prompt_id = queue_workflow(prepared_workflow)
-        logger.info(f"Воркфлоу поставлен в очередь: {prompt_id}")
+        # Детерминированные задачи (фиксированный сид) отдаются из кэша результатов без GPU
+        result_cache = get_result_cache()
+        cache_key = None
+        cached = None
+        if RESULT_CACHE_ENABLED and input_data.get("cache", True) is not False and seed_is_fixed(options):
+            with timings.stage("cache_lookup"):
+                cache_key = await asyncio.to_thread(result_cache.key, prepared_workflow)
+                cached = await asyncio.to_thread(result_cache.lookup, cache_key)
+        metadata["result_cache"] = "hit" if cached else ("miss" if cache_key else "bypass")
         
-        # Ждем завершения
-        result = wait_for_completion(prompt_id)
-        logger.info("Генерация завершена")
+        if cached:
+            prompt_id = cached.get("prompt_id")
+            output_files = select_output_files(cached["files"], input_data.get("output_nodes"))
+            if stream:
+                yield {"status": "cached", "prompt_id": prompt_id}
+        else:
+            # Отправляем в очередь ComfyUI через планировщик
+            with timings.stage("schedule"):
+                prompt_id = await _schedule(prepared_workflow)
+            timings.queued()
+            logger.info(f"Воркфлоу поставлен в очередь: {prompt_id}")
         
-        # Получаем выходные файлы
-        output_files = get_output_files_by_type(result, workflow_type)
+            # Ждем завершения, по пути отдавая прогресс; место в очереди освобождаем в любом случае
+            try:
+                if stream:
+                    try:
+                        position = await asyncio.to_thread(get_queue_position, prompt_id)
+                    except Exception as e:
+                        logger.warning(f"Не удалось получить позицию в очереди: {e}")
+                        position = None
+                    yield {"status": "queued", "prompt_id": prompt_id, "queue_position": position}
+            
+                    outcome = {}
+                    async for item in _stream_progress(prompt_id, prepared_workflow, outcome, timings.on_event):
+                        yield item
+                    result = outcome["result"]
+                else:
+                    result = await asyncio.to_thread(wait_for_completion, prompt_id, on_event=timings.on_event)
+            finally:
+                await _release(prompt_id)
+            timings.apply_history(result)
+            logger.info("Генерация завершена")
+            
+            # Получаем выходные файлы
+            with timings.stage("outputs"):
+                output_files = get_output_files_by_type(
+                    result, workflow_type, input_data.get("output_nodes"), graph=plan.graph
+                )
+                
+                if cache_key and output_files:
+                    await asyncio.to_thread(
+                        result_cache.store, cache_key,
+                        get_output_files_by_type(result, workflow_type, graph=plan.graph, include_temp=True), prompt_id
+                    )
         
         if not output_files:
-            return {"error": "Выходные файлы не найдены"}
+            yield {"error": "Выходные файлы не найдены"}
+            return
         
-        # Кодируем основной файл
         main_file = output_files[0]
-        file_base64 = encode_file_to_base64(main_file["path"])
         
-        if not file_base64:
-            return {"error": f"Не удалось закодировать {main_file['type']}"}
+        # Доставка во внешнее хранилище вместо base64
+        sink = _resolve_sink(input_data)
+        
+        if sink is not None:
+            with timings.stage("deliver"):
+                outputs = await _deliver_outputs(sink, output_files, event.get("id") or prompt_id)
+            if stream:
+                for uploaded in outputs:
+                    yield {"status": "output", **uploaded}
+            metadata["timings"] = timings.log(event.get("id"), prompt_id)
+            response = {
+                "outputs": outputs,
+                "type": main_file["type"],
+                "filename": main_file["filename"],
+                "url": outputs[0]["url"],
+                "prompt_id": prompt_id,
+                "files_count": len(output_files),
+                "workflow_type": workflow_type.value,
+                "metadata": metadata
+            }
+            if stream:
+                response["status"] = "completed"
+            yield response
+            return
+        
+        if stream:
+            with timings.stage("deliver"):
+                for index, file_info in enumerate(output_files):
+                    async for chunk in _stream_file_chunks(file_info, index):
+                        chunk["node_id"] = file_info["node_id"]
+                        yield chunk
+            metadata["timings"] = timings.log(event.get("id"), prompt_id)
+            yield {
+                "status": "completed",
+                "outputs": [_describe_output(f, i) for i, f in enumerate(output_files)],
+                "type": main_file["type"],
+                "filename": main_file["filename"],
+                "prompt_id": prompt_id,
+                "files_count": len(output_files),
+                "workflow_type": workflow_type.value,
+                "metadata": metadata
+            }
+            return
+        
+        # Кодируем все файлы параллельно
+        with timings.stage("deliver"):
+            outputs = await _deliver_outputs(None, output_files, prompt_id)
+        metadata["timings"] = timings.log(event.get("id"), prompt_id)
+        
+        # Данные основного файла - в поле video/image, как раньше; остальных - в outputs
+        main_data = outputs[0].pop("data")
+        if not main_data:
+            yield {"error": f"Не удалось закодировать {main_file['type']}"}
+            return
         
         # Формируем ответ
         response = {
-            main_file["type"]: file_base64,
+            main_file["type"]: main_data,
             "filename": main_file["filename"],
+            "outputs": outputs,
             "prompt_id": prompt_id,
             "files_count": len(output_files),
             "workflow_type": workflow_type.value,
             "metadata": metadata
         }
         
-        return response
+        yield response
         
     except Exception as e:
         logger.error(f"Ошибка в обработчике: {e}")
-        return {"error": str(e)}
+        yield {"error": str(e)}
+    finally:
+        # Выходы задачи уже отданы (и связаны с кэшем результатов) - удаляем их в фоне
+        if JOB_CLEANUP:
+            get_janitor().release_job(WorkflowHandler.job_namespace(event.get("id")))
 
 if __name__ == "__main__":
-    runpod.serverless.start({"handler": handler})
\ No newline at end of file
+    startup_report = get_startup_report()
+    with startup_report.stage("comfy_ready") as stage:
+        stage["ready"] = wait_for_comfy()
+    if not stage["ready"]:
+        logger.error("ComfyUI API не ответил при старте, задачи будут ждать восстановления")
+    health_monitor.start()
+    completion_tracker.start()
+    # Описания узлов нужны для преобразования UI воркфлоу реестра
+    with startup_report.stage("object_info") as stage:
+        stage["live"] = get_object_info_store().refresh()
+    with startup_report.stage("registry") as stage:
+        workflow_registry.start()
+        stage["workflows"] = len(workflow_registry.list())
+    # Бюджет диска для output/temp и кэшей: первый проход сразу, затем в фоне
+    with startup_report.stage("janitor") as stage:
+        stage.update(get_janitor().sweep())
+        get_janitor().start()
+    # Прогрев до приема задач: первая задача не платит за загрузку моделей и компиляцию
+    if WARMUP_WORKFLOW and health_monitor.is_ready():
+        try:
+            with startup_report.stage("warmup") as stage:
+                stage.update(warm_up(workflow_registry, execute_workflow))
+        except Exception as e:
+            logger.error(f"Прогрев не удался: {e}")
+    startup_report.finish()
+    runpod.serverless.start({
+        "handler": handler,
+        "concurrency_modifier": concurrency_modifier,
+        "return_aggregate_stream": True
+    })
\ No newline at end of file
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты пакетного режима: подготовка вариантов и обработка в handler
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows import process_batch, WorkflowType
+from workflows.scheduler import ModelAffinityScheduler
+
+
+WORKFLOW = {
+    "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "old", "clip": ["38", 0]}, "_meta": {"title": "Positive"}},
+    "57": {"class_type": "KSamplerAdvanced", "inputs": {"noise_seed": 0, "steps": 4}},
+    "80": {"class_type": "SaveImage", "inputs": {"filename_prefix": "wan", "images": ["57", 0]}},
+}
+
+
+def test_process_batch_overrides_and_item_errors():
+    """Элементы переопределяют prompt/options, ошибка одного не мешает остальным"""
+    items, workflow_type, metadata = process_batch(
+        WORKFLOW,
+        [{"seed": 1}, {"prompt": "a dog", "options": {"steps": 8}}, {"prompt": ""}, "bad"],
+        prompt="a cat",
+        options={"steps": 6},
+        job_id="job-1",
+        workflow_type=WorkflowType.T2I
+    )
+
+    assert workflow_type == WorkflowType.T2I
+    assert metadata["batch_size"] == 4
+
+    first, second, third, fourth = items
+    assert first["workflow"]["6"]["inputs"]["text"] == "a cat"
+    assert first["workflow"]["57"]["inputs"] == {"noise_seed": 1, "steps": 6}
+    assert first["workflow"]["80"]["inputs"]["filename_prefix"] == "jobs/job-1/0/wan"
+
+    assert second["workflow"]["6"]["inputs"]["text"] == "a dog"
+    assert second["workflow"]["57"]["inputs"]["steps"] == 8
+    # Случайные сиды элементов различаются
+    assert second["options"]["seed"] != first["options"]["seed"]
+    # Подставленный пакетом сид не делает элемент кэшируемым
+    assert first["seed_fixed"] and not second["seed_fixed"]
+
+    assert "T2I" in third["error"]
+    assert "error" in fourth
+    assert WORKFLOW["57"]["inputs"]["noise_seed"] == 0
+
+
+def test_handler_queues_whole_batch_before_waiting(tmp_path, monkeypatch):
+    """Все элементы ставятся в очередь до ожидания; ошибка элемента остается в нем"""
+    import rp_handler
+
+    events = []
+    output = tmp_path / "out.png"
+    output.write_bytes(b"png")
+
+    def queue_workflow(workflow):
+        events.append("queue")
+        return f"p{len([e for e in events if e == 'queue'])}"
+
+    def wait_for_completion(prompt_id, timeout=600, on_event=None):
+        events.append(f"wait:{prompt_id}")
+        if prompt_id == "p2":
+            raise Exception("Ошибка генерации")
+        return {"outputs": {}}
+
+    def get_output_files_by_type(result, workflow_type, node_ids=None, graph=None, include_temp=False):
+        return [{
+            "path": str(output), "type": "image", "filename": "out.png",
+            "subfolder": "", "node_id": "80", "folder_type": "output"
+        }]
+
+    monkeypatch.setattr(rp_handler, "queue_workflow", queue_workflow)
+    monkeypatch.setattr(rp_handler, "wait_for_completion", wait_for_completion)
+    monkeypatch.setattr(rp_handler, "get_output_files_by_type", get_output_files_by_type)
+    monkeypatch.setattr(rp_handler, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(rp_handler.health_monitor, "is_ready", lambda: True)
+    monkeypatch.setattr(rp_handler, "get_output_sink", lambda storage: None)
+    # Окно планировщика шире пакета: все графы уходят в ComfyUI сразу
+    monkeypatch.setattr(rp_handler, "scheduler", ModelAffinityScheduler(rp_handler.queue_workflow, max_inflight=8))
+
+    event = {"id": "job-2", "input": {
+        "workflow": WORKFLOW, "prompt": "a cat", "stream": False,
+        "batch": [{"seed": 1}, {"seed": 2}, {"seed": 3}]
+    }}
+
+    async def run():
+        return [item async for item in rp_handler.handler(event)]
+
+    (response,) = asyncio.run(run())
+
+    assert events[:3] == ["queue", "queue", "queue"]
+    assert sorted(events[3:]) == ["wait:p1", "wait:p2", "wait:p3"]
+    assert response["completed"] == 2 and response["failed"] == 1
+    assert [item["index"] for item in response["items"]] == [0, 1, 2]
+    assert "Ошибка генерации" in response["items"][1]["error"]
+    assert response["items"][2]["seed"] == 3
+    assert response["items"][0]["outputs"][0]["data"] == "cG5n"
+
+
+def _batch_handler(monkeypatch, max_inflight):
+    import rp_handler
+
+    queued = []
+
+    def queue_workflow(workflow):
+        queued.append(workflow)
+        return f"p{len(queued)}"
+
+    monkeypatch.setattr(rp_handler, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(rp_handler.health_monitor, "is_ready", lambda: True)
+    monkeypatch.setattr(rp_handler, "scheduler", ModelAffinityScheduler(queue_workflow, max_inflight=max_inflight))
+    return rp_handler, queued
+
+
+def test_handler_invalid_storage_queues_nothing(monkeypatch):
+    """Ошибка настроек хранилища обнаруживается до отправки графов"""
+    rp_handler, queued = _batch_handler(monkeypatch, max_inflight=8)
+    event = {"id": "job-3", "input": {
+        "workflow": WORKFLOW, "prompt": "a cat", "stream": False,
+        "batch": [{"seed": 1}, {"seed": 2}, {"seed": 3}],
+        "output_storage": {"bucket": "b", "url_expires": "soon"}
+    }}
+
+    async def run():
+        return [item async for item in rp_handler.handler(event)]
+
+    (response,) = asyncio.run(run())
+
+    assert "error" in response
+    assert queued == []
+    stats = rp_handler.scheduler.stats()
+    assert stats["pending"] == 0 and stats["inflight"] == 0
+
+
+def test_handler_closed_stream_releases_scheduled_items(monkeypatch):
+    """Прерванный поток пакета отзывает ожидающие графы и освобождает отправленные"""
+    rp_handler, queued = _batch_handler(monkeypatch, max_inflight=1)
+    monkeypatch.setattr(rp_handler, "get_output_sink", lambda storage: None)
+    event = {"id": "job-4", "input": {
+        "workflow": WORKFLOW, "prompt": "a cat", "stream": True,
+        "batch": [{"seed": 1}, {"seed": 2}, {"seed": 3}]
+    }}
+
+    async def run():
+        stream = rp_handler.handler(event)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    first = asyncio.run(run())
+
+    assert first["status"] == "queued" and first["scheduled"] == 3
+    assert len(queued) == 1
+    stats = rp_handler.scheduler.stats()
+    assert stats["pending"] == 0 and stats["inflight"] == 0
+
+
+def test_handler_bypasses_cache_for_derived_seeds(tmp_path, monkeypatch):
+    """Элементы со случайным сидом не ищутся в кэше результатов и не сохраняются в него"""
+    rp_handler, queued = _batch_handler(monkeypatch, max_inflight=8)
+    output = tmp_path / "out.png"
+    output.write_bytes(b"png")
+    keys = []
+
+    class Cache:
+        def key(self, workflow):
+            keys.append(workflow["57"]["inputs"]["noise_seed"])
+            return f"key-{len(keys)}"
+
+        def lookup(self, key):
+            return None
+
+        def store(self, key, files, prompt_id):
+            pass
+
+    monkeypatch.setattr(rp_handler, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(rp_handler, "get_result_cache", lambda: Cache())
+    monkeypatch.setattr(rp_handler, "get_output_sink", lambda storage: None)
+    monkeypatch.setattr(rp_handler, "wait_for_completion", lambda prompt_id, timeout=600, on_event=None: {"outputs": {}})
+    monkeypatch.setattr(rp_handler, "get_output_files_by_type", lambda result, workflow_type, node_ids=None, graph=None, include_temp=False: [{
+        "path": str(output), "type": "image", "filename": "out.png",
+        "subfolder": "", "node_id": "80", "folder_type": "output"
+    }])
+    event = {"id": "job-5", "input": {
+        "workflow": WORKFLOW, "prompt": "a cat", "stream": False, "options": {"steps": 6},
+        "batch": [{"seed": 7}, {}]
+    }}
+
+    async def run():
+        return [item async for item in rp_handler.handler(event)]
+
+    (response,) = asyncio.run(run())
+
+    assert keys == [7]
+    assert [item["metadata"]["result_cache"] for item in response["items"]] == ["miss", "bypass"]
+    assert len(queued) == 2
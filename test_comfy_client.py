@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты HTTP клиента ComfyUI: повторы, таймауты и ошибки API
+"""
+
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.client import ComfyClient, ComfyAPIError
+
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    """Отвечает 503 на первые запросы, затем 200"""
+
+    failures_left = {}
+    calls = {}
+
+    def _respond(self):
+        path = self.path.split("?")[0]
+        self.calls[path] = self.calls.get(path, 0) + 1
+        if self.failures_left.get(path, 0) > 0:
+            self.failures_left[path] -= 1
+            status, body = 503, {"error": "busy"}
+        elif path == "/prompt":
+            status, body = 200, {"prompt_id": "abc", "number": 1, "node_errors": {}}
+        else:
+            status, body = 200, {"ok": True}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._respond()
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = ComfyClient(f"http://127.0.0.1:{server.server_address[1]}", backoff_base=0.01)
+    return server, client
+
+
+def test_idempotent_requests_are_retried():
+    """GET повторяется при 503 и в итоге возвращает ответ"""
+    server, client = _serve()
+    _FlakyHandler.failures_left = {"/queue": 2}
+    _FlakyHandler.calls = {}
+    try:
+        assert client.get_queue() == {"ok": True}
+        assert _FlakyHandler.calls["/queue"] == 3
+    finally:
+        server.shutdown()
+
+
+def test_prompt_is_not_retried_on_http_error():
+    """POST /prompt не повторяется, если сервер уже ответил ошибкой"""
+    server, client = _serve()
+    _FlakyHandler.failures_left = {"/prompt": 1}
+    _FlakyHandler.calls = {}
+    try:
+        client.queue_prompt({"1": {}}, client_id="x")
+        assert False, "ожидалась ComfyAPIError"
+    except ComfyAPIError as e:
+        assert e.status_code == 503
+        assert _FlakyHandler.calls["/prompt"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_session_is_reused():
+    """Последовательные запросы идут через одну keep-alive сессию"""
+    server, client = _serve()
+    _FlakyHandler.failures_left = {}
+    try:
+        session = client.session
+        client.get_queue()
+        assert client.queue_prompt({"1": {}})["prompt_id"] == "abc"
+        assert client.session is session
+    finally:
+        server.shutdown()
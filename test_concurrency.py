@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты параллельных задач: concurrency_modifier и подпапки файлов задач
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rp_handler
+from workflows import process_workflow, WorkflowHandler, WorkflowType
+
+
+WORKFLOW = {
+    "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "old", "clip": ["38", 0]}},
+    "57": {"class_type": "KSamplerAdvanced", "inputs": {"noise_seed": 0, "steps": 4}},
+    "80": {"class_type": "SaveImage", "inputs": {"filename_prefix": "wan", "images": ["57", 0]}},
+}
+
+
+class _Health:
+    def __init__(self, ready=True, vram_free=None):
+        self.ready = ready
+        self.free = vram_free
+
+    def is_ready(self):
+        return self.ready
+
+    def vram_free(self):
+        return self.free
+
+
+class _Scheduler:
+    def __init__(self, pending=0):
+        self.pending = pending
+
+
+def _setup(monkeypatch, health, queue_remaining=None, pending=0):
+    monkeypatch.setattr(rp_handler, "MAX_CONCURRENCY", 4)
+    monkeypatch.setattr(rp_handler, "MAX_COMFY_QUEUE", 2)
+    monkeypatch.setattr(rp_handler, "MIN_FREE_VRAM_GB", 2.0)
+    monkeypatch.setattr(rp_handler, "health_monitor", health)
+    monkeypatch.setattr(rp_handler, "scheduler", _Scheduler(pending))
+    monkeypatch.setattr(rp_handler.completion_tracker, "queue_remaining", queue_remaining)
+
+
+def test_concurrency_follows_health_and_vram(monkeypatch):
+    _setup(monkeypatch, _Health(ready=False))
+    assert rp_handler.concurrency_modifier(3) == 1
+
+    # Нет данных об очереди и VRAM - максимум
+    _setup(monkeypatch, _Health())
+    assert rp_handler.concurrency_modifier(1) == 4
+
+    _setup(monkeypatch, _Health(vram_free=8 * 1024 ** 3))
+    assert rp_handler.concurrency_modifier(1) == 4
+    _setup(monkeypatch, _Health(vram_free=1 * 1024 ** 3))
+    assert rp_handler.concurrency_modifier(3) == 1
+
+
+def test_full_queue_keeps_current_concurrency(monkeypatch):
+    """Полная очередь не дает брать новые задачи, но и не отбирает текущие"""
+    _setup(monkeypatch, _Health(), queue_remaining=1)
+    assert rp_handler.concurrency_modifier(2) == 4
+
+    _setup(monkeypatch, _Health(), queue_remaining=2)
+    assert rp_handler.concurrency_modifier(3) == 3
+    assert rp_handler.concurrency_modifier(0) == 1
+
+    # Графы, ждущие в планировщике, считаются частью очереди
+    _setup(monkeypatch, _Health(), queue_remaining=None, pending=2)
+    assert rp_handler.concurrency_modifier(2) == 2
+    _setup(monkeypatch, _Health(), queue_remaining=1, pending=1)
+    assert rp_handler.concurrency_modifier(2) == 2
+
+
+def test_job_namespace_is_sanitized():
+    assert WorkflowHandler.job_namespace(None) is None
+    assert WorkflowHandler.job_namespace("") is None
+    assert WorkflowHandler.job_namespace("abc-123_x") == "jobs/abc-123_x"
+    # Разделители пути и прочие символы не выводят за пределы jobs/
+    assert WorkflowHandler.job_namespace("../../etc passwd") == "jobs/______etc_passwd"
+
+
+def test_jobs_write_outputs_to_own_folders():
+    first, _, first_meta = process_workflow(
+        WORKFLOW, prompt="a cat", job_id="job-a", workflow_type=WorkflowType.T2I
+    )
+    second, _, second_meta = process_workflow(
+        WORKFLOW, prompt="a dog", job_id="job/b", workflow_type=WorkflowType.T2I
+    )
+    no_job, _, no_job_meta = process_workflow(WORKFLOW, prompt="a cat", workflow_type=WorkflowType.T2I)
+
+    assert first["80"]["inputs"]["filename_prefix"] == "jobs/job-a/wan"
+    assert second["80"]["inputs"]["filename_prefix"] == "jobs/job_b/wan"
+    assert first_meta["job_namespace"] == "jobs/job-a" and second_meta["job_namespace"] == "jobs/job_b"
+    assert no_job["80"]["inputs"]["filename_prefix"] == "wan" and no_job_meta["job_namespace"] is None
+    assert WORKFLOW["80"]["inputs"]["filename_prefix"] == "wan"
+
+    # Префикс, уже указывающий в подпапку задачи, не удваивается
+    again, _, _ = process_workflow(first, prompt="a cat", job_id="job-a", workflow_type=WorkflowType.T2I)
+    assert again["80"]["inputs"]["filename_prefix"] == "jobs/job-a/wan"
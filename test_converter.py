@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты преобразования UI воркфлоу в API формат
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.converter import WorkflowConverter, convert_ui_workflow
+from workflows.object_info import ObjectInfoStore
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load(name):
+    with open(os.path.join(ROOT, "workflow", name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_shipped_workflow_converts_with_bundled_snapshot():
+    """Виджеты сопоставляются по описаниям узлов, bypass и заметки удаляются"""
+    store = ObjectInfoStore(cache_path=os.path.join(tempfile.gettempdir(), "missing", "object_info.json"))
+    api = convert_ui_workflow(_load("wan_A14b_img2img_2+3_steps.json"), store.get())
+
+    sampler = api["35"]
+    assert sampler["class_type"] == "KSamplerAdvanced"
+    assert sampler["inputs"]["noise_seed"] == 432
+    assert sampler["inputs"]["steps"] == 8
+    assert sampler["inputs"]["sampler_name"] == "res_2s"
+    assert sampler["inputs"]["latent_image"] == ["96", 0]
+    assert api["94"]["inputs"] == {"image": "ComfyUI_04099_3.jpg"}
+    # Ширина подключена проводом от PrimitiveInt
+    assert api["95"]["inputs"]["width"] == ["58", 0]
+
+    class_types = {node["class_type"] for node in api.values()}
+    assert not class_types & {"Note", "MarkdownNote", "easy cleanGpuUsed"}
+
+
+def test_bypass_rewires_and_conversion_is_memoized():
+    """Обойденный узел заменяется проводом с его входа; повторное преобразование берется из кэша"""
+    ui = {
+        "nodes": [
+            {"id": 1, "type": "LoadImage", "mode": 0, "inputs": [], "outputs": [{"type": "IMAGE"}], "widgets_values": ["a.png", "image"]},
+            {"id": 2, "type": "FastFilmGrain", "mode": 4, "inputs": [{"name": "images", "type": "IMAGE", "link": 1}],
+             "outputs": [{"type": "IMAGE"}], "widgets_values": [0.1, 0.2]},
+            {"id": 3, "type": "SaveImage", "mode": 0, "inputs": [{"name": "images", "type": "IMAGE", "link": 2}], "widgets_values": ["out"]},
+        ],
+        "links": [[1, 1, 0, 2, 0, "IMAGE"], [2, 2, 0, 3, 0, "IMAGE"]],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ObjectInfoStore(cache_path=os.path.join(tmp, "object_info.json"))
+        converter = WorkflowConverter(store, cache_dir=os.path.join(tmp, "converted"))
+
+        api = converter.convert(ui)
+        assert set(api) == {"1", "3"}
+        assert api["3"]["inputs"] == {"filename_prefix": "out", "images": ["1", 0]}
+
+        assert converter.convert(ui) is api
+        assert len(os.listdir(os.path.join(tmp, "converted"))) == 1
+        assert WorkflowConverter(store, cache_dir=os.path.join(tmp, "converted")).convert(ui) == api
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты загрузки входных файлов по ссылкам и кэша по URL + ETag
+"""
+
+import io
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.downloads import DownloadCache
+from workflows.inputs import InputStore
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), color="green").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _AssetHandler(BaseHTTPRequestHandler):
+    """Отдает картинку с ETag и отвечает 304 на совпадающий If-None-Match"""
+
+    body = _png()
+    etag = '"v1"'
+    downloads = 0
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        type(self).downloads += 1
+        self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_download_is_cached_by_etag():
+    """Повторная ссылка не скачивается, пока ETag не изменился"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _AssetHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/frame.png"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = DownloadCache(InputStore(tmp), workers=2)
+
+            first = cache.submit(url).result(timeout=10)
+            assert cache.fetch(url) == first
+            assert _AssetHandler.downloads == 1
+
+            with open(cache.store.path(first), "rb") as f:
+                assert f.read() == _AssetHandler.body
+
+            # Новый кэш читает индекс с диска
+            assert DownloadCache(InputStore(tmp), workers=1).fetch(url) == first
+            assert _AssetHandler.downloads == 1
+
+            _AssetHandler.etag = '"v2"'
+            assert cache.fetch(url) == first
+            assert _AssetHandler.downloads == 2
+    finally:
+        server.shutdown()
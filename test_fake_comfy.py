@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты имитации ComfyUI и бенчмарка обработчика
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.fake_comfy import FakeComfyUI
+from workflows.client import ComfyClient
+from workflows.tracker import CompletionTracker
+
+WORKFLOW = {
+    "1": {"class_type": "UNETLoader", "inputs": {"unet_name": "wan.safetensors", "weight_dtype": "default"}},
+    "2": {"class_type": "KSamplerAdvanced", "inputs": {"model": ["1", 0], "noise_seed": 1}},
+    "3": {"class_type": "SaveImage", "inputs": {"images": ["2", 0], "filename_prefix": "jobs/a/wan"}},
+}
+
+
+@pytest.fixture
+def comfy(tmp_path):
+    server = FakeComfyUI(str(tmp_path / "output"), node_delays={"KSamplerAdvanced": 0.05}, fail_nodes={"VAEDecode"})
+    client = ComfyClient(server.start(), max_retries=0)
+    tracker = CompletionTracker(client)
+    tracker.start()
+    yield server, client, tracker
+    tracker.stop()
+    server.stop()
+
+
+def test_executes_graph_with_socket_events_and_outputs(comfy, tmp_path):
+    server, client, tracker = comfy
+    events = []
+
+    prompt_id = client.queue_prompt(WORKFLOW, client_id=tracker.client_id)["prompt_id"]
+    result = tracker.wait(prompt_id, timeout=10, on_event=lambda msg_type, data: events.append((msg_type, data)))
+
+    image = result["outputs"]["3"]["images"][0]
+    assert image == {"filename": "wan_00001_.png", "subfolder": "jobs/a", "type": "output"}
+    assert client.view(image["filename"], image["subfolder"]).startswith(b"\x89PNG")
+    types = [msg_type for msg_type, _ in events]
+    assert "progress" in types and "executed" in types
+    assert ("executing", None) in [(msg_type, data.get("node")) for msg_type, data in events]
+    assert [msg_type for msg_type, _ in result["status"]["messages"]] == [
+        "execution_start", "execution_cached", "execution_success"
+    ]
+
+    # Повторный граф с другим сидом: загрузчик берется из кэша
+    changed = {**WORKFLOW, "2": {**WORKFLOW["2"], "inputs": {**WORKFLOW["2"]["inputs"], "noise_seed": 2}}}
+    prompt_id = client.queue_prompt(changed, client_id=tracker.client_id)["prompt_id"]
+    result = tracker.wait(prompt_id, timeout=10)
+    messages = dict((msg_type, data) for msg_type, data in result["status"]["messages"])
+    assert messages["execution_cached"]["nodes"] == ["1"]
+    assert result["outputs"]["3"]["images"][0]["filename"] == "wan_00002_.png"
+
+
+def test_failure_injection(comfy):
+    server, client, tracker = comfy
+    failing = {**WORKFLOW, "4": {"class_type": "VAEDecode", "inputs": {"samples": ["2", 0]}}}
+
+    prompt_id = client.queue_prompt(failing, client_id=tracker.client_id)["prompt_id"]
+    with pytest.raises(Exception, match="VAEDecode"):
+        tracker.wait(prompt_id, timeout=10)
+    assert client.get_history(prompt_id)[prompt_id]["status"]["status_str"] == "error"
+
+
+def test_benchmark_reports_levels(tmp_path):
+    """Бенчмарк обработчика выполняется отдельным процессом и сохраняет отчет"""
+    report = tmp_path / "bench.json"
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_handler", "--jobs", "3", "--concurrency", "1,2", "--json", str(report)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True, timeout=120
+    )
+
+    levels = json.loads(report.read_text())["levels"]
+    assert [level["concurrency"] for level in levels] == [1, 2]
+    assert all(level["failed"] == 0 for level in levels)
+    assert levels[0]["overhead_ms"]["p50"] is not None
+    assert "execution" in levels[0]["stages_ms_p50"]
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты графа воркфлоу: определение типа, порядок узлов, проверка связей
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.base import WorkflowType
+from workflows.graph import WorkflowGraph
+from workflows.outputs import collect_output_files
+from workflows.plan import compile_workflow, structure_hash
+from workflows.registry import WorkflowRegistry
+
+
+@pytest.fixture(scope="module")
+def registry():
+    registry = WorkflowRegistry()
+    registry.reload()
+    return registry
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("wan_A14B_t2i_2+2steps", WorkflowType.T2I),
+    ("wan_A14B_t2v_1+2_steps", WorkflowType.T2V),
+    ("wan_A14B_v2v_upscale_3steps_97frames", WorkflowType.VIDEO_UPSCALE),
+    ("wan_A14b_img2img_2+3_steps", WorkflowType.IMG2IMG),
+])
+def test_registry_types(registry, name, expected):
+    workflow = registry.get(name).workflow
+    graph = compile_workflow(workflow).graph
+
+    graph.validate()
+    assert graph.workflow_type == expected
+
+
+def test_type_follows_links_not_node_presence():
+    """LoadImage, не связанный с результатом, не делает воркфлоу Img2Img"""
+    workflow = {
+        "1": {"class_type": "LoadImage", "inputs": {"image": "a.png"}},
+        "2": {"class_type": "EmptyLatentImage", "inputs": {"width": 64}},
+        "3": {"class_type": "VAEDecode", "inputs": {"samples": ["2", 0]}},
+        "4": {"class_type": "SaveImage", "inputs": {"images": ["3", 0]}},
+    }
+    assert WorkflowGraph(workflow).workflow_type == WorkflowType.T2I
+
+    workflow["2"] = {"class_type": "VAEEncode", "inputs": {"pixels": ["1", 0]}}
+    assert WorkflowGraph(workflow).workflow_type == WorkflowType.IMG2IMG
+    assert WorkflowGraph({"1": {"class_type": "KSampler", "inputs": {}}}).workflow_type == WorkflowType.UNKNOWN
+
+
+def test_order_depth_and_validation():
+    workflow = {
+        "9": {"class_type": "SaveImage", "inputs": {"images": ["3", 0]}},
+        "3": {"class_type": "VAEDecode", "inputs": {"samples": ["1", 0], "vae": ["2", 0]}},
+        "2": {"class_type": "VAELoader", "inputs": {}},
+        "1": {"class_type": "KSampler", "inputs": {}},
+    }
+    graph = WorkflowGraph(workflow)
+
+    assert graph.order == ["2", "1", "3", "9"]
+    assert graph.depth["9"] == 2
+    assert graph.ancestors("9") == {"1", "2", "3"}
+
+    dangling = WorkflowGraph({**workflow, "3": {"class_type": "VAEDecode", "inputs": {"samples": ["7", 0]}}})
+    dangling.validate()
+    assert dangling.missing_links == [("3", "samples", "7")]
+    with pytest.raises(ValueError, match="цикл"):
+        WorkflowGraph({**workflow, "1": {"class_type": "KSampler", "inputs": {"latent": ["3", 0]}}}).validate()
+
+
+def test_structure_hash_includes_links():
+    first = {"1": {"class_type": "A", "inputs": {"x": ["2", 0]}}, "2": {"class_type": "B", "inputs": {}}, "3": {"class_type": "B", "inputs": {}}}
+    second = {**first, "1": {"class_type": "A", "inputs": {"x": ["3", 0]}}}
+
+    assert structure_hash(first) != structure_hash(second)
+
+
+def test_final_output_first(registry):
+    """Итоговое видео (после интерполяции) идет раньше промежуточного"""
+    workflow = registry.get("wan_A14B_t2v_1+2_steps").workflow
+    result = {"outputs": {
+        "92": {"gifs": [{"filename": "raw.mp4", "subfolder": "", "type": "output"}]},
+        "95": {"gifs": [{"filename": "final.mp4", "subfolder": "", "type": "output"}]},
+        "10": {"images": [{"filename": "frame.png", "subfolder": "", "type": "output"}]},
+    }}
+
+    files = collect_output_files(result, WorkflowType.T2V, graph=compile_workflow(workflow).graph)
+
+    assert [f["filename"] for f in files] == ["final.mp4", "raw.mp4", "frame.png"]
+
+
+def test_prune_keeps_only_requested_outputs(registry):
+    workflow = registry.get("wan_A14B_t2v_1+2_steps").workflow
+    graph = compile_workflow(workflow).graph
+
+    pruned, removed = graph.prune(workflow, ["95"])
+
+    assert "95" in pruned and not {"92", "10"} & set(pruned)
+    assert set(removed) == set(workflow) - set(pruned)
+    # Все ссылки оставшихся узлов ведут на оставшиеся узлы
+    assert not WorkflowGraph(pruned).missing_links
+    with pytest.raises(ValueError, match="отсутствуют"):
+        graph.prune(workflow, ["999"])
+
+
+def test_prune_strips_previews_and_unused_nodes():
+    workflow = {
+        "1": {"class_type": "LoadImage", "inputs": {"image": "a.png"}},
+        "2": {"class_type": "PreviewImage", "inputs": {"images": ["1", 0]}},
+        "3": {"class_type": "SaveImage", "inputs": {"images": ["1", 0]}},
+        "4": {"class_type": "PrimitiveInt", "inputs": {"value": 5}},
+    }
+    graph = WorkflowGraph(workflow)
+
+    assert sorted(graph.prune(workflow)[1]) == ["2", "4"]
+    assert graph.prune(workflow, strip_previews=False)[1] == ["4"]
+    # Только превью: оставляем его, иначе у графа не будет выходов
+    only_preview = {key: workflow[key] for key in ("1", "2")}
+    assert WorkflowGraph(only_preview).prune(only_preview)[1] == []
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты состояния готовности ComfyUI: переходы ready/degraded и ответ handler
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.health import HealthMonitor, HealthState
+
+STATS = {"system": {"comfyui_version": "0.3"}, "devices": [{"name": "cuda:0", "vram_free": 8 * 1024 ** 3}]}
+
+
+class _Client:
+    """/system_stats по заданному сценарию: словарь - ответ, строка - ошибка"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+
+    def system_stats(self, retries=0):
+        response = self.responses.pop(0)
+        if isinstance(response, str):
+            raise ConnectionError(response)
+        return response
+
+
+def test_degraded_after_threshold_and_recovery():
+    monitor = HealthMonitor(_Client(STATS, "refused", "refused", STATS), failure_threshold=2)
+
+    assert monitor.check() and monitor.is_ready()
+    assert monitor.state == HealthState.READY
+
+    # Одна ошибка - еще ready, порог - degraded
+    assert not monitor.check()
+    assert monitor.is_ready() and monitor.state == HealthState.READY
+    assert not monitor.check()
+    assert not monitor.is_ready() and monitor.state == HealthState.DEGRADED
+    assert not monitor.wait_ready(0.01)
+
+    assert monitor.check()
+    assert monitor.is_ready() and monitor.consecutive_failures == 0 and monitor.last_error is None
+
+
+def test_starting_until_first_success():
+    """Ошибки до первого успешного ответа не переводят в degraded"""
+    monitor = HealthMonitor(_Client("refused", "refused", "refused"), failure_threshold=2)
+
+    for _ in range(3):
+        monitor.check()
+
+    assert monitor.state == HealthState.STARTING and not monitor.is_ready()
+    assert monitor.consecutive_failures == 3
+
+
+def test_snapshot_payload():
+    monitor = HealthMonitor(_Client(STATS, "refused"), failure_threshold=5)
+    assert monitor.snapshot()["vram_free"] is None
+
+    monitor.check()
+    monitor.check()
+    snapshot = monitor.snapshot()
+
+    assert snapshot["state"] == "ready"
+    assert snapshot["last_error"] == "refused"
+    assert snapshot["consecutive_failures"] == 1
+    assert snapshot["vram_free"] == 8 * 1024 ** 3
+    assert snapshot["last_check"] is not None
+
+
+def test_handler_reports_health_when_degraded(monkeypatch):
+    """Задача при недоступном ComfyUI завершается ошибкой с состоянием монитора"""
+    import rp_handler
+
+    monitor = HealthMonitor(_Client(STATS, "refused", "refused"), failure_threshold=2)
+    for _ in range(3):
+        monitor.check()
+    monkeypatch.setattr(rp_handler, "health_monitor", monitor)
+    monkeypatch.setattr(rp_handler, "JOB_READY_TIMEOUT", 0.01)
+
+    async def run():
+        return [item async for item in rp_handler.handler({"id": "job-h", "input": {"workflow_name": "missing"}})]
+
+    (response,) = asyncio.run(run())
+
+    assert response["error"] == "ComfyUI API недоступен"
+    assert response["health"]["state"] == "degraded"
+    assert response["health"]["consecutive_failures"] == 2
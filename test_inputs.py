@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты контентно-адресуемого хранилища входных файлов
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.inputs import InputStore
+
+
+def _jpeg(color="red", size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color=color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_put_keeps_original_bytes_and_dedupes():
+    """Файл пишется как есть под именем sha256 и не пишется повторно"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = InputStore(tmp)
+        data = _jpeg()
+
+        name = store.put(data)
+        assert name.startswith("cas/") and name.endswith(".jpg")
+        with open(store.path(name), "rb") as f:
+            assert f.read() == data
+
+        mtime = os.path.getmtime(store.path(name))
+        assert store.put(data) == name
+        assert os.path.getmtime(store.path(name)) >= mtime
+        assert len(os.listdir(os.path.join(tmp, "cas"))) == 1
+
+        assert store.placeholder(32, 32) == store.placeholder(32, 32)
+
+
+def test_rejects_invalid_headers():
+    """Мусор вместо изображения/видео отклоняется по заголовку"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = InputStore(tmp)
+        with pytest.raises(ValueError):
+            store.put(b"not an image")
+        with pytest.raises(ValueError):
+            store.put(b"\x00" * 32, "video")
+        assert store.put(b"\x00\x00\x00\x18ftypmp42" + b"\x00" * 16, "video").endswith(".mp4")
+
+
+def test_evicts_least_recently_used():
+    """При превышении бюджета удаляются давно не использованные файлы"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = InputStore(tmp, max_bytes=10 ** 9)
+        store.MIN_AGE = 0
+        old = store.put(_jpeg("red"))
+        past = time.time() - 3600
+        os.utime(store.path(old), (past, past))
+        store.max_bytes = os.path.getsize(store.path(old)) + 1
+
+        new = store.put(_jpeg("blue"))
+
+        assert not os.path.exists(store.path(old))
+        assert os.path.exists(store.path(new))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты жизненного цикла файлов задач: удаление выходов и бюджет диска
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.janitor import DiskJanitor
+
+
+def write(path, size, age=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"0" * size)
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_release_job_removes_only_job_folder(tmp_path):
+    output = tmp_path / "output"
+    job_file = write(str(output / "jobs" / "job-1" / "0" / "wan_00001_.png"), 100)
+    other = write(str(output / "jobs" / "job-2" / "wan_00001_.png"), 100)
+    outside = write(str(tmp_path / "secret.txt"), 10)
+    janitor = DiskJanitor(output_dir=str(output), temp_dir=str(tmp_path / "temp"))
+
+    janitor.release_job("jobs/job-1").result(timeout=5)
+
+    assert not os.path.exists(os.path.dirname(os.path.dirname(job_file)))
+    assert os.path.exists(other) and os.path.exists(outside)
+    assert janitor.release_job("jobs/../../secret.txt") is None
+    assert janitor.release_job("jobs/missing") is None
+    assert janitor.release_job(None) is None
+    stats = janitor.stats()
+    assert stats["jobs_released"] == 1 and stats["released_bytes"] == 100
+    assert stats["release_pending"] == 0
+
+
+def test_sweep_enforces_budget_lru(tmp_path):
+    output, temp = tmp_path / "output", tmp_path / "temp"
+    oldest = write(str(output / "jobs" / "a" / "old.mp4"), 400, age=3000)
+    older = write(str(temp / "preview.png"), 400, age=2000)
+    recent = write(str(output / "jobs" / "b" / "new.mp4"), 400, age=10)
+    os.makedirs(output / "jobs" / "empty")
+    os.utime(output / "jobs" / "empty", (time.time() - 3000, time.time() - 3000))
+
+    evicted = []
+
+    class Cache:
+        def evict(self):
+            evicted.append(True)
+
+    janitor = DiskJanitor(
+        output_dir=str(output), temp_dir=str(temp), max_bytes=500, min_free_bytes=0, min_age=60, caches=[Cache()]
+    )
+    result = janitor.sweep()
+
+    # Самые старые файлы вытесняются до бюджета; свежий файл задачи не трогается
+    assert not os.path.exists(oldest) and not os.path.exists(older)
+    assert os.path.exists(recent)
+    assert result["freed"] == 800 and result["output_bytes"] == 400
+    assert not os.path.exists(output / "jobs" / "empty")
+    assert evicted == [True]
+
+    stats = janitor.stats()
+    assert stats["evicted_files"] == 2 and stats["output_files"] == 1
+    assert str(output) in stats["disk"] and stats["disk"][str(output)]["free_gb"] > 0
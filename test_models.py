@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты манифеста моделей, кэша хэшей и прогрева page cache
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.models import ModelManifest, ModelPrefetcher, HashCache, workflow_models
+from workflows.registry import WorkflowRegistry
+
+
+def _models(tmp_path):
+    models_dir = tmp_path / "models"
+    (models_dir / "diffusion_models").mkdir(parents=True)
+    (models_dir / "vae").mkdir()
+    (models_dir / "diffusion_models" / "unet.safetensors").write_bytes(b"u" * 1000)
+    (models_dir / "vae" / "vae.safetensors").write_bytes(b"v" * 10)
+    return models_dir
+
+
+def test_manifest_derived_from_registry():
+    """Манифест собирается из загрузчиков воркфлоу реестра"""
+    registry = WorkflowRegistry()
+    registry.reload()
+    manifest = ModelManifest.from_registry(registry, manifest_path="/nonexistent.json")
+
+    names = {entry["name"]: entry for entry in manifest.entries}
+    unet = names["wan2.2_t2v_high_noise_14B_fp8_scaled.safetensors"]
+    assert unet["folders"] == ["unet", "diffusion_models"]
+    assert "wan_A14B_t2v_1+2_steps" in unet["workflows"]
+    assert "Wan2.1_VAE.pth" in names
+
+    # Выход FILM с ckpt_name не является загрузчиком модели
+    assert workflow_models({"1": {"class_type": "FILM VFI", "inputs": {"ckpt_name": "film.pth"}}}) == []
+
+
+def test_verify_and_hash_cache(tmp_path):
+    models_dir = _models(tmp_path)
+    unet_sha = hashlib.sha256(b"u" * 1000).hexdigest()
+    manifest = ModelManifest([
+        {"name": "unet.safetensors", "folders": ["unet", "diffusion_models"], "size": 1000, "sha256": unet_sha},
+        {"name": "vae.safetensors", "folders": ["vae"], "size": 11},
+        {"name": "clip.safetensors", "folders": ["clip"]},
+    ], str(models_dir))
+
+    hashes = HashCache(str(tmp_path / "hashes.json"))
+    report = manifest.verify(hashes)
+    assert report["ok"] == ["unet.safetensors"]
+    assert report["size_mismatch"] == ["vae.safetensors"]
+    assert report["missing"] == ["clip.safetensors"]
+
+    # Хэш неизменившегося файла берется из кэша на диске
+    cached = json.loads((tmp_path / "hashes.json").read_text())
+    key = next(iter(cached))
+    cached[key]["sha256"] = "from-cache"
+    (tmp_path / "hashes.json").write_text(json.dumps(cached))
+    assert HashCache(str(tmp_path / "hashes.json")).sha256(str(models_dir / "diffusion_models" / "unet.safetensors")) == "from-cache"
+
+    # Изменение файла (mtime/размер) сбрасывает кэш
+    path = models_dir / "diffusion_models" / "unet.safetensors"
+    path.write_bytes(b"u" * 999)
+    assert HashCache(str(tmp_path / "hashes.json")).sha256(str(path)) == hashlib.sha256(b"u" * 999).hexdigest()
+
+
+def test_prefetch_order_budget_and_progress(tmp_path):
+    models_dir = _models(tmp_path)
+    manifest = ModelManifest([
+        {"name": "vae.safetensors", "folders": ["vae"], "workflows": ["b"]},
+        {"name": "unet.safetensors", "folders": ["diffusion_models"], "workflows": ["a"]},
+    ], str(models_dir))
+
+    paths = manifest.paths_for(["a"])
+    assert paths[0].endswith("unet.safetensors")
+
+    progress_path = tmp_path / "prefetch.json"
+    prefetcher = ModelPrefetcher(paths, max_bytes=1000, workers=2, progress_path=str(progress_path))
+    result = prefetcher.run()
+
+    assert result["done"] is True
+    assert result["bytes_done"] == result["bytes_total"] == 1000
+    assert result["files_done"] == 1
+    assert result["skipped"] == [paths[1]]
+    assert json.loads(progress_path.read_text())["percent"] == 100.0
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты сбора выходных файлов по метаданным history
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.base import WorkflowType
+from workflows.outputs import collect_output_files
+
+
+HISTORY = {
+    "outputs": {
+        "9": {"images": [{"filename": "frame_00001.png", "subfolder": "jobs/abc", "type": "output"}]},
+        "12": {"images": [{"filename": "preview_00001.png", "subfolder": "", "type": "temp"}]},
+        "30": {"gifs": [{"filename": "wan_00001.mp4", "subfolder": "jobs/abc", "type": "output", "format": "video/h264-mp4"}]},
+        "31": {"gifs": [{"filename": "../../etc/passwd", "subfolder": "", "type": "output"}]},
+    }
+}
+
+
+def test_collect_all_outputs_expected_type_first():
+    """Все файлы из output, видео для T2V первым, путь с подпапкой"""
+    files = collect_output_files(HISTORY, WorkflowType.T2V)
+
+    assert [f["filename"] for f in files] == ["wan_00001.mp4", "frame_00001.png"]
+    assert files[0]["type"] == "video"
+    assert files[0]["path"] == "/comfyui/output/jobs/abc/wan_00001.mp4"
+    assert files[1]["node_id"] == "9"
+
+
+def test_selected_nodes_include_temp():
+    """Явно выбранные узлы отдаются в указанном порядке, включая превью"""
+    files = collect_output_files(HISTORY, WorkflowType.T2V, node_ids=["12", 9])
+
+    assert [f["node_id"] for f in files] == ["12", "9"]
+    assert files[0]["path"] == "/comfyui/temp/preview_00001.png"
+
+
+def test_gifs_type_is_per_file():
+    """Картинка в gifs не меняет тип следующего за ней видео"""
+    history = {"outputs": {"30": {"gifs": [
+        {"filename": "wan_00001.png", "subfolder": "", "type": "output"},
+        {"filename": "wan_00001.mp4", "subfolder": "", "type": "output"},
+    ]}}}
+
+    files = collect_output_files(history, WorkflowType.T2V)
+
+    assert {f["filename"]: f["type"] for f in files} == {"wan_00001.mp4": "video", "wan_00001.png": "image"}
+    assert files[0]["filename"] == "wan_00001.mp4"
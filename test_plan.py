@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты скомпилированных планов подстановки параметров
+"""
+
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows import plan as plan_module, process_workflow, process_batch
+from workflows.plan import compile_workflow
+
+
+WORKFLOW = {
+    "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "old", "clip": ["38", 0]}, "_meta": {"title": "Positive"}},
+    "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry", "clip": ["38", 0]}, "_meta": {"title": "Negative"}},
+    "57": {"class_type": "KSamplerAdvanced", "inputs": {"noise_seed": 0, "steps": 4}, "_meta": {"title": "High noise"}},
+    "58": {"class_type": "KSamplerAdvanced", "inputs": {"noise_seed": 0, "steps": 4}, "_meta": {"title": "Low noise"}},
+    "80": {"class_type": "SaveImage", "inputs": {"filename_prefix": "wan"}},
+}
+
+
+def test_selectors_patch_only_targeted_nodes():
+    """Селектор по id/заголовку меняет один узел, имя входа - все; исходник не меняется"""
+    original = copy.deepcopy(WORKFLOW)
+    plan = compile_workflow(WORKFLOW)
+
+    prepared = plan.apply(
+        WORKFLOW,
+        prompt="a cat",
+        options={"seed": 5, "steps": 6, "title:Low noise.steps": 8, "57.noise_seed": 1},
+        output_prefix="jobs/a"
+    )
+
+    assert prepared["6"]["inputs"]["text"] == "a cat"
+    assert prepared["7"]["inputs"]["text"] == "blurry"
+    assert prepared["57"]["inputs"] == {"noise_seed": 1, "steps": 6}
+    assert prepared["58"]["inputs"] == {"noise_seed": 5, "steps": 8}
+    assert prepared["80"]["inputs"]["filename_prefix"] == "jobs/a/wan"
+    assert WORKFLOW == original
+
+    with pytest.raises(ValueError):
+        plan.apply(WORKFLOW, options={"seed": 1, "KSamplerAdvanced.cfg": 2})
+
+
+def test_plan_is_cached_by_structure():
+    """Воркфлоу с другими значениями, но той же структурой используют один план"""
+    changed = copy.deepcopy(WORKFLOW)
+    changed["57"]["inputs"]["steps"] = 20
+    assert compile_workflow(changed) is compile_workflow(WORKFLOW)
+
+    del changed["80"]
+    assert compile_workflow(changed) is not compile_workflow(WORKFLOW)
+
+
+def test_request_compiles_plan_once(monkeypatch):
+    """Анализ, подготовка и отсечение узлов запроса используют переданный план без повторного хэширования"""
+    calls = []
+    original = plan_module.structure_hash
+    monkeypatch.setattr(plan_module, "structure_hash", lambda workflow: calls.append(1) or original(workflow))
+
+    plan = compile_workflow(WORKFLOW)
+    prepared, workflow_type, _ = process_workflow(WORKFLOW, prompt="a cat", options={"seed": 1}, plan=plan)
+    items, _, _ = process_batch(WORKFLOW, [{"seed": 1}, {"seed": 2}], prompt="a cat", plan=plan)
+
+    assert len(calls) == 1
+    assert prepared["6"]["inputs"]["text"] == "a cat"
+    assert [item["workflow"]["57"]["inputs"]["noise_seed"] for item in items] == [1, 2]
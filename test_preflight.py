@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты предстартовых проверок и их учета в отчете о запуске
+"""
+
+import importlib.abc
+import json
+import os
+import stat
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows import preflight
+from workflows.models import ModelManifest
+from workflows.preflight import run_preflight, check_models
+from workflows.startup import StartupReport
+
+
+def test_checks_run_concurrently_and_image_checks_are_cached(tmp_path):
+    """Проверки идут параллельно; успешные проверки образа повторно не выполняются"""
+    calls = []
+
+    def slow(name):
+        def check():
+            calls.append(name)
+            time.sleep(0.2)
+            return {"name": name}
+        return check
+
+    def broken():
+        calls.append("broken")
+        raise ImportError("No module named 'xformers'")
+
+    checks = [
+        ("torch", slow("torch"), True),
+        ("torchvision", slow("torchvision"), True),
+        ("xformers", broken, True),
+        ("models", slow("models"), False),
+    ]
+
+    first = run_preflight(checks, version="1.2.3", cache_dir=str(tmp_path))
+    assert first["total_seconds"] < 0.5
+    assert first["checks"]["torch"] == {"status": "ok", "name": "torch", "seconds": first["checks"]["torch"]["seconds"]}
+    assert "xformers" in first["checks"]["xformers"]["error"]
+
+    calls.clear()
+    second = run_preflight(checks, version="1.2.3", cache_dir=str(tmp_path))
+    # Неудачная проверка и проверки окружения выполняются снова
+    assert sorted(calls) == ["broken", "models"]
+    assert second["checks"]["torch"]["cached"] is True
+
+    calls.clear()
+    run_preflight(checks, version="1.2.4", cache_dir=str(tmp_path))
+    assert len(calls) == 4
+
+
+class _ImportGuard(importlib.abc.MetaPathFinder):
+    """Запоминает попытки импорта тяжелых пакетов образа"""
+
+    PACKAGES = {"torch", "torchvision", "xformers", "torchaudio"}
+
+    def __init__(self):
+        self.attempts = []
+
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in self.PACKAGES:
+            self.attempts.append(name)
+        return None
+
+
+def test_warm_container_does_not_import_torch(tmp_path, monkeypatch):
+    """Повторный старт той же версии образа берет проверки образа из кэша, GPU - из nvidia-smi"""
+    smi = tmp_path / "nvidia-smi"
+    smi.write_text("#!/bin/sh\necho 'NVIDIA L40S, 46068, 550.54'\n")
+    smi.chmod(smi.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(preflight, "NVIDIA_SMI", str(smi))
+    cached = {name: {"status": "ok"} for name, _, cacheable in preflight.CHECKS if cacheable}
+    (tmp_path / "preflight-1.0.json").write_text(json.dumps(cached))
+    checks = [check for check in preflight.CHECKS if check[0] not in ("models", "custom_nodes")]
+
+    guard = _ImportGuard()
+    monkeypatch.setattr(sys, "meta_path", [guard] + sys.meta_path)
+    for name in guard.PACKAGES:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    report = run_preflight(checks, version="1.0", cache_dir=str(tmp_path))
+
+    assert guard.attempts == []
+    assert all(report["checks"][name]["cached"] for name in cached)
+    assert report["checks"]["gpu"] == {
+        "status": "ok", "gpu": "NVIDIA L40S", "vram_gb": 45.0, "driver": "550.54", "count": 1,
+        "seconds": report["checks"]["gpu"]["seconds"]
+    }
+
+    monkeypatch.setattr(preflight, "NVIDIA_SMI", str(tmp_path / "missing"))
+    assert "nvidia-smi" in run_preflight([("gpu", preflight.check_gpu, False)])["checks"]["gpu"]["error"]
+
+
+def test_check_models_reports_missing(tmp_path):
+    (tmp_path / "unet").mkdir()
+    (tmp_path / "unet" / "a.safetensors").write_bytes(b"x")
+    a = {"name": "a.safetensors", "folders": ["unet", "diffusion_models"], "size": 1}
+
+    assert check_models(ModelManifest([a], str(tmp_path)))["found"] == 1
+    try:
+        check_models(ModelManifest([a, {"name": "b.safetensors", "folders": ["vae"]}], str(tmp_path)))
+    except RuntimeError as e:
+        assert "b.safetensors (missing)" in str(e)
+    else:
+        raise AssertionError("ожидалась ошибка")
+
+
+def test_startup_report_includes_boot_stages(tmp_path, monkeypatch):
+    """Отчет о запуске включает загрузку ComfyUI и preflight из скрипта запуска"""
+    report_path = tmp_path / "preflight.json"
+    report_path.write_text(json.dumps({
+        "version": "1.2.3", "total_seconds": 1.5,
+        "checks": {"torch": {"status": "ok", "seconds": 0.0, "cached": True}, "models": {"status": "error", "seconds": 1.5}}
+    }))
+    monkeypatch.setattr("workflows.startup.load_report", lambda: preflight.load_report(str(report_path)))
+    monkeypatch.setenv("COMFY_STARTED_AT", "100.0")
+    monkeypatch.setenv("COMFY_READY_AT", "112.5")
+
+    report = StartupReport(started_at=time.time() - 20)
+    report.load_boot_stages()
+    result = report.finish()
+
+    assert result["stages"]["comfy_boot"]["seconds"] == 12.5
+    assert result["stages"]["preflight"]["status"] == "error"
+    assert result["stages"]["preflight"]["failed"] == ["models"]
+    assert result["stages"]["preflight"]["cached"] == ["torch"]
+    assert result["total_seconds"] >= 20
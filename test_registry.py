@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты реестра именованных воркфлоу
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.registry import WorkflowRegistry
+
+
+def _write(path, steps):
+    workflow = {
+        "3": {"class_type": "KSampler", "inputs": {"seed": 0, "steps": steps}},
+        "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": "img"}},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(workflow, f)
+    # mtime с точностью файловой системы может не измениться между записями
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + steps * 1000000))
+
+
+def test_reload_versions_and_pinning():
+    """Измененный файл перезагружается, прежняя версия доступна по хэшу"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "t2i.json")
+        _write(path, 4)
+        with open(os.path.join(tmp, "broken.json"), "w") as f:
+            f.write("{not json")
+
+        registry = WorkflowRegistry([tmp])
+        assert registry.reload()["added"] == ["t2i"]
+        first = registry.get("t2i")
+        assert first.workflow["3"]["inputs"]["steps"] == 4
+        assert registry.reload() == {"added": [], "updated": [], "removed": []}
+
+        _write(path, 8)
+        assert registry.reload()["updated"] == ["t2i"]
+        assert registry.get("t2i").workflow["3"]["inputs"]["steps"] == 8
+        assert registry.get("t2i", first.version[:8]) is first
+
+        with pytest.raises(ValueError):
+            registry.get("t2i", "deadbeef")
+        with pytest.raises(ValueError):
+            registry.get("missing")
+
+        os.remove(path)
+        assert registry.reload()["removed"] == ["t2i"]
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты кэша результатов детерминированных задач
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.results import ResultCache, seed_is_fixed
+
+
+def _workflow(seed=42, prefix="wan"):
+    return {
+        "1": {"class_type": "UNETLoader", "inputs": {"unet_name": "model.safetensors"}},
+        "2": {"class_type": "KSampler", "inputs": {"seed": seed, "model": ["1", 0]}},
+        "3": {"class_type": "SaveImage", "inputs": {"filename_prefix": prefix, "images": ["2", 0]}},
+    }
+
+
+def test_key_ignores_output_prefix_and_tracks_models():
+    """Ключ не зависит от подпапки задачи, но меняется вместе с сидом и файлом модели"""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "unet"))
+        model_path = os.path.join(tmp, "unet", "model.safetensors")
+        with open(model_path, "wb") as f:
+            f.write(b"weights")
+        cache = ResultCache(os.path.join(tmp, "cache"), input_dir=tmp, models_dir=tmp)
+
+        key = cache.key(_workflow())
+        assert cache.key(_workflow(prefix="jobs/other/wan")) == key
+        assert cache.key(_workflow(seed=7)) != key
+
+        with open(model_path, "wb") as f:
+            f.write(b"new weights")
+        assert cache.key(_workflow()) != key
+
+    assert seed_is_fixed({}) and seed_is_fixed({"seed": 1})
+    assert not seed_is_fixed({"steps": 6})
+
+
+def test_store_lookup_and_evict():
+    """Сохраненные файлы находятся по ключу, сверх бюджета вытесняются старые записи"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "out.png")
+        with open(output, "wb") as f:
+            f.write(b"x" * 100)
+        files = [{"node_id": "3", "type": "image", "filename": "out.png", "subfolder": "", "path": output}]
+        cache = ResultCache(os.path.join(tmp, "cache"), max_bytes=10 ** 6)
+
+        cache.store("old", files, "p1")
+        manifest = cache.lookup("old")
+        assert manifest["prompt_id"] == "p1"
+        with open(manifest["files"][0]["path"], "rb") as f:
+            assert f.read() == b"x" * 100
+        assert cache.lookup("missing") is None
+
+        past = time.time() - 3600
+        os.utime(os.path.join(tmp, "cache", "old", "manifest.json"), (past, past))
+        cache.max_bytes = 300
+        cache.store("new", files, "p2")
+        assert cache.lookup("old") is None
+        assert cache.lookup("new") is not None
+
+        # Запись без файлов - промах, граф выполняется заново
+        cache.store("empty", [], "p3")
+        assert cache.lookup("empty") is None
+
+
+def test_handler_cache_hit_returns_selected_preview(tmp_path, monkeypatch):
+    """Повторный запрос с output_nodes на превью получает из кэша те же файлы, что и первый"""
+    import rp_handler
+    from workflows import outputs
+    from workflows.scheduler import ModelAffinityScheduler
+
+    for folder in ("output", "temp"):
+        (tmp_path / folder).mkdir()
+        monkeypatch.setitem(outputs.FOLDERS, folder, str(tmp_path / folder))
+    (tmp_path / "output" / "wan_00001_.png").write_bytes(b"final")
+    (tmp_path / "temp" / "preview_00001_.png").write_bytes(b"preview")
+    history = {"outputs": {
+        "3": {"images": [{"filename": "wan_00001_.png", "subfolder": "", "type": "output"}]},
+        "4": {"images": [{"filename": "preview_00001_.png", "subfolder": "", "type": "temp"}]},
+    }}
+    queued = []
+
+    def queue_workflow(workflow):
+        queued.append(workflow)
+        return f"p{len(queued)}"
+
+    cache = ResultCache(str(tmp_path / "cache"), input_dir=str(tmp_path), models_dir=str(tmp_path))
+    monkeypatch.setattr(rp_handler, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(rp_handler, "get_result_cache", lambda: cache)
+    monkeypatch.setattr(rp_handler, "get_output_sink", lambda storage: None)
+    monkeypatch.setattr(rp_handler.health_monitor, "is_ready", lambda: True)
+    monkeypatch.setattr(rp_handler, "wait_for_completion", lambda prompt_id, timeout=600, on_event=None: history)
+    monkeypatch.setattr(rp_handler, "scheduler", ModelAffinityScheduler(queue_workflow, max_inflight=2))
+    workflow = {**_workflow(), "4": {"class_type": "PreviewImage", "inputs": {"images": ["2", 0]}}}
+
+    async def run(job_id, output_nodes=None):
+        event = {"id": job_id, "input": {
+            "workflow": workflow, "prompt": "a cat", "options": {"seed": 42}, "stream": False, "output_nodes": output_nodes
+        }}
+        return [item async for item in rp_handler.handler(event)]
+
+    (first,) = asyncio.run(run("job-c1", ["4"]))
+    (second,) = asyncio.run(run("job-c2", ["4"]))
+
+    assert first["metadata"]["result_cache"] == "miss"
+    assert second["metadata"]["result_cache"] == "hit"
+    assert second["filename"] == first["filename"] == "preview_00001_.png"
+    assert second["image"] == first["image"]
+    assert len(queued) == 1
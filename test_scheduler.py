@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты планировщика с учетом загруженных моделей
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.scheduler import ModelAffinityScheduler, model_set
+
+
+def _graph(unet, lora=None, strength=1.0):
+    graph = {
+        "1": {"class_type": "UNETLoader", "inputs": {"unet_name": unet, "weight_dtype": "fp8"}},
+        "2": {"class_type": "CLIPLoader", "inputs": {"clip_name": "umt5.safetensors", "type": "wan"}},
+        "3": {"class_type": "KSampler", "inputs": {"model": ["1", 0], "seed": 1}},
+    }
+    if lora:
+        graph["4"] = {"class_type": "LoraLoaderModelOnly", "inputs": {
+            "model": ["1", 0], "lora_name": lora, "strength_model": strength
+        }}
+    return graph
+
+
+class _Comfy:
+    """Очередь ComfyUI: запоминает порядок отправки графов"""
+
+    def __init__(self):
+        self.order = []
+
+    def queue(self, workflow):
+        self.order.append(workflow["1"]["inputs"]["unet_name"])
+        return f"p{len(self.order)}"
+
+
+def test_model_set_includes_lora_strength():
+    """Набор моделей различает LoRA по силе и не зависит от значений семплера"""
+    assert model_set(_graph("high.safetensors")) == model_set({**_graph("high.safetensors"), "3": {}})
+    assert model_set(_graph("a", "lora", 1.0)) != model_set(_graph("a", "lora", 0.5))
+
+
+def test_groups_graphs_by_models_and_counts_swaps():
+    """Графы с моделями последнего отправленного обгоняют остальные"""
+    comfy = _Comfy()
+    scheduler = ModelAffinityScheduler(comfy.queue, max_inflight=1, max_skips=10)
+
+    futures = [scheduler.submit(_graph(unet)) for unet in ["a", "b", "a", "b", "a"]]
+    while scheduler.pending:
+        scheduler.release(f"p{len(comfy.order)}")
+    scheduler.release(f"p{len(comfy.order)}")
+
+    assert comfy.order == ["a", "a", "a", "b", "b"]
+    assert sorted(future.result() for future in futures) == [f"p{i}" for i in range(1, 6)]
+    stats = scheduler.stats()
+    assert stats["swaps"] == 1 and stats["model_loads"] == 1
+    assert stats["inflight"] == 0
+
+
+def test_fairness_limits_overtaking():
+    """Граф, который обогнали max_skips раз, отправляется следующим"""
+    comfy = _Comfy()
+    scheduler = ModelAffinityScheduler(comfy.queue, max_inflight=1, max_skips=2)
+
+    for unet in ["a", "b", "a", "a", "a"]:
+        scheduler.submit(_graph(unet))
+    while scheduler.pending:
+        scheduler.release(f"p{len(comfy.order)}")
+
+    assert comfy.order == ["a", "a", "a", "b", "a"]
+    assert scheduler.stats()["forced"] == 1
+
+
+def test_queue_error_is_reported_on_future():
+    """Ошибка отправки не занимает место в очереди"""
+    def fail(workflow):
+        raise RuntimeError("ComfyUI отклонил граф")
+
+    scheduler = ModelAffinityScheduler(fail, max_inflight=1)
+    future = scheduler.submit(_graph("a"))
+
+    assert "отклонил" in str(future.exception())
+    assert scheduler.stats()["inflight"] == 0
+
+
+def test_cancel_releases_pending_and_sent():
+    """Отозванные графы не остаются в очереди планировщика"""
+    comfy = _Comfy()
+    scheduler = ModelAffinityScheduler(comfy.queue, max_inflight=1)
+    sent = scheduler.submit(_graph("a"))
+    waiting = scheduler.submit(_graph("b"))
+
+    scheduler.cancel(waiting)
+    assert waiting.cancelled() and scheduler.stats()["pending"] == 0
+
+    scheduler.cancel(sent)
+    assert sent.result() == "p1"
+    assert scheduler.stats()["inflight"] == 0
+    assert comfy.order == ["a"]
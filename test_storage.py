@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты загрузки выходных файлов в S3-совместимое хранилище (moto вместо MinIO)
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.storage import S3Settings, get_output_sink
+
+moto = pytest.importorskip("moto")
+
+
+@pytest.fixture
+def s3_env(monkeypatch):
+    monkeypatch.setenv("S3_BUCKET", "outputs-bucket")
+    monkeypatch.setenv("S3_REGION", "us-east-1")
+    monkeypatch.setenv("S3_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("S3_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("S3_PART_SIZE_MB", "5")
+    with moto.mock_aws():
+        import boto3
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="outputs-bucket")
+        yield
+
+
+def test_multipart_upload_returns_presigned_url(s3_env):
+    """Файл больше части загружается multipart и описывается url, размером и sha256"""
+    data = os.urandom(12 * 1024 * 1024)
+    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as f:
+        f.write(data)
+
+    try:
+        sink = get_output_sink()
+        result = sink.upload(f.name, "job-1/video.mp4")
+    finally:
+        os.unlink(f.name)
+
+    assert result["key"] == "outputs/job-1/video.mp4"
+    assert result["size"] == len(data)
+    assert result["sha256"] == hashlib.sha256(data).hexdigest()
+    assert result["content_type"] == "video/mp4"
+    assert "X-Amz-Signature" in result["url"]
+
+    stored = sink.client.get_object(Bucket="outputs-bucket", Key=result["key"])
+    assert stored["Body"].read() == data
+    assert stored["Metadata"]["sha256"] == result["sha256"]
+
+
+def test_request_overrides_and_base64_opt_out(s3_env):
+    """Запрос может сменить префикс или отказаться от хранилища"""
+    assert get_output_sink({"type": "base64"}) is None
+    assert get_output_sink({"prefix": "custom/"}).settings.prefix == "custom"
+
+
+def test_request_cannot_redirect_env_credentials(s3_env):
+    """С ключами воркера запрос не меняет хост, бакет и регион загрузки"""
+    for override in ({"bucket": "other"}, {"endpoint_url": "http://attacker.example"}, {"region": "eu-west-1"}):
+        with pytest.raises(ValueError, match="собственными"):
+            get_output_sink(override)
+    with pytest.raises(ValueError, match="оба ключа"):
+        get_output_sink({"bucket": "other", "access_key_id": "mine"})
+
+    # Со своими ключами запрос загружает куда угодно, ключи воркера не используются
+    settings = get_output_sink({
+        "bucket": "other", "endpoint_url": "http://minio:9000", "access_key_id": "mine", "secret_access_key": "secret"
+    }).settings
+    assert (settings.bucket, settings.endpoint_url, settings.access_key_id) == ("other", "http://minio:9000", "mine")
+    assert get_output_sink({"url_expires": 60, "prefix": "p"}).settings.access_key_id == "test"
+
+
+def test_no_bucket_means_inline_base64(monkeypatch):
+    """Без бакета приемник не создается"""
+    monkeypatch.delenv("S3_BUCKET", raising=False)
+    assert S3Settings.resolve() is None
+    assert get_output_sink() is None
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты потокового ответа: прогресс из сокета, куски файлов, формы ответа handler
+"""
+
+import asyncio
+import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rp_handler
+from workflows.scheduler import ModelAffinityScheduler
+
+
+WORKFLOW = {
+    "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "old", "clip": ["38", 0]}, "_meta": {"title": "Positive"}},
+    "57": {"class_type": "KSamplerAdvanced", "inputs": {"noise_seed": 0, "steps": 4}},
+    "80": {"class_type": "SaveImage", "inputs": {"filename_prefix": "wan", "images": ["57", 0]}},
+}
+
+EVENTS = [
+    ("execution_start", {"prompt_id": "p1"}),
+    ("executing", {"node": "57"}),
+    ("progress", {"node": "57", "value": 1, "max": 3}),
+    ("progress", {"node": "57", "value": 2, "max": 3}),
+    ("progress", {"node": "57", "value": 3, "max": 3}),
+    ("executed", {"node": "57"}),
+]
+
+
+def _comfy(monkeypatch, loop_holder):
+    """ComfyUI с событиями сокета, пришедшими одной пачкой"""
+    def wait_for_completion(prompt_id, timeout=600, on_event=None):
+        if on_event is not None:
+            async def emit():
+                for msg_type, data in EVENTS:
+                    on_event(msg_type, data)
+
+            asyncio.run_coroutine_threadsafe(emit(), loop_holder["loop"]).result()
+        return {"outputs": {}}
+
+    monkeypatch.setattr(rp_handler, "wait_for_completion", wait_for_completion)
+
+
+def test_progress_is_coalesced_per_node(monkeypatch):
+    """Из серии progress одного узла в поток попадает только последнее значение"""
+    holder = {}
+    seen = []
+
+    async def run():
+        holder["loop"] = asyncio.get_running_loop()
+        outcome = {}
+        items = [item async for item in rp_handler._stream_progress(
+            "p1", WORKFLOW, outcome, lambda msg_type, data: seen.append(msg_type)
+        )]
+        return items, outcome
+
+    _comfy(monkeypatch, holder)
+    items, outcome = asyncio.run(run())
+
+    assert [item["status"] for item in items] == ["started", "executing", "progress", "executed"]
+    assert items[1]["class_type"] == "KSamplerAdvanced"
+    assert items[2] == {"status": "progress", "node": "57", "value": 3, "max": 3}
+    # Слушатель таймингов получает все события без прореживания
+    assert len(seen) == len(EVENTS)
+    assert outcome["result"] == {"outputs": {}}
+
+
+def test_file_chunks_are_ordered_and_decodable(tmp_path, monkeypatch):
+    monkeypatch.setattr(rp_handler, "STREAM_CHUNK_SIZE", 6)
+    path = tmp_path / "wan_00001.mp4"
+    path.write_bytes(b"0123456789abcdef")
+    empty = tmp_path / "empty.png"
+    empty.write_bytes(b"")
+
+    async def collect(file_info):
+        return [chunk async for chunk in rp_handler._stream_file_chunks(file_info, 0)]
+
+    chunks = asyncio.run(collect({"path": str(path), "type": "video", "filename": path.name}))
+
+    assert [chunk["chunk_index"] for chunk in chunks] == [0, 1, 2]
+    assert all(chunk["chunks_total"] == 3 and chunk["size"] == 16 for chunk in chunks)
+    # Каждый кусок - самостоятельная base64 строка
+    assert b"".join(base64.b64decode(chunk["data"]) for chunk in chunks) == b"0123456789abcdef"
+
+    (only,) = asyncio.run(collect({"path": str(empty), "type": "image", "filename": empty.name}))
+    assert only["chunks_total"] == 1 and only["data"] == ""
+
+
+def _handler_env(tmp_path, monkeypatch, holder):
+    output = tmp_path / "out.png"
+    output.write_bytes(b"png-data")
+    _comfy(monkeypatch, holder)
+    monkeypatch.setattr(rp_handler, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(rp_handler.health_monitor, "is_ready", lambda: True)
+    monkeypatch.setattr(rp_handler, "get_output_sink", lambda storage: None)
+    monkeypatch.setattr(rp_handler, "get_queue_position", lambda prompt_id: 0)
+    monkeypatch.setattr(rp_handler, "STREAM_CHUNK_SIZE", 3)
+    monkeypatch.setattr(rp_handler, "scheduler", ModelAffinityScheduler(lambda workflow: "p1", max_inflight=2))
+    monkeypatch.setattr(rp_handler, "get_output_files_by_type", lambda result, workflow_type, node_ids=None, graph=None, include_temp=False: [{
+        "path": str(output), "type": "image", "filename": "out.png",
+        "subfolder": "", "node_id": "80", "folder_type": "output"
+    }])
+
+
+def _run_handler(event, holder):
+    async def run():
+        holder["loop"] = asyncio.get_running_loop()
+        return [item async for item in rp_handler.handler(event)]
+
+    return asyncio.run(run())
+
+
+def test_handler_streams_progress_chunks_and_completion(tmp_path, monkeypatch):
+    holder = {}
+    _handler_env(tmp_path, monkeypatch, holder)
+
+    items = _run_handler({"id": "job-s1", "input": {"workflow": WORKFLOW, "prompt": "a cat"}}, holder)
+
+    statuses = [item.get("status") for item in items]
+    assert statuses[0] == "queued" and items[0]["queue_position"] == 0
+    assert statuses[1:5] == ["started", "executing", "progress", "executed"]
+    chunks = [item for item in items if item.get("status") == "output"]
+    assert len(chunks) == 3 and all(chunk["node_id"] == "80" for chunk in chunks)
+    assert b"".join(base64.b64decode(chunk["data"]) for chunk in chunks) == b"png-data"
+    assert statuses[-1] == "completed"
+    assert items[-1]["files_count"] == 1 and "image" not in items[-1]
+    assert rp_handler.scheduler.stats()["inflight"] == 0
+
+
+def test_handler_without_stream_yields_single_item(tmp_path, monkeypatch):
+    """С "stream": false генератор отдает один элемент прежнего формата (/runsync вернет [элемент])"""
+    holder = {}
+    _handler_env(tmp_path, monkeypatch, holder)
+
+    items = _run_handler({"id": "job-s2", "input": {"workflow": WORKFLOW, "prompt": "a cat", "stream": False}}, holder)
+
+    (response,) = items
+    assert base64.b64decode(response["image"]) == b"png-data"
+    assert response["filename"] == "out.png" and response["prompt_id"] == "p1"
+    assert "status" not in response
+
+
+class _FakeSink:
+    """Хранилище, которое только запоминает загруженные ключи"""
+
+    def __init__(self):
+        self.keys = []
+
+    def upload(self, path, key):
+        self.keys.append(key)
+        return {"key": key, "url": f"https://s3.test/{key}"}
+
+
+def test_handler_uploads_to_sink_with_and_without_stream(tmp_path, monkeypatch):
+    """Одиночная задача доставляет выходы в хранилище тем же путем, что и пакет"""
+    holder = {}
+    _handler_env(tmp_path, monkeypatch, holder)
+    sink = _FakeSink()
+    monkeypatch.setattr(rp_handler, "get_output_sink", lambda storage: sink)
+
+    items = _run_handler({"id": "job-s3", "input": {"workflow": WORKFLOW, "prompt": "a cat"}}, holder)
+
+    (uploaded,) = [item for item in items if item.get("status") == "output"]
+    assert uploaded["url"] == "https://s3.test/job-s3/out.png" and uploaded["file_index"] == 0
+    assert items[-1]["status"] == "completed" and items[-1]["url"] == uploaded["url"]
+
+    (response,) = _run_handler({"id": "job-s4", "input": {"workflow": WORKFLOW, "prompt": "a cat", "stream": False}}, holder)
+    assert response["url"] == "https://s3.test/job-s4/out.png"
+    assert response["outputs"][0]["node_id"] == "80" and "data" not in response["outputs"][0]
+    assert sink.keys == ["job-s3/out.png", "job-s4/out.png"]
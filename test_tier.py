@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты локального уровня моделей
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.scheduler import ModelAffinityScheduler
+from workflows.tier import ModelTier, extra_model_paths, model_files
+
+
+def _graph(unet, lora="lora.safetensors"):
+    return {
+        "1": {"class_type": "UNETLoader", "inputs": {"unet_name": unet, "weight_dtype": "default"}},
+        "2": {"class_type": "LoraLoaderModelOnly", "inputs": {"model": ["1", 0], "lora_name": lora, "strength_model": 1.0}},
+    }
+
+
+def _volume(tmp_path, sizes):
+    source = tmp_path / "volume"
+    (source / "diffusion_models").mkdir(parents=True)
+    (source / "loras").mkdir()
+    for relpath, size in sizes.items():
+        (source / relpath).write_bytes(b"m" * size)
+    return source
+
+
+def test_copy_switches_in_complete_files(tmp_path):
+    source = _volume(tmp_path, {"diffusion_models/a.safetensors": 3000, "loras/lora.safetensors": 100})
+    tier = ModelTier(str(tmp_path / "tier"), str(source), max_bytes=10000)
+
+    futures = tier.request({("UNETLoader", "a.safetensors", "default"), ("LoraLoaderModelOnly", "lora.safetensors", 1.0)})
+    for future in futures:
+        future.result()
+
+    assert (tmp_path / "tier" / "diffusion_models" / "a.safetensors").read_bytes() == b"m" * 3000
+    assert (tmp_path / "tier" / "loras" / "lora.safetensors").stat().st_size == 100
+    # Временных файлов не остается; повторный запрос - попадание
+    assert not [name for _root, _dirs, names in os.walk(tmp_path / "tier") for name in names if name.startswith(".tmp-")]
+    assert tier.request({("UNETLoader", "a.safetensors", "default")}) == []
+    assert tier.stats()["hits"] == 1
+    assert tier.stats()["copies"] == 2
+
+
+def test_eviction_keeps_models_needed_by_pending_jobs(tmp_path):
+    source = _volume(tmp_path, {
+        "diffusion_models/a.safetensors": 400,
+        "diffusion_models/b.safetensors": 400,
+        "diffusion_models/c.safetensors": 400,
+    })
+    needed = {("UNETLoader", "a.safetensors", "default")}
+    tier = ModelTier(str(tmp_path / "tier"), str(source), max_bytes=1000, needed=lambda: needed)
+
+    for name in ("a.safetensors", "b.safetensors"):
+        for future in tier.request({("UNETLoader", name, "default")}):
+            future.result()
+    # a - самая старая копия, но нужна ожидающей задаче
+    old = time.time() - 100
+    os.utime(tmp_path / "tier" / "diffusion_models" / "a.safetensors", (old, old))
+
+    for future in tier.request({("UNETLoader", "c.safetensors", "default")}):
+        future.result()
+
+    local = sorted(os.listdir(tmp_path / "tier" / "diffusion_models"))
+    assert local == ["a.safetensors", "c.safetensors"]
+    assert tier.stats()["evicted"] == 1
+
+
+def test_scheduler_reports_needed_models_and_config():
+    seen = []
+    scheduler = ModelAffinityScheduler(lambda workflow: "p1", max_inflight=1, on_pending=seen.append)
+    scheduler.submit(_graph("a.safetensors"))
+    scheduler.submit(_graph("b.safetensors"))
+
+    assert len(seen) == 2
+    files = model_files(scheduler.needed_models())
+    assert ("a.safetensors", "unet", "diffusion_models") in files
+    assert ("b.safetensors", "unet", "diffusion_models") in files
+    assert ("lora.safetensors", "loras") in files
+
+    config = extra_model_paths("/tier")
+    assert "is_default: true" in config
+    assert "    diffusion_models: diffusion_models" in config
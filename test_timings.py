@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты разбивки времени задачи по этапам и узлам
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.timings import JobTimings
+
+WORKFLOW = {
+    "1": {"class_type": "UNETLoader", "inputs": {}},
+    "2": {"class_type": "KSamplerAdvanced", "inputs": {}},
+    "3": {"class_type": "KSamplerAdvanced", "inputs": {}},
+    "4": {"class_type": "VAEDecode", "inputs": {}},
+    "5": {"class_type": "CLIPTextEncode", "inputs": {}},
+}
+
+
+def test_node_timings_from_socket_events():
+    timings = JobTimings(WORKFLOW)
+    with timings.stage("prepare"):
+        time.sleep(0.01)
+    timings.queued()
+
+    timings.on_event("execution_start", {"prompt_id": "p"})
+    timings.on_event("execution_cached", {"prompt_id": "p", "nodes": ["5"]})
+    for node, seconds in (("1", 0.02), ("2", 0.05), ("3", 0.03), ("4", 0.01)):
+        timings.on_event("executing", {"prompt_id": "p", "node": node})
+        time.sleep(seconds)
+    timings.on_event("executing", {"prompt_id": "p", "node": None})
+
+    result = timings.as_dict()
+    assert result["stages"]["prepare"] >= 0.01
+    assert result["stages"]["execution"] >= 0.11
+    assert "queue_wait" in result["stages"]
+    # Узлы отсортированы по времени, узлы из кэша отмечены
+    assert list(result["nodes"])[0] == "2"
+    assert result["nodes"]["2"]["class_type"] == "KSamplerAdvanced"
+    assert result["nodes"]["5"] == {"class_type": "CLIPTextEncode", "cached": True}
+    assert list(result["by_class"]) == ["KSamplerAdvanced", "UNETLoader", "VAEDecode"]
+    assert result["by_class"]["KSamplerAdvanced"] >= 0.08
+
+
+def test_history_fills_missing_socket_events():
+    """Без событий сокета (опрос /history) время выполнения берется из меток ComfyUI"""
+    timings = JobTimings(WORKFLOW)
+    timings.queued_at = 1000.0
+    timings.apply_history({"status": {"messages": [
+        ["execution_start", {"prompt_id": "p", "timestamp": 1002000}],
+        ["execution_cached", {"prompt_id": "p", "nodes": ["1", "5"], "timestamp": 1002001}],
+        ["execution_success", {"prompt_id": "p", "timestamp": 1014500}],
+    ]}})
+
+    result = timings.log("job-1", "p")
+    assert result["stages"]["queue_wait"] == 2.0
+    assert result["stages"]["execution"] == 12.5
+    assert set(result["nodes"]) == {"1", "5"}
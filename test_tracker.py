@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты отслеживания завершения задач ComfyUI по событиям WebSocket
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.client import ComfyClient
+from workflows.tracker import CompletionTracker
+
+
+def _message(msg_type, **data):
+    return json.dumps({"type": msg_type, "data": data})
+
+
+def _make_tracker(history):
+    tracker = CompletionTracker(ComfyClient("http://127.0.0.1:8188"), client_id="test")
+    tracker._get_history = lambda prompt_id: history.get(prompt_id)
+    # Делаем вид, что сокет подключен, чтобы не уходить в опрос
+    tracker._connected.set()
+    return tracker
+
+
+def test_resolves_on_executing_none():
+    """Ожидание завершается сразу после executing с node=None"""
+    history = {}
+    tracker = _make_tracker(history)
+
+    def finish():
+        time.sleep(0.05)
+        tracker.handle_message(_message("execution_cached", prompt_id="p1", nodes=["1", "2"]))
+        tracker.handle_message(_message("executing", prompt_id="p1", node="3"))
+        tracker.handle_message(_message("executed", prompt_id="p1", node="3", output={}))
+        history["p1"] = {"status": {"completed": True, "status_str": "success"}, "outputs": {"3": {}}}
+        tracker.handle_message(_message("executing", prompt_id="p1", node=None))
+
+    threading.Thread(target=finish).start()
+    started = time.time()
+    result = tracker.wait("p1", timeout=5)
+
+    assert result["outputs"] == {"3": {}}
+    assert time.time() - started < 1.0
+
+
+def test_execution_error_raises():
+    """execution_error превращается в исключение с описанием узла"""
+    tracker = _make_tracker({})
+    tracker.handle_message(_message(
+        "execution_error", prompt_id="p2", node_id="7", node_type="KSampler",
+        exception_message="CUDA out of memory"
+    ))
+
+    try:
+        tracker.wait("p2", timeout=1)
+        assert False, "ожидалось исключение"
+    except Exception as e:
+        assert "KSampler" in str(e)
+        assert "CUDA out of memory" in str(e)
+
+
+def test_polling_fallback_without_socket():
+    """Без сокета результат находится опросом /history"""
+    history = {"p3": {"status": {"completed": True}, "outputs": {}}}
+    tracker = CompletionTracker(ComfyClient("http://127.0.0.1:8188"), client_id="test")
+    tracker._get_history = lambda prompt_id: history.get(prompt_id)
+
+    assert tracker.wait("p3", timeout=2) == history["p3"]
+
+
+def test_status_updates_queue_remaining():
+    """Сообщения status обновляют глубину очереди"""
+    tracker = _make_tracker({})
+    tracker.handle_message(json.dumps({
+        "type": "status",
+        "data": {"status": {"exec_info": {"queue_remaining": 3}}}
+    }))
+    assert tracker.queue_remaining == 3
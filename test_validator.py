@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты проверки графа по /object_info до постановки в очередь
+"""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows.object_info import ObjectInfoStore, BUNDLED_PATH
+from workflows.registry import WorkflowRegistry
+from workflows.models import workflow_models
+from workflows.validator import WorkflowValidator
+
+OBJECT_INFO = {
+    "UNETLoader": {
+        "input": {"required": {"unet_name": [["wan.safetensors"]], "weight_dtype": [["default", "fp8_e4m3fn"]]}},
+        "output": ["MODEL"]
+    },
+    "KSampler": {
+        "input": {"required": {
+            "model": ["MODEL"],
+            "steps": ["INT", {"min": 1, "max": 100}],
+            "cfg": ["FLOAT", {"min": 0.0, "max": 30.0}],
+            "sampler_name": [["euler", "dpmpp_2m"]],
+            "latent_image": ["LATENT"],
+        }},
+        "output": ["LATENT"]
+    },
+    "LoadImage": {"input": {"required": {"image": [["a.png"], {"image_upload": True}]}}, "output": ["IMAGE", "MASK"]},
+    "SaveImage": {"input": {"required": {"images": ["IMAGE"], "filename_prefix": ["STRING", {}]}}, "output": []},
+}
+
+
+def make_store(tmp_path, object_info, comfy_dir=None):
+    """Хранилище со снимком той же версии установки на диске"""
+    comfy_dir = str(comfy_dir or tmp_path / "comfyui")
+    os.makedirs(os.path.join(comfy_dir, "custom_nodes"), exist_ok=True)
+    store = ObjectInfoStore(cache_path=str(tmp_path / "object_info.json"), comfy_dir=comfy_dir)
+    (tmp_path / "object_info.json").write_text(json.dumps({"key": store.key(), "object_info": object_info}))
+    return store
+
+
+def test_reports_all_errors_at_once(tmp_path):
+    models_dir = tmp_path / "models"
+    (models_dir / "unet").mkdir(parents=True)
+    (models_dir / "unet" / "wan.safetensors").write_bytes(b"0")
+    validator = WorkflowValidator(make_store(tmp_path, OBJECT_INFO), models_dir=str(models_dir))
+
+    workflow = {
+        "1": {"class_type": "UNETLoader", "inputs": {"unet_name": "wan.safetensors", "weight_dtype": "default"}},
+        "2": {"class_type": "UNETLoader", "inputs": {"unet_name": "typo.safetensors", "weight_dtype": "fp16"}},
+        "3": {"class_type": "KSampler", "inputs": {
+            "model": ["1", 0], "steps": 500, "cfg": "high", "sampler_name": "euler", "latent_image": ["4", 0]
+        }},
+        "4": {"class_type": "LoadImage", "inputs": {"image": "jobs/upload.png"}},
+        "5": {"class_type": "SaveImage", "inputs": {"images": ["3", 0]}},
+        "6": {"class_type": "MissingCustomNode", "inputs": {}},
+    }
+    errors = validator.validate(workflow)
+
+    assert len(errors) == 8
+    joined = "\n".join(errors)
+    assert "'typo.safetensors' не найден на volume" in joined
+    assert "'fp16' не из списка" in joined
+    assert "больше максимума 100" in joined
+    assert "ожидается FLOAT" in joined
+    assert "выход 4:0 типа IMAGE, ожидается LATENT" in joined
+    assert "узел 5 (SaveImage): нет обязательного входа 'filename_prefix'" in joined
+    assert "выход 3:0 типа LATENT, ожидается IMAGE" in joined
+    assert "MissingCustomNode" in joined
+
+    with pytest.raises(ValueError, match="Граф не прошел проверку"):
+        validator.check(workflow)
+
+
+def test_snapshot_of_other_version_is_ignored(tmp_path):
+    store = make_store(tmp_path, OBJECT_INFO)
+    (tmp_path / "comfyui" / "custom_nodes" / "NewNodes").mkdir()
+
+    fresh = ObjectInfoStore(cache_path=str(tmp_path / "object_info.json"), comfy_dir=str(tmp_path / "comfyui"))
+    assert fresh.key() != store.key()
+    assert fresh.installed() is None
+    assert WorkflowValidator(fresh).validate({"1": {"class_type": "MissingCustomNode", "inputs": {}}}) == []
+
+
+def test_registry_workflows_validate_in_milliseconds(tmp_path):
+    """Воркфлоу реестра проходят проверку по снимку из пакета, если модели на месте"""
+    with open(BUNDLED_PATH, "r", encoding="utf-8") as f:
+        store = make_store(tmp_path, json.load(f))
+    registry = WorkflowRegistry()
+    registry.reload()
+    models_dir = tmp_path / "models"
+    for info in registry.list():
+        for model in workflow_models(registry.get(info["name"]).workflow):
+            (models_dir / model["folders"][0]).mkdir(parents=True, exist_ok=True)
+            (models_dir / model["folders"][0] / model["name"]).write_bytes(b"0")
+    validator = WorkflowValidator(store, models_dir=str(models_dir))
+
+    for info in registry.list():
+        workflow = registry.get(info["name"]).workflow
+        start = time.perf_counter()
+        assert validator.validate(workflow) == []
+        assert time.perf_counter() - start < 0.05
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты прогрева воркера и отчета о запуске
+"""
+
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workflows import outputs
+from workflows.registry import WorkflowRegistry
+from workflows.startup import StartupReport
+from workflows.warmup import minimal_workflow, warm_up, LAST_STEP
+
+WORKFLOW_NAME = "wan_A14B_t2v_1+2_steps"
+
+
+@pytest.fixture(scope="module")
+def registry():
+    registry = WorkflowRegistry()
+    registry.reload()
+    return registry
+
+
+def test_minimal_workflow_runs_one_step_per_sampler(registry):
+    """Каждый семплер делает один шаг на крошечном латенте; граф реестра не меняется"""
+    entry = registry.get(WORKFLOW_NAME)
+    original = copy.deepcopy(entry.workflow)
+
+    workflow = minimal_workflow(entry, size=128, frames=5)
+
+    high, low = workflow["35"]["inputs"], workflow["36"]["inputs"]
+    assert (high["steps"], high["start_at_step"], high["end_at_step"]) == (2, 0, 1)
+    assert (low["steps"], low["start_at_step"], low["end_at_step"]) == (2, 1, LAST_STEP)
+    assert high["noise_seed"] == 0
+
+    latent = workflow["5"]["inputs"]
+    assert (latent["width"], latent["height"], latent["length"]) == (128, 128, 5)
+    assert workflow["10"]["inputs"]["filename_prefix"].startswith("warmup/")
+    # Загрузчики моделей те же, что и у полного воркфлоу
+    assert workflow["46"] == entry.workflow["46"]
+    assert entry.workflow == original
+
+
+def test_warm_up_removes_outputs_and_reports(registry, tmp_path, monkeypatch):
+    """Выходные файлы прогрева удаляются, этап попадает в отчет о запуске"""
+    monkeypatch.setitem(outputs.FOLDERS, "output", str(tmp_path))
+    (tmp_path / "warmup").mkdir()
+    (tmp_path / "warmup" / "a.png").write_bytes(b"png")
+    executed = []
+
+    def execute(workflow, timeout):
+        executed.append(workflow)
+        return {"outputs": {"10": {"images": [{"filename": "a.png", "subfolder": "warmup", "type": "output"}]}}}
+
+    report = StartupReport()
+    with report.stage("warmup") as stage:
+        stage.update(warm_up(registry, execute, name=WORKFLOW_NAME))
+    result = report.finish()
+
+    assert len(executed) == 1
+    assert not (tmp_path / "warmup" / "a.png").exists()
+    assert result["stages"]["warmup"]["status"] == "ok"
+    assert result["stages"]["warmup"]["outputs_removed"] == 1
+    assert result["stages"]["warmup"]["version"] == registry.get(WORKFLOW_NAME).version
+    assert "seconds" in result["stages"]["warmup"]
@@ -11,10 +11,16 @@ from .base import (
 from .loader import (
     WorkflowHandler,
     process_workflow,
+    process_batch,
     analyze_workflow,
     get_workflow_info,
     workflow_handler
 )
+from .client import (
+    ComfyClient,
+    ComfyAPIError,
+    get_client
+)
 
 __all__ = [
     'WorkflowType',
@@ -22,7 +28,11 @@ __all__ = [
     'WorkflowProcessor',
     'WorkflowHandler',
     'process_workflow',
+    'process_batch',
     'analyze_workflow',
     'get_workflow_info',
-    'workflow_handler'
+    'workflow_handler',
+    'ComfyClient',
+    'ComfyAPIError',
+    'get_client'
 ]
\ No newline at end of file
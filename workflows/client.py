@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP клиент ComfyUI с общим пулом соединений, таймаутами и повторами
+"""
+from typing import Dict, Any, Optional, Tuple
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMFY_URL = "http://127.0.0.1:8188"
+
+
+class ComfyAPIError(Exception):
+    """Ошибка ответа API ComfyUI"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, payload: Any = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.payload = payload
+
+
+class ComfyClient:
+    """
+    Клиент HTTP API ComfyUI.
+
+    Держит keep-alive сессию, задает таймауты для каждого эндпоинта и
+    повторяет запросы с экспоненциальной задержкой и джиттером. Неидемпотентные
+    запросы (/prompt, /upload/image) повторяются только если соединение не
+    было установлено, чтобы не поставить задачу в очередь дважды.
+    """
+
+    # (connect, read) таймауты по эндпоинтам
+    TIMEOUTS: Dict[str, Tuple[float, float]] = {
+        "system_stats": (2, 5),
+        "prompt": (3, 30),
+        "history": (3, 15),
+        "queue": (3, 10),
+        "interrupt": (3, 10),
+        "free": (3, 30),
+        "object_info": (3, 60),
+        "view": (3, 120),
+        "upload": (3, 120),
+    }
+
+    RETRY_STATUSES = {502, 503, 504}
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_COMFY_URL,
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        pool_size: int = 16
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # ------------------------------------------------------------------
+    # Эндпоинты
+    # ------------------------------------------------------------------
+
+    def system_stats(self, retries: Optional[int] = None) -> Dict[str, Any]:
+        """GET /system_stats"""
+        return self._request("GET", "/system_stats", "system_stats", retries=retries).json()
+
+    def queue_prompt(
+        self,
+        prompt: Dict[str, Any],
+        client_id: Optional[str] = None,
+        extra_data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        POST /prompt
+
+        Returns:
+            Ответ ComfyUI (prompt_id, number, node_errors)
+        """
+        body: Dict[str, Any] = {"prompt": prompt}
+        if client_id:
+            body["client_id"] = client_id
+        if extra_data:
+            body["extra_data"] = extra_data
+        return self._request("POST", "/prompt", "prompt", idempotent=False, json=body).json()
+
+    def get_history(self, prompt_id: Optional[str] = None, max_items: Optional[int] = None) -> Dict[str, Any]:
+        """GET /history или /history/{prompt_id}"""
+        path = f"/history/{prompt_id}" if prompt_id else "/history"
+        params = {"max_items": max_items} if max_items else None
+        return self._request("GET", path, "history", params=params).json()
+
+    def get_queue(self) -> Dict[str, Any]:
+        """GET /queue"""
+        return self._request("GET", "/queue", "queue").json()
+
+    def interrupt(self):
+        """POST /interrupt - прерывает текущую задачу"""
+        self._request("POST", "/interrupt", "interrupt")
+
+    def free(self, unload_models: bool = False, free_memory: bool = False):
+        """POST /free - выгружает модели и/или освобождает память"""
+        self._request(
+            "POST", "/free", "free",
+            json={"unload_models": unload_models, "free_memory": free_memory}
+        )
+
+    def object_info(self, node_class: Optional[str] = None) -> Dict[str, Any]:
+        """GET /object_info или /object_info/{node_class}"""
+        path = f"/object_info/{node_class}" if node_class else "/object_info"
+        return self._request("GET", path, "object_info").json()
+
+    def view(self, filename: str, subfolder: str = "", folder_type: str = "output") -> bytes:
+        """GET /view - содержимое файла из output/input/temp"""
+        params = {"filename": filename, "subfolder": subfolder, "type": folder_type}
+        return self._request("GET", "/view", "view", params=params).content
+
+    def upload_image(
+        self,
+        data: bytes,
+        filename: str,
+        subfolder: str = "",
+        folder_type: str = "input",
+        overwrite: bool = True
+    ) -> Dict[str, Any]:
+        """
+        POST /upload/image
+
+        Returns:
+            Ответ ComfyUI (name, subfolder, type)
+        """
+        files = {"image": (filename, data)}
+        form = {"type": folder_type, "overwrite": "true" if overwrite else "false"}
+        if subfolder:
+            form["subfolder"] = subfolder
+        return self._request(
+            "POST", "/upload/image", "upload", idempotent=False, files=files, data=form
+        ).json()
+
+    # ------------------------------------------------------------------
+    # Транспорт
+    # ------------------------------------------------------------------
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        endpoint: str,
+        idempotent: bool = True,
+        retries: Optional[int] = None,
+        **kwargs
+    ) -> requests.Response:
+        """Выполняет запрос с таймаутом эндпоинта и ограниченными повторами"""
+        url = f"{self.base_url}{path}"
+        timeout = self.TIMEOUTS.get(endpoint, (3, 30))
+        max_retries = self.max_retries if retries is None else retries
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                if not (idempotent or self._not_sent(e)) or attempt >= max_retries:
+                    raise
+                logger.debug(f"{method} {path}: ошибка соединения ({e}), повтор {attempt + 1}/{max_retries}")
+            except requests.exceptions.Timeout:
+                if not idempotent or attempt >= max_retries:
+                    raise
+                logger.debug(f"{method} {path}: таймаут, повтор {attempt + 1}/{max_retries}")
+            else:
+                if response.status_code < 400:
+                    return response
+                if not (idempotent and response.status_code in self.RETRY_STATUSES and attempt < max_retries):
+                    raise self._api_error(method, path, response)
+                logger.debug(f"{method} {path}: HTTP {response.status_code}, повтор {attempt + 1}/{max_retries}")
+
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    @staticmethod
+    def _not_sent(error: requests.exceptions.ConnectionError) -> bool:
+        """True, если соединение не было установлено и запрос точно не дошел"""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = error.args[0] if error.args else None
+        if isinstance(reason, MaxRetryError):
+            reason = reason.reason
+        return isinstance(reason, NewConnectionError)
+
+    def _backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с полным джиттером"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _api_error(method: str, path: str, response: requests.Response) -> ComfyAPIError:
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = response.text[:500]
+
+        detail = payload
+        if isinstance(payload, dict) and "error" in payload:
+            error = payload["error"]
+            detail = error.get("message", error) if isinstance(error, dict) else error
+            if payload.get("node_errors"):
+                detail = f"{detail}; node_errors={payload['node_errors']}"
+
+        return ComfyAPIError(
+            f"{method} {path} вернул HTTP {response.status_code}: {detail}",
+            status_code=response.status_code,
+            payload=payload
+        )
+
+
+_client: Optional[ComfyClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ComfyClient:
+    """Возвращает общий для процесса экземпляр клиента (адрес из COMFY_URL)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ComfyClient(os.environ.get("COMFY_URL", DEFAULT_COMFY_URL))
+    return _client
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Преобразование воркфлоу из UI формата ComfyUI (nodes/links) в API формат
+"""
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from .disk import atomic_write
+from .object_info import ObjectInfoStore, get_object_info_store
+
+logger = logging.getLogger(__name__)
+
+# Узлы, которые существуют только в редакторе
+UI_ONLY_NODES = {"Note", "MarkdownNote", "Reroute", "PrimitiveNode"}
+
+MODE_MUTED = 2
+MODE_BYPASS = 4
+
+WIDGET_TYPES = {"INT", "FLOAT", "STRING", "BOOLEAN", "COMBO"}
+# Значения дополнительного виджета control_after_generate у сидов
+CONTROL_VALUES = {"fixed", "increment", "decrement", "randomize"}
+# Флаги входов, за которыми редактор хранит значение кнопки загрузки файла
+UPLOAD_FLAGS = ("image_upload", "video_upload", "audio_upload")
+SEED_INPUTS = {"seed", "noise_seed"}
+# Служебные ключи словарных widgets_values (VideoHelperSuite)
+DICT_WIDGET_SKIP = {"videopreview", "choose video to upload", "choose file to upload"}
+
+
+def is_ui_workflow(workflow: Any) -> bool:
+    """Воркфлоу в UI формате (сохранен из редактора), а не в API"""
+    return isinstance(workflow, dict) and isinstance(workflow.get("nodes"), list)
+
+
+def _spec_inputs(spec: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    """Входы узла в порядке, в котором редактор создает виджеты"""
+    result = []
+    order = spec.get("input_order") or {}
+    for section in ("required", "optional"):
+        inputs = (spec.get("input") or {}).get(section) or {}
+        for name in order.get(section) or list(inputs):
+            if name in inputs:
+                result.append((name, inputs[name]))
+    return result
+
+
+def _is_widget(config: Any) -> bool:
+    if not isinstance(config, (list, tuple)) or not config:
+        return False
+    options = config[1] if len(config) > 1 and isinstance(config[1], dict) else {}
+    if options.get("forceInput"):
+        return False
+    return isinstance(config[0], list) or config[0] in WIDGET_TYPES
+
+
+def _link_fields(link: Any) -> Tuple[Any, Any, Any]:
+    """(origin_id, origin_slot, type) для ссылки в виде списка или словаря"""
+    if isinstance(link, dict):
+        return link.get("origin_id"), link.get("origin_slot"), link.get("type")
+    return link[1], link[2], link[5] if len(link) > 5 else None
+
+
+def convert_ui_workflow(ui: Dict[str, Any], object_info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Преобразует UI граф в API граф
+
+    Значения виджетов сопоставляются с именами входов по описаниям узлов
+    из /object_info, ссылки разрешаются через Reroute и PrimitiveNode,
+    выключенные (mode 2) узлы удаляются, а обойденные (mode 4) заменяются
+    проводом со входа того же типа.
+
+    Raises:
+        ValueError: если для узлов с виджетами нет описания в /object_info
+    """
+    nodes = {node["id"]: node for node in ui.get("nodes") or []}
+    links = {}
+    for link in ui.get("links") or []:
+        link_id = link.get("id") if isinstance(link, dict) else link[0]
+        links[link_id] = link
+
+    def resolve(link_id: Any, depth: int = 0) -> Optional[Tuple[str, Any]]:
+        """("link", [id, slot]) или ("value", значение) для провода; None - провод пропадает"""
+        link = links.get(link_id)
+        if link is None or depth > len(nodes):
+            return None
+        origin_id, origin_slot, link_type = _link_fields(link)
+        origin = nodes.get(origin_id)
+        if origin is None or origin.get("mode") == MODE_MUTED:
+            return None
+
+        if origin.get("type") == "Reroute":
+            inputs = origin.get("inputs") or []
+            return resolve(inputs[0].get("link"), depth + 1) if inputs else None
+        if origin.get("type") == "PrimitiveNode":
+            values = origin.get("widgets_values") or []
+            return ("value", values[0]) if values else None
+        if origin.get("mode") == MODE_BYPASS:
+            outputs = origin.get("outputs") or []
+            output_type = link_type or (outputs[origin_slot].get("type") if origin_slot < len(outputs) else None)
+            for origin_input in origin.get("inputs") or []:
+                if origin_input.get("type") == output_type and origin_input.get("link") is not None:
+                    return resolve(origin_input["link"], depth + 1)
+            return None
+        return ("link", [str(origin_id), origin_slot])
+
+    api: Dict[str, Any] = {}
+    unknown = set()
+
+    for node_id, node in nodes.items():
+        class_type = node.get("type")
+        if class_type in UI_ONLY_NODES or node.get("mode") in (MODE_MUTED, MODE_BYPASS):
+            continue
+
+        widgets = node.get("widgets_values")
+        spec = object_info.get(class_type)
+        inputs: Dict[str, Any] = {}
+
+        if isinstance(widgets, dict):
+            inputs.update({k: v for k, v in widgets.items() if k not in DICT_WIDGET_SKIP})
+        elif spec is not None:
+            values = list(widgets or [])
+            position = 0
+            for name, config in _spec_inputs(spec):
+                if not _is_widget(config):
+                    continue
+                if position < len(values):
+                    inputs[name] = values[position]
+                    position += 1
+                options = config[1] if len(config) > 1 and isinstance(config[1], dict) else {}
+                is_seed = options.get("control_after_generate") or (config[0] == "INT" and name in SEED_INPUTS)
+                if is_seed and position < len(values) and values[position] in CONTROL_VALUES:
+                    position += 1
+                if any(options.get(flag) for flag in UPLOAD_FLAGS):
+                    position += 1
+        elif widgets:
+            unknown.add(class_type)
+            continue
+
+        for node_input in node.get("inputs") or []:
+            if node_input.get("link") is None:
+                continue
+            resolved = resolve(node_input["link"])
+            if resolved is not None:
+                inputs[node_input["name"]] = resolved[1]
+
+        api[str(node_id)] = {
+            "inputs": inputs,
+            "class_type": class_type,
+            "_meta": {"title": node.get("title") or class_type}
+        }
+
+    if unknown:
+        raise ValueError(f"Нет описаний /object_info для узлов: {', '.join(sorted(unknown))}")
+    return api
+
+
+class WorkflowConverter:
+    """
+    Конвертер с кэшем по хэшу содержимого воркфлоу и набора описаний узлов:
+    каждая ревизия воркфлоу преобразуется один раз (в памяти и на диске).
+    Возвращаемые графы общие - вызывающий код не должен их изменять.
+    """
+
+    CACHE_DIR = os.environ.get("CONVERTED_CACHE_DIR", "/comfyui/cache/converted")
+
+    def __init__(self, store: Optional[ObjectInfoStore] = None, cache_dir: Optional[str] = None, max_entries: int = 64):
+        self.store = store or get_object_info_store()
+        self.cache_dir = cache_dir or self.CACHE_DIR
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def convert(self, ui: Dict[str, Any], digest: Optional[str] = None) -> Dict[str, Any]:
+        """
+        API граф для UI графа
+
+        Args:
+            ui: Воркфлоу в UI формате
+            digest: sha256 исходного файла, если известен (иначе считается по JSON)
+        """
+        if digest is None:
+            payload = json.dumps(ui, sort_keys=True, separators=(",", ":"))
+            digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        key = f"{digest[:32]}-{self.store.fingerprint()[:16]}"
+
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                return cached
+
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        api = self._read(path)
+        if api is None:
+            api = convert_ui_workflow(ui, self.store.get())
+            logger.info(f"Воркфлоу преобразован из UI формата: {len(api)} узлов ({self.store.source})")
+            try:
+                atomic_write(path, json.dumps(api).encode("utf-8"))
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить преобразованный воркфлоу: {e}")
+
+        with self._lock:
+            self._memory[key] = api
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        return api
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+_converter: Optional[WorkflowConverter] = None
+
+
+def get_converter() -> WorkflowConverter:
+    """Общий конвертер воркера"""
+    global _converter
+    if _converter is None:
+        _converter = WorkflowConverter()
+    return _converter
+
+
+def ensure_api_format(workflow: Dict[str, Any], digest: Optional[str] = None) -> Dict[str, Any]:
+    """Воркфлоу в API формате: UI граф преобразуется (с кэшем), API возвращается как есть"""
+    if is_ui_workflow(workflow):
+        return get_converter().convert(workflow, digest)
+    return workflow
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Общие операции с дисковыми кэшами: атомарная запись и LRU вытеснение
+"""
+from typing import Callable, Iterable, List, Optional, Tuple
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write(path: str, data: bytes):
+    """Пишет файл через временный файл и os.replace - читатели не увидят его недописанным"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def touch(path: str):
+    """Отмечает использование файла (LRU по mtime: atime на томах часто отключен)"""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def scan_files(directory: str, accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, int, float]]:
+    """
+    Файлы каталога (рекурсивно) как (путь, размер, mtime)
+
+    Args:
+        directory: Каталог
+        accept: Фильтр по имени файла; временные файлы .tmp-* пропускаются всегда
+    """
+    entries = []
+    for root, _dirs, names in os.walk(directory):
+        for name in names:
+            if name.startswith(".tmp-") or (accept and not accept(name)):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def evict_lru(
+    entries: Iterable[Tuple[str, int, float]],
+    max_bytes: int,
+    min_age: float = 0,
+    remove: Optional[Callable[[str], None]] = None
+) -> Tuple[int, int]:
+    """
+    Удаляет давно не использованные записи, пока суммарный размер больше max_bytes
+
+    Args:
+        entries: Записи (путь, размер, время последнего использования)
+        max_bytes: Бюджет в байтах
+        min_age: Записи моложе этого возраста (сек) не трогаются - они могут
+            быть нужны задачам, которые выполняются прямо сейчас
+        remove: Функция удаления записи (по умолчанию os.remove)
+
+    Returns:
+        (удалено записей, освобождено байт)
+    """
+    entries = sorted(entries, key=lambda entry: entry[2])
+    total = sum(entry[1] for entry in entries)
+    removed = freed = 0
+    now = time.time()
+    remove = remove or os.remove
+
+    for path, size, used_at in entries:
+        if total <= max_bytes:
+            break
+        if now - used_at < min_age:
+            continue
+        try:
+            remove(path)
+        except OSError as e:
+            logger.warning(f"Не удалось удалить {path}: {e}")
+            continue
+        total -= size
+        removed += 1
+        freed += size
+
+    if removed:
+        logger.info(f"Вытеснено {removed} записей ({freed} байт), занято {total} из {max_bytes} байт")
+    return removed, freed
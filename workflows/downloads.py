@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Загрузка входных файлов по ссылкам (http(s)://, s3://) с кэшем по URL + ETag
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, Iterable
+from urllib.parse import urlparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .disk import atomic_write, touch
+from .inputs import InputStore, get_input_store
+
+logger = logging.getLogger(__name__)
+
+REMOTE_SCHEMES = ("http://", "https://", "s3://")
+
+DOWNLOAD_CONCURRENCY = int(os.environ.get("DOWNLOAD_CONCURRENCY", "4"))
+DOWNLOAD_MAX_BYTES = int(float(os.environ.get("DOWNLOAD_MAX_MB", "2048")) * 1024 * 1024)
+
+
+def is_remote_reference(value: Any) -> bool:
+    """Является ли значение входного поля ссылкой, а не base64"""
+    return isinstance(value, str) and value.startswith(REMOTE_SCHEMES)
+
+
+class DownloadCache:
+    """
+    Скачивает входные файлы потоково прямо на диск в хранилище входных файлов.
+
+    Одновременных загрузок не больше DOWNLOAD_CONCURRENCY. Для каждой ссылки
+    запоминается ETag и имя файла в хранилище: повторный запрос той же ссылки
+    проверяется условным запросом (If-None-Match / HeadObject) и не
+    скачивается заново, если объект не изменился.
+    """
+
+    INDEX_FILE = ".downloads.json"
+    CHUNK_SIZE = 1024 * 1024
+    TIMEOUT = (5, 60)
+
+    def __init__(
+        self,
+        store: Optional[InputStore] = None,
+        workers: int = DOWNLOAD_CONCURRENCY,
+        max_bytes: int = DOWNLOAD_MAX_BYTES
+    ):
+        self.store = store or get_input_store()
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.store.input_dir, self.INDEX_FILE)
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="downloads")
+
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET", "HEAD"))
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def submit(self, url: str, kind: str = "image") -> Future:
+        """Ставит загрузку в пул; результат Future - имя файла относительно input ComfyUI"""
+        return self._executor.submit(self.fetch, url, kind)
+
+    def fetch(self, url: str, kind: str = "image") -> str:
+        """
+        Возвращает имя файла в хранилище, при необходимости скачивая его
+
+        Raises:
+            ValueError: если файл недоступен, слишком велик или не проходит проверку заголовка
+        """
+        with self._url_lock(url):
+            entry = self._lookup(url)
+            try:
+                if url.startswith("s3://"):
+                    return self._fetch_s3(url, kind, entry)
+                return self._fetch_http(url, kind, entry)
+            except ValueError:
+                raise
+            except Exception as e:
+                raise ValueError(f"Не удалось скачать {url}: {e}")
+
+    def _fetch_http(self, url: str, kind: str, entry: Optional[Dict[str, Any]]) -> str:
+        headers = {"If-None-Match": entry["etag"]} if entry else {}
+        with self.session.get(url, stream=True, timeout=self.TIMEOUT, headers=headers) as response:
+            etag = response.headers.get("ETag")
+            if entry and (response.status_code == 304 or (etag and etag == entry["etag"])):
+                return self._hit(url, entry)
+            response.raise_for_status()
+
+            length = int(response.headers.get("Content-Length") or 0)
+            if length > self.max_bytes:
+                raise ValueError(f"Файл {url} больше лимита ({length} > {self.max_bytes} байт)")
+            name = self._write(response.iter_content(self.CHUNK_SIZE), kind)
+
+        self._remember(url, etag, name)
+        return name
+
+    def _fetch_s3(self, url: str, kind: str, entry: Optional[Dict[str, Any]]) -> str:
+        from .storage import S3OutputSink, S3Settings
+
+        parsed = urlparse(url)
+        bucket, key = parsed.netloc, parsed.path.lstrip("/")
+        client = S3OutputSink._get_client(S3Settings.from_env())
+
+        head = client.head_object(Bucket=bucket, Key=key)
+        etag = head.get("ETag")
+        if entry and etag == entry["etag"]:
+            return self._hit(url, entry)
+        if head.get("ContentLength", 0) > self.max_bytes:
+            raise ValueError(f"Файл {url} больше лимита ({head['ContentLength']} > {self.max_bytes} байт)")
+
+        body = client.get_object(Bucket=bucket, Key=key, IfMatch=etag)["Body"]
+        try:
+            name = self._write(body.iter_chunks(self.CHUNK_SIZE), kind)
+        finally:
+            body.close()
+
+        self._remember(url, etag, name)
+        return name
+
+    def _hit(self, url: str, entry: Dict[str, Any]) -> str:
+        touch(self.store.path(entry["name"]))
+        logger.info(f"Файл {url} не изменился, используется {entry['name']}")
+        return entry["name"]
+
+    def _write(self, chunks: Iterable[bytes], kind: str) -> str:
+        """Пишет поток во временный файл, считая sha256, и переносит его в хранилище"""
+        os.makedirs(self.store.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.store.directory, prefix=".tmp-")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f"Загружаемый файл больше лимита {self.max_bytes} байт")
+                    digest.update(chunk)
+                    f.write(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        logger.info(f"Скачано {size} байт")
+        return self.store.put_file(tmp_path, kind, digest.hexdigest())
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        """Одна и та же ссылка из параллельных задач скачивается один раз"""
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    @staticmethod
+    def _url_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Запись кэша для ссылки, если файл с ETag еще лежит в хранилище"""
+        with self._lock:
+            entry = self._load_index().get(self._url_key(url))
+        if entry and entry.get("etag") and os.path.exists(self.store.path(entry["name"])):
+            return entry
+        return None
+
+    def _remember(self, url: str, etag: Optional[str], name: str):
+        # Без ETag нельзя проверить актуальность - такие ссылки скачиваются
+        # каждый раз (одинаковое содержимое все равно не дублируется на диске)
+        if not etag:
+            return
+        with self._lock:
+            index = self._load_index()
+            index[self._url_key(url)] = {"url": url, "etag": etag, "name": name}
+            # Записи о вытесненных из хранилища файлах больше не нужны
+            for key in [k for k, v in index.items() if not os.path.exists(self.store.path(v["name"]))]:
+                del index[key]
+            atomic_write(self.index_path, json.dumps(index).encode("utf-8"))
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if self._index is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+
+_cache: Optional[DownloadCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_download_cache() -> DownloadCache:
+    """Общий кэш загрузок воркера"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DownloadCache()
+        return _cache
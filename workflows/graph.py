@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Граф API воркфлоу: связи узлов, топологический порядок и определение типа
+"""
+from collections import deque
+from typing import Dict, Any, Iterable, Optional, List, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Узлы, сохраняющие результат, и вид файла
+VIDEO_OUTPUT_NODES = {"VHS_VideoCombine", "SaveVideo", "SaveWEBM", "SaveAnimatedWEBP", "SaveAnimatedPNG", "VideoOutput"}
+IMAGE_OUTPUT_NODES = {"SaveImage", "ImageOutput"}
+# Превью не считаются результатом задачи при определении типа
+PREVIEW_NODES = {"PreviewImage"}
+
+IMAGE_INPUT_NODES = {"LoadImage", "ImageInput"}
+VIDEO_INPUT_NODES = {"LoadVideo", "VideoInput", "VHS_LoadVideo"}
+TEXT_INPUT_NODES = {"CLIPTextEncode", "TextEncode"}
+
+
+def is_link(value: Any) -> bool:
+    """Ссылка на выход другого узла в API формате: ["id", слот]"""
+    return (
+        isinstance(value, list) and len(value) == 2
+        and isinstance(value[0], (str, int)) and isinstance(value[1], int)
+    )
+
+
+class WorkflowGraph:
+    """
+    Индекс связей API воркфлоу, построенный один раз на структуру графа.
+
+    Хранит для каждого узла входящие (upstream) и исходящие (downstream)
+    связи по ссылкам `["узел", слот]`, топологический порядок, глубину
+    узла (длина самого длинного пути от источников), узлы сохранения
+    результата и узлы входных данных. Тип воркфлоу определяется по
+    узлам сохранения и тому, от каких входных узлов они зависят.
+    """
+
+    def __init__(self, workflow: Dict[str, Any]):
+        self.class_types: Dict[str, str] = {}
+        self.upstream: Dict[str, Set[str]] = {}
+        self.downstream: Dict[str, Set[str]] = {}
+        # (узел, вход, отсутствующий узел)
+        self.missing_links: List[Tuple[str, str, str]] = []
+
+        inputs: Dict[str, Dict[str, Any]] = {}
+        for node_id, node_data in workflow.items():
+            if isinstance(node_data, dict):
+                node_id = str(node_id)
+                self.class_types[node_id] = node_data.get("class_type", "")
+                inputs[node_id] = node_data.get("inputs") or {}
+                self.upstream[node_id] = set()
+                self.downstream[node_id] = set()
+
+        for node_id, node_inputs in inputs.items():
+            for name, value in node_inputs.items():
+                if not is_link(value):
+                    continue
+                source = str(value[0])
+                if source not in self.class_types:
+                    self.missing_links.append((node_id, name, source))
+                    continue
+                self.upstream[node_id].add(source)
+                self.downstream[source].add(node_id)
+
+        self.order, self.cycle = self._toposort()
+        self.depth: Dict[str, int] = {}
+        for node_id in self.order:
+            self.depth[node_id] = max((self.depth.get(s, 0) + 1 for s in self.upstream[node_id]), default=0)
+
+        self.output_nodes = [n for n in self.order if self.class_types[n] in VIDEO_OUTPUT_NODES | IMAGE_OUTPUT_NODES]
+        self.preview_nodes = [n for n in self.order if self.class_types[n] in PREVIEW_NODES]
+        self.input_nodes: Dict[str, List[str]] = {
+            "image": self.nodes_of(IMAGE_INPUT_NODES),
+            "video": self.nodes_of(VIDEO_INPUT_NODES),
+            "text": self.nodes_of(TEXT_INPUT_NODES),
+        }
+        self.workflow_type = self._infer_type()
+        self._required: Dict[Tuple[Tuple[str, ...], bool], Set[str]] = {}
+
+    def nodes_of(self, class_types: Set[str]) -> List[str]:
+        """Узлы указанных типов в топологическом порядке"""
+        return [node_id for node_id in self.order if self.class_types[node_id] in class_types]
+
+    def ancestors(self, node_id: str) -> Set[str]:
+        """Все узлы, от которых зависит узел"""
+        seen: Set[str] = set()
+        stack = list(self.upstream.get(node_id, ()))
+        while stack:
+            current = stack.pop()
+            if current not in seen:
+                seen.add(current)
+                stack.extend(self.upstream[current])
+        return seen
+
+    def required(self, roots: Optional[Iterable[str]] = None, strip_previews: bool = True) -> Set[str]:
+        """
+        Узлы, нужные для выбранных выходов: сами выходы и все, от чего они зависят.
+
+        Без roots выходами считаются узлы сохранения и все узлы, результат
+        которых никто не использует (узлы с побочным эффектом), кроме превью
+        при strip_previews и изолированных узлов (например, PrimitiveInt, чье
+        значение уже подставлено при преобразовании); если других выходов
+        нет, превью остаются. Граф со ссылками на отсутствующие узлы
+        без roots не сокращается.
+
+        Raises:
+            ValueError: если выбранного узла нет в графе
+        """
+        key = (tuple(sorted(str(node_id) for node_id in roots)) if roots else (), strip_previews)
+        cached = self._required.get(key)
+        if cached is not None:
+            return cached
+
+        if roots:
+            selected = list(key[0])
+            unknown = [node_id for node_id in selected if node_id not in self.class_types]
+            if unknown:
+                raise ValueError(f"Узлы вывода отсутствуют в воркфлоу: {', '.join(unknown)}")
+        elif self.missing_links:
+            # Фрагмент графа: зависимости неполные, ничего не удаляем
+            selected = list(self.order)
+        else:
+            sinks = [
+                node_id for node_id in self.order
+                if node_id in self.output_nodes or (not self.downstream[node_id] and self.upstream[node_id])
+            ]
+            selected = [node_id for node_id in sinks if not (strip_previews and node_id in self.preview_nodes)] or sinks
+            if not selected:
+                # Граф без связей: выходы определить нельзя, оставляем все
+                selected = list(self.order)
+
+        keep = set(selected)
+        for node_id in selected:
+            keep |= self.ancestors(node_id)
+        self._required[key] = keep
+        return keep
+
+    def prune(
+        self,
+        workflow: Dict[str, Any],
+        roots: Optional[Iterable[str]] = None,
+        strip_previews: bool = True
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Воркфлоу той же структуры без узлов, не нужных выбранным выходам
+
+        Returns:
+            Tuple (воркфлоу, удаленные узлы); без удалений воркфлоу возвращается как есть
+        """
+        keep = self.required(roots, strip_previews)
+        removed = [node_id for node_id in self.order if node_id not in keep]
+        if not removed:
+            return workflow, removed
+        pruned = {node_id: node for node_id, node in workflow.items() if str(node_id) in keep}
+        return pruned, removed
+
+    def output_kind(self, node_id: str) -> Optional[str]:
+        """Вид результата узла сохранения: video, image или None"""
+        class_type = self.class_types.get(node_id)
+        if class_type in VIDEO_OUTPUT_NODES:
+            return "video"
+        if class_type in IMAGE_OUTPUT_NODES | PREVIEW_NODES:
+            return "image"
+        return None
+
+    def output_rank(self, node_id: str) -> int:
+        """Порядок выходного узла: чем дальше по графу, тем раньше (итоговый результат первым)"""
+        return -self.depth.get(node_id, 0)
+
+    def validate(self):
+        """
+        Проверяет граф до постановки в очередь. Ссылки на отсутствующие
+        узлы только логируются: их отклонит ComfyUI с указанием узла,
+        а фрагменты графа без загрузчиков остаются допустимыми.
+
+        Raises:
+            ValueError: если граф содержит цикл
+        """
+        for node_id, name, source in self.missing_links:
+            logger.warning(f"Вход '{name}' узла {node_id} ссылается на отсутствующий узел {source}")
+        if self.cycle:
+            raise ValueError(f"Граф содержит цикл через узлы: {', '.join(sorted(self.cycle))}")
+
+    def _toposort(self) -> Tuple[List[str], Set[str]]:
+        """Порядок Кана (готовые узлы - в порядке воркфлоу); узлы цикла идут в конце"""
+        position = {node_id: index for index, node_id in enumerate(self.class_types)}
+        remaining = {node_id: len(sources) for node_id, sources in self.upstream.items()}
+        ready = deque(node_id for node_id, count in remaining.items() if count == 0)
+        order = []
+        while ready:
+            node_id = ready.popleft()
+            order.append(node_id)
+            for target in sorted(self.downstream[node_id], key=position.get):
+                remaining[target] -= 1
+                if remaining[target] == 0:
+                    ready.append(target)
+        cycle = {node_id for node_id, count in remaining.items() if count > 0}
+        order.extend(node_id for node_id in self.class_types if node_id in cycle)
+        return order, cycle
+
+    def _infer_type(self):
+        from .base import WorkflowType
+
+        outputs = self.output_nodes or self.preview_nodes
+        if not outputs:
+            return WorkflowType.UNKNOWN
+
+        kinds = {self.output_kind(node_id) for node_id in outputs}
+        # Узлы, от которых зависят результаты; в графе без связей - все узлы
+        sources: Set[str] = set()
+        for node_id in outputs:
+            sources |= self.ancestors(node_id)
+        if not sources:
+            sources = set(self.class_types)
+        source_types = {self.class_types[node_id] for node_id in sources}
+
+        if "video" in kinds:
+            return WorkflowType.VIDEO_UPSCALE if source_types & VIDEO_INPUT_NODES else WorkflowType.T2V
+        if source_types & IMAGE_INPUT_NODES:
+            return WorkflowType.IMG2IMG
+        return WorkflowType.T2I
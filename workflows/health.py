@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Состояние готовности ComfyUI на уровне процесса и фоновый монитор /system_stats
+"""
+from enum import Enum
+from typing import Dict, Any, Optional
+import logging
+import threading
+import time
+
+from .client import ComfyClient
+
+logger = logging.getLogger(__name__)
+
+
+class HealthState(Enum):
+    """Состояния готовности ComfyUI"""
+    STARTING = "starting"
+    READY = "ready"
+    DEGRADED = "degraded"
+
+
+class HealthMonitor:
+    """
+    Хранит закэшированное состояние ComfyUI.
+
+    Проверка готовности выполняется один раз при старте воркера, после чего
+    фоновый поток периодически опрашивает /system_stats. Задачи читают
+    состояние без сетевых запросов через `is_ready()` / `wait_ready()`.
+    """
+
+    def __init__(
+        self,
+        client: ComfyClient,
+        interval: float = 10.0,
+        failure_threshold: int = 2
+    ):
+        self.client = client
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+
+        self.state = HealthState.STARTING
+        self.last_stats: Optional[Dict[str, Any]] = None
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def is_ready(self) -> bool:
+        """Текущее закэшированное состояние, без обращения к ComfyUI"""
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Ждет восстановления ComfyUI не дольше timeout секунд"""
+        return self._ready.wait(timeout)
+
+    def wait_until_ready(self, timeout: float = 300, interval: float = 1.0) -> bool:
+        """
+        Блокирующая проверка при старте: ждет первого успешного /system_stats
+
+        Returns:
+            True, если ComfyUI ответил за отведенное время
+        """
+        deadline = time.time() + timeout
+        attempt = 0
+        while time.time() < deadline:
+            attempt += 1
+            if self.check():
+                logger.info("ComfyUI API готов")
+                return True
+            logger.info(f"Ждем ComfyUI API... попытка {attempt}")
+            time.sleep(interval)
+        return False
+
+    def check(self) -> bool:
+        """Один запрос /system_stats с обновлением состояния"""
+        try:
+            stats = self.client.system_stats(retries=0)
+        except Exception as e:
+            self._mark_failure(str(e))
+            return False
+
+        self.last_stats = stats
+        self.last_check = time.time()
+        self.last_error = None
+        self.consecutive_failures = 0
+        if self.state != HealthState.READY:
+            logger.info("ComfyUI в состоянии ready")
+        self.state = HealthState.READY
+        self._ready.set()
+        return True
+
+    def start(self):
+        """Запускает фоновый мониторинг (идемпотентно)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="comfy-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def vram_free(self) -> Optional[int]:
+        """Свободная VRAM первого устройства по последнему /system_stats (байты)"""
+        devices = (self.last_stats or {}).get("devices") or []
+        if not devices:
+            return None
+        return devices[0].get("vram_free")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Состояние для метаданных и диагностики"""
+        return {
+            "state": self.state.value,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+            "consecutive_failures": self.consecutive_failures,
+            "vram_free": self.vram_free()
+        }
+
+    def _run(self):
+        # Пока ComfyUI недоступен, проверяем чаще, чтобы быстрее заметить восстановление
+        while not self._stop.wait(self.interval if self.is_ready() else 1.0):
+            self.check()
+
+    def _mark_failure(self, error: str):
+        self.last_check = time.time()
+        self.last_error = error
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold and self.state != HealthState.DEGRADED:
+            # До первой успешной проверки остаемся в STARTING
+            if self.state == HealthState.READY:
+                logger.warning(f"ComfyUI перешел в состояние degraded: {error}")
+                self.state = HealthState.DEGRADED
+                self._ready.clear()
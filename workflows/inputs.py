@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Контентно-адресуемое хранилище входных файлов ComfyUI
+"""
+from typing import BinaryIO, Dict, Optional, Union
+import base64
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from .disk import atomic_write, touch, scan_files, evict_lru
+from .storage import file_sha256
+
+logger = logging.getLogger(__name__)
+
+# Форматы PIL, которые принимаются без перекодирования, и их расширения
+IMAGE_FORMATS = {
+    "PNG": "png",
+    "JPEG": "jpg",
+    "MPO": "jpg",
+    "WEBP": "webp",
+    "GIF": "gif",
+    "BMP": "bmp",
+    "TIFF": "tiff",
+}
+
+
+def sniff_video_extension(header: bytes) -> Optional[str]:
+    """Расширение видео по сигнатуре контейнера (первые байты файла)"""
+    if header[4:8] == b"ftyp":
+        return "mov" if header[8:10] == b"qt" else "mp4"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if header[:4] == b"RIFF" and header[8:12] == b"AVI ":
+        return "avi"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return None
+
+
+def decode_base64_payload(data: str) -> bytes:
+    """Декодирует base64, отбрасывая префикс data:<mime>;base64,"""
+    if data.startswith("data:"):
+        data = data.split(",", 1)[1]
+    return base64.b64decode(data)
+
+
+class InputStore:
+    """
+    Входные файлы хранятся под именем <sha256>.<ext> в подпапке input ComfyUI.
+
+    Байты пишутся как есть после проверки только заголовка (без декодирования
+    и пересохранения через PIL), повторная отправка того же файла
+    переиспользует уже записанный. Занятое место ограничено бюджетом,
+    давно не использованные файлы вытесняются.
+    """
+
+    INPUT_DIR = "/comfyui/input"
+    SUBDIR = "cas"
+    MAX_BYTES = int(float(os.environ.get("INPUT_STORE_MAX_GB", "20")) * 1024 ** 3)
+    # Файлы, использованные недавно, не вытесняются: их может ждать задача в очереди
+    MIN_AGE = 600
+
+    def __init__(self, input_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.input_dir = input_dir or self.INPUT_DIR
+        self.directory = os.path.join(self.input_dir, self.SUBDIR)
+        self.max_bytes = self.MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        self._usage: Optional[int] = None
+
+    def put(self, data: bytes, kind: str = "image") -> str:
+        """
+        Сохраняет файл, если его еще нет
+
+        Args:
+            data: Содержимое файла
+            kind: "image" или "video"
+
+        Returns:
+            Имя файла относительно input ComfyUI (для LoadImage/VHS_LoadVideo)
+
+        Raises:
+            ValueError: если заголовок не похож на изображение/видео
+        """
+        extension = self._validate(data, kind)
+        digest = hashlib.sha256(data).hexdigest()
+        return self._store(f"{digest}.{extension}", lambda: data)
+
+    def put_file(self, path: str, kind: str = "image", digest: Optional[str] = None) -> str:
+        """
+        Переносит в хранилище уже записанный на диск файл (например, скачанный)
+
+        Args:
+            path: Путь к файлу на том же разделе, что и хранилище; файл перемещается
+            kind: "image" или "video"
+            digest: sha256 файла, если уже посчитан при записи
+
+        Returns:
+            Имя файла относительно input ComfyUI
+        """
+        try:
+            with open(path, "rb") as f:
+                extension = self._validate(f, kind)
+            if digest is None:
+                digest = file_sha256(path)
+        except Exception:
+            os.remove(path)
+            raise
+
+        name = self._store(f"{digest}.{extension}", lambda: path)
+        if os.path.exists(path):
+            os.remove(path)
+        return name
+
+    def put_base64(self, data: str, kind: str = "image") -> str:
+        """Сохраняет файл из base64 (с префиксом data: или без)"""
+        try:
+            raw = decode_base64_payload(data)
+        except Exception as e:
+            raise ValueError(f"Некорректные base64 данные: {e}")
+        return self.put(raw, kind)
+
+    def placeholder(self, width: int, height: int, color: str = "black") -> str:
+        """Пустое изображение заданного размера; создается один раз и переиспользуется"""
+        def render() -> bytes:
+            from PIL import Image
+
+            buffer = io.BytesIO()
+            Image.new("RGB", (width, height), color=color).save(buffer, format="PNG")
+            return buffer.getvalue()
+
+        return self._store(f"placeholder_{width}x{height}_{color}.png", render)
+
+    def path(self, name: str) -> str:
+        """Абсолютный путь к файлу по имени, которое вернули put/placeholder"""
+        return os.path.join(self.input_dir, name)
+
+    def evict(self) -> Dict[str, int]:
+        """Вытесняет давно не использованные файлы сверх бюджета"""
+        with self._lock:
+            entries = scan_files(self.directory)
+            removed, freed = evict_lru(entries, self.max_bytes, self.MIN_AGE)
+            self._usage = sum(entry[1] for entry in entries) - freed
+            return {"removed": removed, "freed": freed, "usage": self._usage}
+
+    def _store(self, filename: str, render) -> str:
+        name = f"{self.SUBDIR}/{filename}"
+        path = self.path(name)
+
+        if os.path.exists(path):
+            touch(path)
+            logger.info(f"Входной файл уже есть в хранилище: {name}")
+            return name
+
+        data = render()
+        if isinstance(data, str):
+            os.replace(data, path)
+            size = os.path.getsize(path)
+        else:
+            atomic_write(path, data)
+            size = len(data)
+        logger.info(f"Входной файл сохранен: {name} ({size} байт)")
+
+        with self._lock:
+            if self._usage is not None:
+                self._usage += size
+            over_budget = self._usage is None or self._usage > self.max_bytes
+        if over_budget:
+            self.evict()
+        return name
+
+    @staticmethod
+    def _validate(source: Union[bytes, BinaryIO], kind: str) -> str:
+        """Проверяет заголовок файла (байты или открытый файл) и возвращает расширение"""
+        fp = io.BytesIO(source) if isinstance(source, bytes) else source
+        header = fp.read(16)
+        fp.seek(0)
+        if not header:
+            raise ValueError("Пустой входной файл")
+
+        if kind == "video":
+            extension = sniff_video_extension(header)
+            if extension is None:
+                raise ValueError("Неизвестный формат входного видео")
+            return extension
+
+        from PIL import Image
+
+        # Image.open читает только заголовок, пиксели не декодируются
+        try:
+            with Image.open(fp) as image:
+                image_format = image.format
+                width, height = image.size
+        except Exception as e:
+            raise ValueError(f"Не удалось распознать входное изображение: {e}")
+
+        extension = IMAGE_FORMATS.get(image_format)
+        if extension is None:
+            raise ValueError(f"Неподдерживаемый формат изображения: {image_format}")
+        if not width or not height:
+            raise ValueError("Изображение нулевого размера")
+        return extension
+
+
+_store: Optional[InputStore] = None
+
+
+def get_input_store() -> InputStore:
+    """Общее хранилище входных файлов воркера"""
+    global _store
+    if _store is None:
+        _store = InputStore()
+    return _store
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Жизненный цикл файлов задач: удаление выходов после доставки и бюджет диска
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Iterable
+import logging
+import os
+import shutil
+import threading
+import time
+
+from .disk import scan_files, evict_lru
+from .outputs import FOLDERS
+
+logger = logging.getLogger(__name__)
+
+JOB_CLEANUP = os.environ.get("JOB_CLEANUP", "1") == "1"
+OUTPUT_MAX_GB = float(os.environ.get("OUTPUT_MAX_GB", "20"))
+DISK_MIN_FREE_GB = float(os.environ.get("DISK_MIN_FREE_GB", "5"))
+JANITOR_INTERVAL = float(os.environ.get("JANITOR_INTERVAL", "60"))
+# Файлы моложе этого возраста (сек) не вытесняются: их может отдавать текущая задача
+JANITOR_MIN_AGE = float(os.environ.get("JANITOR_MIN_AGE", "900"))
+
+JOBS_SUBDIR = "jobs"
+
+
+def disk_usage(paths: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Заполненность файловых систем каталогов (один раз на устройство)"""
+    usage = {}
+    seen = set()
+    for path in paths:
+        try:
+            device = os.stat(path).st_dev
+            if device in seen:
+                continue
+            seen.add(device)
+            total, used, free = shutil.disk_usage(path)
+        except OSError:
+            continue
+        usage[path] = {
+            "total_gb": round(total / 1024 ** 3, 2),
+            "free_gb": round(free / 1024 ** 3, 2),
+            "used_percent": round(used / total * 100, 1) if total else None,
+            "low": free < DISK_MIN_FREE_GB * 1024 ** 3
+        }
+    return usage
+
+
+class DiskJanitor:
+    """
+    Удаляет файлы задач и держит диск в пределах бюджета.
+
+    Выходы задачи лежат в собственной подпапке output/jobs/<job_id> и
+    удаляются в фоне после доставки (release_job); кэш результатов к этому
+    моменту уже держит на них жесткие ссылки. Фоновый проход (sweep)
+    вытесняет давно не использованные файлы output и temp сверх
+    OUTPUT_MAX_GB - и сильнее, если на диске осталось меньше
+    DISK_MIN_FREE_GB, - и вызывает evict() кэшей (входные файлы, результаты).
+    """
+
+    def __init__(
+        self,
+        output_dir: Optional[str] = None,
+        temp_dir: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        min_free_bytes: Optional[int] = None,
+        min_age: float = JANITOR_MIN_AGE,
+        interval: float = JANITOR_INTERVAL,
+        caches: Optional[List[Any]] = None
+    ):
+        # Каталоги по умолчанию берутся из outputs.FOLDERS в момент обращения
+        self._output_dir = output_dir
+        self._temp_dir = temp_dir
+        self.max_bytes = max_bytes if max_bytes is not None else int(OUTPUT_MAX_GB * 1024 ** 3)
+        self.min_free_bytes = min_free_bytes if min_free_bytes is not None else int(DISK_MIN_FREE_GB * 1024 ** 3)
+        self.min_age = min_age
+        self.interval = interval
+        self.caches = caches or []
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="janitor")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pending = 0
+        self._stats = {
+            "jobs_released": 0,
+            "released_bytes": 0,
+            "evicted_files": 0,
+            "evicted_bytes": 0,
+            "output_bytes": None,
+            "output_files": None,
+            "swept_at": None
+        }
+
+    @property
+    def output_dir(self) -> str:
+        return self._output_dir or FOLDERS["output"]
+
+    @property
+    def temp_dir(self) -> str:
+        return self._temp_dir or FOLDERS["temp"]
+
+    def release_job(self, namespace: Optional[str]) -> Optional[Future]:
+        """
+        Ставит в очередь удаление выходов задачи (подпапка jobs/<job_id>)
+
+        Returns:
+            Future удаления или None, если удалять нечего
+        """
+        if not namespace or not namespace.startswith(f"{JOBS_SUBDIR}/"):
+            return None
+        root = os.path.realpath(os.path.join(self.output_dir, JOBS_SUBDIR))
+        path = os.path.realpath(os.path.join(self.output_dir, namespace))
+        if not path.startswith(root + os.sep) or not os.path.isdir(path):
+            return None
+        with self._lock:
+            self._pending += 1
+        return self._executor.submit(self._remove_job, path)
+
+    def sweep(self) -> Dict[str, Any]:
+        """Вытесняет файлы сверх бюджета и чистит пустые папки задач"""
+        entries = scan_files(self.output_dir) + scan_files(self.temp_dir)
+        total = sum(size for _, size, _ in entries)
+        budget = self.max_bytes
+        try:
+            free = shutil.disk_usage(self.output_dir).free
+            if free < self.min_free_bytes:
+                # Диск почти заполнен (в том числе не нашими файлами) - освобождаем недостающее
+                budget = min(budget, max(0, total - (self.min_free_bytes - free)))
+                logger.warning(f"Мало места на диске: свободно {free / 1024 ** 3:.1f} ГБ")
+        except OSError:
+            pass
+
+        removed, freed = evict_lru(entries, budget, self.min_age)
+        self._remove_empty_job_dirs()
+        for cache in self.caches:
+            try:
+                cache.evict()
+            except Exception as e:
+                logger.warning(f"Ошибка вытеснения кэша {type(cache).__name__}: {e}")
+
+        with self._lock:
+            self._stats["evicted_files"] += removed
+            self._stats["evicted_bytes"] += freed
+            self._stats["output_bytes"] = total - freed
+            self._stats["output_files"] = len(entries) - removed
+            self._stats["swept_at"] = time.time()
+        return {"removed": removed, "freed": freed, "output_bytes": total - freed, "budget_bytes": budget}
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики очистки и заполненность дисков (для action=metrics)"""
+        with self._lock:
+            stats = dict(self._stats, release_pending=self._pending)
+        stats["budget_bytes"] = self.max_bytes
+        stats["disk"] = disk_usage([self.output_dir, self.temp_dir, FOLDERS["input"]])
+        return stats
+
+    def start(self):
+        """Фоновые проходы раз в interval секунд"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="disk-janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"Ошибка очистки диска: {e}")
+
+    def _remove_job(self, path: str):
+        try:
+            size = sum(entry[1] for entry in scan_files(path))
+            shutil.rmtree(path, ignore_errors=True)
+            with self._lock:
+                self._stats["jobs_released"] += 1
+                self._stats["released_bytes"] += size
+            logger.debug(f"Удалены выходы задачи {path} ({size} байт)")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _remove_empty_job_dirs(self):
+        """Пустые папки задач старше min_age (снизу вверх)"""
+        jobs_dir = os.path.join(self.output_dir, JOBS_SUBDIR)
+        now = time.time()
+        for root, dirs, files in os.walk(jobs_dir, topdown=False):
+            if root == jobs_dir or files:
+                continue
+            try:
+                if now - os.stat(root).st_mtime >= self.min_age and not os.listdir(root):
+                    os.rmdir(root)
+            except OSError:
+                pass
+
+
+_janitor: Optional[DiskJanitor] = None
+
+
+def get_janitor() -> DiskJanitor:
+    """Общий уборщик диска воркера (вытесняет также хранилище входов и кэш результатов)"""
+    global _janitor
+    if _janitor is None:
+        from .inputs import get_input_store
+        from .results import get_result_cache
+
+        _janitor = DiskJanitor(caches=[get_input_store(), get_result_cache()])
+    return _janitor
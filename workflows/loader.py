@@ -2,9 +2,21 @@
 """
 Обработчик произвольных JSON воркфлоу
 """
-from typing import Dict, Any, Optional, Tuple
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, Tuple, List
 import logging
+import os
+import re
+import time
 from .base import WorkflowType, WorkflowAnalyzer, WorkflowProcessor
+from .graph import WorkflowGraph
+from .plan import WorkflowPlan, compile_workflow
+from .validator import get_validator
+from .inputs import get_input_store
+from .results import seed_is_fixed
+from .downloads import get_download_cache, is_remote_reference
+from .converter import ensure_api_format
+from .timings import JobTimings
 
 logger = logging.getLogger(__name__)
 
@@ -12,56 +24,98 @@ logger = logging.getLogger(__name__)
 class WorkflowHandler:
     """Обрабатывает произвольные JSON воркфлоу"""
     
+    DOWNLOAD_TIMEOUT = int(os.environ.get("DOWNLOAD_TIMEOUT", "600"))
+    # Превью (PreviewImage) не попадают в ответ - по умолчанию не выполняем их
+    STRIP_PREVIEWS = os.environ.get("STRIP_PREVIEWS", "1") == "1"
+    
+    @staticmethod
+    def job_namespace(job_id: Optional[str]) -> Optional[str]:
+        """Подпапка задачи внутри output ComfyUI (jobs/<job_id>)"""
+        if not job_id:
+            return None
+        safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", str(job_id))
+        return f"jobs/{safe_id}"
+    
     @staticmethod
     def process_workflow_request(
         workflow: Dict[str, Any],
         prompt: Optional[str] = None,
         image_data: Optional[str] = None,
         video_data: Optional[str] = None,
-        options: Optional[Dict[str, Any]] = None
+        options: Optional[Dict[str, Any]] = None,
+        job_id: Optional[str] = None,
+        workflow_type: Optional[WorkflowType] = None,
+        timings: Optional[JobTimings] = None,
+        output_nodes: Optional[List[str]] = None,
+        plan: Optional[WorkflowPlan] = None
     ) -> Tuple[Dict[str, Any], WorkflowType, Dict[str, Any]]:
         """
         Обрабатывает запрос с произвольным воркфлоу
         
         Args:
-            workflow: JSON воркфлоу ComfyUI
+            workflow: JSON воркфлоу ComfyUI (API или UI формат)
             prompt: Текстовый промпт
-            image_data: Данные изображения (base64)
-            video_data: Данные видео (base64) 
+            image_data: Данные изображения (base64 или ссылка http(s)://, s3://)
+            video_data: Данные видео (base64 или ссылка http(s)://, s3://)
             options: Дополнительные опции
+            job_id: Идентификатор задачи; выходные файлы кладутся
+                в её собственную подпапку jobs/<job_id>
+            workflow_type: Заранее определенный тип (воркфлоу из реестра)
+            timings: Тайминги задачи - сюда добавляются этапы inputs и prepare
+            output_nodes: Выходы, запрошенные клиентом; узлы, не влияющие
+                на них, удаляются из графа
+            plan: План API воркфлоу, если уже скомпилирован (воркфлоу реестра);
+                иначе строится здесь один раз на запрос
             
         Returns:
             Tuple (подготовленный_воркфлоу, тип_воркфлоу, метаданные)
         """
+        timings = timings or JobTimings()
         try:
-            # Анализируем тип воркфлоу
-            workflow_type = WorkflowAnalyzer.analyze_workflow(workflow)
-            logger.info(f"Определен тип воркфлоу: {workflow_type.value}")
-            
-            # Подготавливаем файлы входных данных
-            image_filename = None
-            video_filename = None
+            # Ссылки начинаем скачивать сразу, параллельно с разбором воркфлоу
+            with timings.stage("inputs"):
+                downloads = WorkflowHandler._start_downloads(image_data, video_data)
             
-            if image_data:
-                image_filename = WorkflowHandler._save_input_image(image_data)
-                logger.info(f"Сохранено входное изображение: {image_filename}")
+            with timings.stage("prepare"):
+                # Воркфлоу, сохраненный из редактора (UI формат), преобразуем в API
+                workflow = ensure_api_format(workflow)
+                namespace = WorkflowHandler.job_namespace(job_id)
+                # План и граф связей общие для анализа, подготовки и отсечения узлов
+                plan = plan or compile_workflow(workflow)
+                
+                # Анализируем тип воркфлоу (для воркфлоу из реестра он уже известен)
+                if workflow_type is None:
+                    workflow_type = WorkflowAnalyzer.analyze_workflow(workflow, plan)
+                logger.info(f"Определен тип воркфлоу: {workflow_type.value}")
             
-            if video_data:
-                video_filename = WorkflowHandler._save_input_video(video_data)
-                logger.info(f"Сохранено входное видео: {video_filename}")
+            # Подготавливаем файлы входных данных (декодирование base64, ожидание загрузок)
+            with timings.stage("inputs"):
+                image_filename, video_filename = WorkflowHandler._resolve_inputs(image_data, video_data, downloads)
             
-            # Валидируем совместимость данных с типом воркфлоу
-            WorkflowHandler._validate_inputs(workflow_type, prompt, image_filename, video_filename)
+            with timings.stage("prepare"):
+                # Валидируем совместимость данных с типом воркфлоу
+                graph = plan.graph
+                WorkflowHandler._validate_inputs(workflow_type, prompt, image_filename, video_filename, graph)
+                
+                # Подготавливаем воркфлоу к выполнению
+                prepared_workflow = WorkflowProcessor.prepare_workflow(
+                    workflow=workflow,
+                    workflow_type=workflow_type,
+                    prompt=prompt,
+                    image_filename=image_filename,
+                    video_filename=video_filename,
+                    options=options,
+                    output_prefix=namespace,
+                    plan=plan
+                )
+                prepared_workflow, pruned = WorkflowHandler._prune(graph, prepared_workflow, output_nodes)
             
-            # Подготавливаем воркфлоу к выполнению
-            prepared_workflow = WorkflowProcessor.prepare_workflow(
-                workflow=workflow,
-                workflow_type=workflow_type,
-                prompt=prompt,
-                image_filename=image_filename,
-                video_filename=video_filename,
-                options=options
-            )
+            # Проверяем граф по /object_info до очереди: опечатка в имени модели
+            # или отсутствующий custom node не тратят время GPU
+            validator = get_validator()
+            if validator is not None:
+                with timings.stage("validate"):
+                    validator.check(prepared_workflow)
             
             # Собираем метаданные
             metadata = {
@@ -70,7 +124,9 @@ class WorkflowHandler:
                 "has_image": bool(image_filename),
                 "has_video": bool(video_filename),
                 "node_count": len(workflow),
-                "options_applied": bool(options)
+                "options_applied": bool(options),
+                "job_namespace": namespace,
+                "pruned_nodes": len(pruned)
             }
             
             return prepared_workflow, workflow_type, metadata
@@ -80,80 +136,197 @@ class WorkflowHandler:
             raise
     
     @staticmethod
-    def _save_input_image(image_data: str) -> str:
-        """Сохраняет входное изображение из base64"""
-        import base64
-        import os
-        from PIL import Image
-        import io
+    def process_batch_request(
+        workflow: Dict[str, Any],
+        items: List[Dict[str, Any]],
+        prompt: Optional[str] = None,
+        image_data: Optional[str] = None,
+        video_data: Optional[str] = None,
+        options: Optional[Dict[str, Any]] = None,
+        job_id: Optional[str] = None,
+        workflow_type: Optional[WorkflowType] = None,
+        output_nodes: Optional[List[str]] = None,
+        plan: Optional[WorkflowPlan] = None
+    ) -> Tuple[List[Dict[str, Any]], WorkflowType, Dict[str, Any]]:
+        """
+        Готовит пакет вариантов одного воркфлоу
         
-        try:
-            # Декодируем base64 если есть префикс data:image
-            if image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-            
-            # Декодируем base64
-            image_bytes = base64.b64decode(image_data)
-            
-            # Открываем изображение через PIL для валидации
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Генерируем уникальное имя файла
-            import time
-            filename = f"input_image_{int(time.time())}.png"
-            
-            # Сохраняем в input директорию ComfyUI
-            input_dir = "/comfyui/input"
-            os.makedirs(input_dir, exist_ok=True)
+        Воркфлоу преобразуется и анализируется, а входные файлы сохраняются
+        один раз на пакет. Элемент пакета переопределяет prompt, дополняет
+        options (ключ `seed` - сокращение для options.seed); ошибки
+        подготовки отдельного элемента не прерывают остальные.
+        Случайные сиды элементов различаются между собой.
+        
+        Returns:
+            Tuple (элементы, тип_воркфлоу, общие метаданные). Элемент - словарь
+            с index и либо workflow, prompt, options, seed_fixed (сид задан
+            клиентом или взят из воркфлоу), metadata, либо error
+        """
+        workflow = ensure_api_format(workflow)
+        namespace = WorkflowHandler.job_namespace(job_id)
+        downloads = WorkflowHandler._start_downloads(image_data, video_data)
+        plan = plan or compile_workflow(workflow)
+        
+        if workflow_type is None:
+            workflow_type = WorkflowAnalyzer.analyze_workflow(workflow, plan)
+        logger.info(f"Определен тип воркфлоу: {workflow_type.value}, пакет из {len(items)} элементов")
+        
+        image_filename, video_filename = WorkflowHandler._resolve_inputs(image_data, video_data, downloads)
+        graph = plan.graph
+        validator = get_validator()
+        # Набор удаляемых узлов общий для всех элементов пакета
+        _, pruned = WorkflowHandler._prune(graph, workflow, output_nodes)
+        
+        # Элементы с опциями без сида получают разные сиды, а не одно текущее время
+        base_seed = int(time.time())
+        prepared_items = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                prepared_items.append({"index": index, "error": "Элемент пакета должен быть объектом"})
+                continue
             
-            image_path = os.path.join(input_dir, filename)
-            image.save(image_path)
+            item_prompt = item.get("prompt", prompt)
+            item_options = {**(options or {}), **(item.get("options") or {})}
+            if item.get("seed") is not None:
+                item_options["seed"] = item["seed"]
+            # Сид, подставленный пакетом, случаен: такой элемент не кэшируется
+            seed_fixed = seed_is_fixed(item_options)
+            if not seed_fixed:
+                item_options["seed"] = base_seed + index
+            item_namespace = f"{namespace}/{index}" if namespace else None
             
-            return filename
+            try:
+                WorkflowHandler._validate_inputs(workflow_type, item_prompt, image_filename, video_filename, graph)
+                prepared_workflow = WorkflowProcessor.prepare_workflow(
+                    workflow=workflow,
+                    workflow_type=workflow_type,
+                    prompt=item_prompt,
+                    image_filename=image_filename,
+                    video_filename=video_filename,
+                    options=item_options,
+                    output_prefix=item_namespace,
+                    plan=plan
+                )
+                prepared_workflow, _ = graph.prune(prepared_workflow, output_nodes, WorkflowHandler.STRIP_PREVIEWS)
+                if validator is not None:
+                    validator.check(prepared_workflow)
+            except ValueError as e:
+                logger.warning(f"Элемент пакета {index} отклонен: {e}")
+                prepared_items.append({"index": index, "error": f"Ошибка валидации воркфлоу: {e}"})
+                continue
             
+            prepared_items.append({
+                "index": index,
+                "workflow": prepared_workflow,
+                "prompt": item_prompt,
+                "options": item_options,
+                "seed_fixed": seed_fixed,
+                "metadata": {"options_applied": bool(item_options), "job_namespace": item_namespace}
+            })
+        
+        metadata = {
+            "workflow_type": workflow_type.value,
+            "has_image": bool(image_filename),
+            "has_video": bool(video_filename),
+            "node_count": len(workflow),
+            "job_namespace": namespace,
+            "batch_size": len(items),
+            "pruned_nodes": len(pruned)
+        }
+        return prepared_items, workflow_type, metadata
+    
+    @staticmethod
+    def _prune(
+        graph: WorkflowGraph,
+        prepared_workflow: Dict[str, Any],
+        output_nodes: Optional[List[str]]
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Удаляет узлы, результат которых не нужен: ветки, не ведущие к запрошенным
+        выходам, промежуточные сохранения и превью (STRIP_PREVIEWS)
+        
+        Raises:
+            ValueError: если запрошенного узла вывода нет в графе
+        """
+        prepared_workflow, removed = graph.prune(prepared_workflow, output_nodes, WorkflowHandler.STRIP_PREVIEWS)
+        if removed:
+            logger.info(f"Из графа удалено узлов, не влияющих на результат: {len(removed)} ({', '.join(removed)})")
+        return prepared_workflow, removed
+    
+    @staticmethod
+    def _start_downloads(image_data: Optional[str], video_data: Optional[str]) -> Dict[str, Future]:
+        """Запускает загрузку входных файлов, переданных ссылками"""
+        return {
+            kind: get_download_cache().submit(data, kind)
+            for kind, data in (("image", image_data), ("video", video_data))
+            if is_remote_reference(data)
+        }
+    
+    @staticmethod
+    def _resolve_inputs(
+        image_data: Optional[str],
+        video_data: Optional[str],
+        downloads: Dict[str, Future]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Имена входных файлов в input ComfyUI: скачанные по ссылкам или сохраненные из base64"""
+        image_filename = None
+        video_filename = None
+        
+        if "image" in downloads:
+            image_filename = WorkflowHandler._wait_download(downloads["image"], image_data)
+            logger.info(f"Скачано входное изображение: {image_filename}")
+        elif image_data:
+            image_filename = WorkflowHandler._save_input_image(image_data)
+            logger.info(f"Сохранено входное изображение: {image_filename}")
+        
+        if "video" in downloads:
+            video_filename = WorkflowHandler._wait_download(downloads["video"], video_data)
+            logger.info(f"Скачано входное видео: {video_filename}")
+        elif video_data:
+            video_filename = WorkflowHandler._save_input_video(video_data)
+            logger.info(f"Сохранено входное видео: {video_filename}")
+        
+        return image_filename, video_filename
+    
+    @staticmethod
+    def _save_input_image(image_data: str) -> str:
+        """Сохраняет входное изображение из base64 в хранилище входных файлов"""
+        try:
+            return get_input_store().put_base64(image_data, "image")
         except Exception as e:
             logger.error(f"Ошибка сохранения изображения: {e}")
             raise ValueError(f"Не удалось обработать входное изображение: {e}")
     
     @staticmethod
     def _save_input_video(video_data: str) -> str:
-        """Сохраняет входное видео из base64"""
-        import base64
-        import os
-        import time
-        
+        """Сохраняет входное видео из base64 в хранилище входных файлов"""
         try:
-            # Декодируем base64
-            if video_data.startswith('data:video'):
-                video_data = video_data.split(',')[1]
-            
-            video_bytes = base64.b64decode(video_data)
-            
-            # Генерируем уникальное имя файла
-            filename = f"input_video_{int(time.time())}.mp4"
-            
-            # Сохраняем в input директорию ComfyUI
-            input_dir = "/comfyui/input"
-            os.makedirs(input_dir, exist_ok=True)
-            
-            video_path = os.path.join(input_dir, filename)
-            with open(video_path, "wb") as f:
-                f.write(video_bytes)
-            
-            return filename
-            
+            return get_input_store().put_base64(video_data, "video")
         except Exception as e:
             logger.error(f"Ошибка сохранения видео: {e}")
             raise ValueError(f"Не удалось обработать входное видео: {e}")
     
+    @staticmethod
+    def _wait_download(download: Future, url: str) -> str:
+        """Дожидается загрузки входного файла по ссылке"""
+        try:
+            return download.result(timeout=WorkflowHandler.DOWNLOAD_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки {url}: {e}")
+            raise ValueError(f"Не удалось получить входной файл {url}: {e}")
+    
     @staticmethod
     def _validate_inputs(
         workflow_type: WorkflowType, 
         prompt: Optional[str], 
         image_filename: Optional[str], 
-        video_filename: Optional[str]
+        video_filename: Optional[str],
+        graph: Optional[WorkflowGraph] = None
     ):
-        """Валидирует совместимость входных данных с типом воркфлоу"""
+        """Валидирует граф (связи, циклы) и совместимость входных данных с типом воркфлоу"""
+        
+        if graph is not None:
+            graph.validate()
         
         if workflow_type == WorkflowType.T2V:
             # Text-to-Video требует промпт, изображение опционально
@@ -191,13 +364,16 @@ class WorkflowHandler:
     @staticmethod
     def get_workflow_info(workflow: Dict[str, Any]) -> Dict[str, Any]:
         """Возвращает информацию о воркфлоу"""
-        workflow_type = WorkflowAnalyzer.analyze_workflow(workflow)
-        node_types = WorkflowAnalyzer._extract_node_types(workflow)
+        workflow = ensure_api_format(workflow)
+        plan = compile_workflow(workflow)
+        workflow_type = WorkflowAnalyzer.analyze_workflow(workflow, plan)
+        graph = plan.graph
         
         return {
             "workflow_type": workflow_type.value,
             "node_count": len(workflow),
-            "node_types": list(node_types),
+            "node_types": sorted(set(graph.class_types.values())),
+            "output_nodes": graph.output_nodes,
             "expected_output": WorkflowHandler.get_expected_output_type(workflow_type),
             "supports_prompt": workflow_type in [WorkflowType.T2V, WorkflowType.T2I],
             "requires_image": workflow_type == WorkflowType.IMG2IMG,
@@ -215,13 +391,38 @@ def process_workflow(
     prompt: Optional[str] = None,
     image_data: Optional[str] = None,
     video_data: Optional[str] = None,
-    options: Optional[Dict[str, Any]] = None
+    options: Optional[Dict[str, Any]] = None,
+    job_id: Optional[str] = None,
+    workflow_type: Optional[WorkflowType] = None,
+    timings: Optional[JobTimings] = None,
+    output_nodes: Optional[List[str]] = None,
+    plan: Optional[WorkflowPlan] = None
 ) -> Tuple[Dict[str, Any], WorkflowType, Dict[str, Any]]:
     """
     Обрабатывает произвольный JSON воркфлоу
     """
     return workflow_handler.process_workflow_request(
-        workflow, prompt, image_data, video_data, options
+        workflow, prompt, image_data, video_data, options, job_id, workflow_type, timings, output_nodes, plan
+    )
+
+
+def process_batch(
+    workflow: Dict[str, Any],
+    items: List[Dict[str, Any]],
+    prompt: Optional[str] = None,
+    image_data: Optional[str] = None,
+    video_data: Optional[str] = None,
+    options: Optional[Dict[str, Any]] = None,
+    job_id: Optional[str] = None,
+    workflow_type: Optional[WorkflowType] = None,
+    output_nodes: Optional[List[str]] = None,
+    plan: Optional[WorkflowPlan] = None
+) -> Tuple[List[Dict[str, Any]], WorkflowType, Dict[str, Any]]:
+    """
+    Готовит пакет вариантов одного воркфлоу
+    """
+    return workflow_handler.process_batch_request(
+        workflow, items, prompt, image_data, video_data, options, job_id, workflow_type, output_nodes, plan
     )
 
 
@@ -229,7 +430,7 @@ def analyze_workflow(workflow: Dict[str, Any]) -> WorkflowType:
     """
     Анализирует тип воркфлоу
     """
-    return WorkflowAnalyzer.analyze_workflow(workflow)
+    return WorkflowAnalyzer.analyze_workflow(ensure_api_format(workflow))
 
 
 def get_workflow_info(workflow: Dict[str, Any]) -> Dict[str, Any]:
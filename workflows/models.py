@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Манифест моделей воркфлоу: проверка по stat, кэш хэшей и прогрев page cache
+
+    python -m workflows.models verify        # проверка манифеста (stat, хэши из кэша)
+    python -m workflows.models prefetch      # чтение моделей в page cache в фоне
+    python -m workflows.models write [--hash] # сохранить манифест с размерами (и sha256)
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Iterable
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from .disk import atomic_write
+from .results import MODEL_INPUTS
+from .scheduler import MODEL_LOADERS
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = "/comfyui/models"
+MANIFEST_PATH = os.environ.get(
+    "MODEL_MANIFEST", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "models.json")
+)
+HASH_CACHE_PATH = os.environ.get("MODEL_HASH_CACHE", "/comfyui/cache/model_hashes.json")
+PREFETCH_PROGRESS = os.environ.get("PREFETCH_PROGRESS", "/tmp/prefetch.json")
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "2"))
+# Бюджет прогрева page cache, ГБ (по умолчанию - половина доступной памяти)
+PREFETCH_MAX_GB = os.environ.get("PREFETCH_MAX_GB")
+
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def workflow_models(workflow: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Файлы моделей, которые загружает граф: имя и каталоги models, где его искать"""
+    found = []
+    for node_data in workflow.values():
+        if not isinstance(node_data, dict):
+            continue
+        inputs = node_data.get("inputs") or {}
+        for name in MODEL_LOADERS.get(node_data.get("class_type"), ()):
+            value = inputs.get(name)
+            if name in MODEL_INPUTS and isinstance(value, str):
+                found.append({"name": value, "folders": list(MODEL_INPUTS[name])})
+    return found
+
+
+class HashCache:
+    """sha256 файлов моделей, привязанные к (устройство, inode, mtime, размер)"""
+
+    def __init__(self, path: str = HASH_CACHE_PATH):
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = _read(path)
+        self._lock = threading.Lock()
+
+    def sha256(self, path: str) -> str:
+        """Хэш файла; считается заново, только если файл изменился"""
+        stat = os.stat(path)
+        key = f"{stat.st_dev}:{stat.st_ino}"
+        identity = [stat.st_mtime_ns, stat.st_size]
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached and cached.get("identity") == identity:
+            return cached["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._entries[key] = {"identity": identity, "sha256": digest.hexdigest(), "path": path}
+            entries = dict(self._entries)
+        try:
+            atomic_write(self.path, json.dumps(entries).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш хэшей моделей: {e}")
+        return digest.hexdigest()
+
+
+class ModelManifest:
+    """
+    Модели, нужные воркфлоу реестра: имя файла, каталоги models, какие
+    воркфлоу его используют и, если объявлены в файле манифеста, ожидаемые
+    размер и sha256. Проверка - по stat (параллельно, volume сетевой);
+    хэш сверяется, только если объявлен, и берется из кэша по inode/mtime.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]], models_dir: str = MODELS_DIR):
+        self.entries = entries
+        self.models_dir = models_dir
+
+    @classmethod
+    def from_registry(
+        cls,
+        registry=None,
+        manifest_path: str = MANIFEST_PATH,
+        models_dir: str = MODELS_DIR
+    ) -> "ModelManifest":
+        """Манифест из воркфлоу реестра, дополненный размерами и хэшами из файла манифеста"""
+        if registry is None:
+            from .registry import WorkflowRegistry
+
+            registry = WorkflowRegistry()
+            registry.reload()
+
+        entries: Dict[str, Dict[str, Any]] = {}
+        for info in registry.list():
+            for model in workflow_models(registry.get(info["name"]).workflow):
+                entry = entries.setdefault(model["name"], {**model, "workflows": []})
+                if info["name"] not in entry["workflows"]:
+                    entry["workflows"].append(info["name"])
+
+        declared = _read(manifest_path).get("models") or []
+        for item in declared:
+            entry = entries.setdefault(item["name"], {"name": item["name"], "workflows": []})
+            entry.update({k: v for k, v in item.items() if k in ("folders", "size", "sha256")})
+            entry.setdefault("folders", [])
+        return cls(list(entries.values()), models_dir)
+
+    def resolve(self, entry: Dict[str, Any]) -> Optional[str]:
+        """Путь к файлу модели (первый существующий из каталогов) или None"""
+        for folder in entry.get("folders") or [""]:
+            path = os.path.join(self.models_dir, folder, entry["name"])
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def verify(self, hashes: Optional[HashCache] = None, workers: int = 8) -> Dict[str, Any]:
+        """
+        Проверяет наличие, размер и (если объявлен и передан кэш) sha256 моделей
+
+        Returns:
+            ok, missing, size_mismatch, hash_mismatch (имена файлов), total_bytes, seconds
+        """
+        start = time.perf_counter()
+
+        def check(entry):
+            path = self.resolve(entry)
+            if path is None:
+                return "missing", 0
+            size = os.path.getsize(path)
+            if entry.get("size") is not None and size != entry["size"]:
+                return "size_mismatch", size
+            if hashes is not None and entry.get("sha256") and hashes.sha256(path) != entry["sha256"]:
+                return "hash_mismatch", size
+            return "ok", size
+
+        report = {"ok": [], "missing": [], "size_mismatch": [], "hash_mismatch": [], "total_bytes": 0}
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(self.entries)))) as executor:
+            for entry, (status, size) in zip(self.entries, executor.map(check, self.entries)):
+                report[status].append(entry["name"])
+                report["total_bytes"] += size
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        return report
+
+    def paths_for(self, workflow_names: Iterable[str] = ()) -> List[str]:
+        """Существующие файлы моделей: сначала модели указанных воркфлоу (по порядку), затем остальные"""
+        priority = {name: index for index, name in enumerate(workflow_names)}
+        ordered = sorted(
+            self.entries,
+            key=lambda entry: min((priority[w] for w in entry.get("workflows", []) if w in priority), default=len(priority))
+        )
+        return [path for path in (self.resolve(entry) for entry in ordered) if path]
+
+    def to_dict(self, hashes: Optional[HashCache] = None) -> Dict[str, Any]:
+        """Манифест с текущими размерами (и sha256) файлов - для сохранения в MODEL_MANIFEST"""
+        models = []
+        for entry in self.entries:
+            item = {"name": entry["name"], "folders": entry.get("folders", [])}
+            path = self.resolve(entry)
+            if path is not None:
+                item["size"] = os.path.getsize(path)
+                if hashes is not None:
+                    item["sha256"] = hashes.sha256(path)
+            models.append(item)
+        return {"models": models}
+
+
+class ModelPrefetcher:
+    """
+    Читает файлы моделей в page cache в фоне, пока ComfyUI загружается:
+    первая загрузка весов идет из памяти, а не с сетевого volume.
+    Прогресс пишется в лог и в JSON (PREFETCH_PROGRESS).
+    """
+
+    def __init__(
+        self,
+        paths: List[str],
+        max_bytes: Optional[int] = None,
+        workers: int = PREFETCH_WORKERS,
+        progress_path: Optional[str] = PREFETCH_PROGRESS
+    ):
+        self.paths = paths
+        self.max_bytes = _prefetch_budget() if max_bytes is None else max_bytes
+        self.workers = max(1, workers)
+        self.progress_path = progress_path
+
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.files_done: List[str] = []
+        self.skipped: List[str] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._last_report = 0.0
+
+    def run(self) -> Dict[str, Any]:
+        """Читает файлы в пределах бюджета; возвращает итоговый прогресс"""
+        self.started_at = time.time()
+        planned = []
+        for path in self.paths:
+            size = os.path.getsize(path)
+            if self.bytes_total + size > self.max_bytes:
+                self.skipped.append(path)
+                continue
+            planned.append(path)
+            self.bytes_total += size
+        logger.info(
+            f"Прогрев page cache: {len(planned)} файлов, {self.bytes_total / 1024 ** 3:.1f} ГБ"
+            f" (пропущено сверх бюджета: {len(self.skipped)})"
+        )
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch") as executor:
+            list(executor.map(self._read, planned))
+
+        self.finished_at = time.time()
+        self._report(force=True)
+        return self.progress()
+
+    def progress(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = (self.finished_at or time.time()) - (self.started_at or time.time())
+            return {
+                "bytes_done": self.bytes_done,
+                "bytes_total": self.bytes_total,
+                "percent": round(100.0 * self.bytes_done / self.bytes_total, 1) if self.bytes_total else 100.0,
+                "files_done": len(self.files_done),
+                "files_total": len(self.paths) - len(self.skipped),
+                "skipped": self.skipped,
+                "seconds": round(elapsed, 3),
+                "mb_per_second": round(self.bytes_done / 1024 ** 2 / elapsed, 1) if elapsed > 0 else None,
+                "done": self.finished_at is not None
+            }
+
+    def _read(self, path: str):
+        buffer = bytearray(CHUNK_SIZE)
+        view = memoryview(buffer)
+        try:
+            with open(path, "rb", buffering=0) as f:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                while True:
+                    read = f.readinto(view)
+                    if not read:
+                        break
+                    with self._lock:
+                        self.bytes_done += read
+                    self._report()
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать {path}: {e}")
+            return
+        with self._lock:
+            self.files_done.append(path)
+
+    def _report(self, force: bool = False):
+        now = time.time()
+        if not force and now - self._last_report < 5:
+            return
+        self._last_report = now
+        progress = self.progress()
+        logger.info(
+            f"Прогрев page cache: {progress['percent']}% ({progress['files_done']}/{progress['files_total']}),"
+            f" {progress['mb_per_second']} МБ/с"
+        )
+        if self.progress_path:
+            try:
+                atomic_write(self.progress_path, json.dumps(progress).encode("utf-8"))
+            except OSError:
+                pass
+
+
+def load_progress(path: str = PREFETCH_PROGRESS) -> Optional[Dict[str, Any]]:
+    """Прогресс фонового прогрева page cache (для метрик обработчика)"""
+    return _read(path) or None
+
+
+def _prefetch_budget() -> int:
+    if PREFETCH_MAX_GB:
+        return int(float(PREFETCH_MAX_GB) * 1024 ** 3)
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024 // 2
+    except OSError:
+        pass
+    return 32 * 1024 ** 3
+
+
+def _read(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv: List[str]) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    command = argv[0] if argv else "verify"
+    manifest = ModelManifest.from_registry()
+
+    if command == "write":
+        hashes = HashCache() if "--hash" in argv else None
+        atomic_write(MANIFEST_PATH, json.dumps(manifest.to_dict(hashes), indent=2).encode("utf-8"))
+        logger.info(f"Манифест моделей сохранен: {MANIFEST_PATH} ({len(manifest.entries)} файлов)")
+        return 0
+
+    if command == "prefetch":
+        from .warmup import WARMUP_WORKFLOW
+
+        first = [name for name in os.environ.get("PREFETCH_WORKFLOWS", WARMUP_WORKFLOW).split(",") if name]
+        ModelPrefetcher(manifest.paths_for(first)).run()
+        return 0
+
+    report = manifest.verify(HashCache())
+    for name in report["ok"]:
+        logger.info(f"✅ {name}")
+    for status in ("missing", "size_mismatch", "hash_mismatch"):
+        for name in report[status]:
+            logger.error(f"❌ {name}: {status}")
+    logger.info(
+        f"Моделей в порядке: {len(report['ok'])}/{len(manifest.entries)},"
+        f" {report['total_bytes'] / 1024 ** 3:.1f} ГБ, {report['seconds']}с"
+    )
+    return 0 if len(report["ok"]) == len(manifest.entries) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Снимок /object_info ComfyUI: живой ответ, кэш на диске или снимок из пакета
+"""
+from typing import Dict, Any, Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from .client import ComfyClient
+from .disk import atomic_write
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "object_info.json")
+COMFY_DIR = os.environ.get("COMFY_DIR", "/comfyui")
+
+
+def installation_key(comfy_dir: str = COMFY_DIR) -> str:
+    """
+    Версия установки ComfyUI: коммиты (или mtime каталогов) ComfyUI и
+    каждого custom node. Снимок /object_info на диске действителен,
+    пока ключ не изменился.
+    """
+    custom_dir = os.path.join(comfy_dir, "custom_nodes")
+    try:
+        names = sorted(os.listdir(custom_dir))
+    except OSError:
+        names = []
+    parts = [f"ComfyUI:{_revision(comfy_dir)}"]
+    parts.extend(f"{name}:{_revision(os.path.join(custom_dir, name))}" for name in names)
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _revision(path: str) -> str:
+    """Коммит git HEAD каталога; без git - mtime каталога"""
+    git_dir = os.path.join(path, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r", encoding="utf-8") as f:
+            head = f.read().strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head[5:]
+        try:
+            with open(os.path.join(git_dir, ref), "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            with open(os.path.join(git_dir, "packed-refs"), "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.rstrip().endswith(f" {ref}"):
+                        return line.split()[0]
+        return head
+    except OSError:
+        try:
+            return str(os.stat(path).st_mtime_ns)
+        except OSError:
+            return "-"
+
+
+class ObjectInfoStore:
+    """
+    Описания узлов ComfyUI (входы, их порядок и типы).
+
+    Живой ответ /object_info сохраняется на диск вместе с ключом версий
+    ComfyUI и custom nodes (installation_key) и используется при следующих
+    стартах, пока ComfyUI еще не поднят; снимок другой версии игнорируется.
+    Снимок из пакета (узлы воркфлоу из workflow/) дополняет его типами,
+    которых нет в живом ответе, и используется целиком без ComfyUI.
+    """
+
+    CACHE_PATH = os.environ.get("OBJECT_INFO_CACHE", "/comfyui/cache/object_info.json")
+
+    def __init__(
+        self,
+        client: Optional[ComfyClient] = None,
+        cache_path: Optional[str] = None,
+        bundled_path: Optional[str] = None,
+        comfy_dir: str = COMFY_DIR
+    ):
+        self.client = client
+        self.cache_path = cache_path or self.CACHE_PATH
+        self.bundled_path = bundled_path or BUNDLED_PATH
+        self.comfy_dir = comfy_dir
+        self.source: Optional[str] = None
+        self._data: Optional[Dict[str, Any]] = None
+        self._installed: Optional[Dict[str, Any]] = None
+        self._key: Optional[str] = None
+        self._fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict[str, Any]:
+        """Описания узлов без сетевых запросов (диск или снимок из пакета)"""
+        with self._lock:
+            if self._data is None:
+                cached = self._read(self.cache_path) or {}
+                if cached.get("key") == self.key() and cached.get("object_info"):
+                    self._set(cached["object_info"], "disk")
+                else:
+                    if cached:
+                        logger.info("Снимок /object_info на диске от другой версии ComfyUI, не используется")
+                    self._set({}, "bundled")
+            return self._data
+
+    def installed(self) -> Optional[Dict[str, Any]]:
+        """
+        Описания узлов установленного ComfyUI (живой ответ или снимок той же
+        версии) без дополнения из пакета; None, если их нет
+        """
+        self.get()
+        return self._installed
+
+    def key(self) -> str:
+        """Ключ версий ComfyUI и custom nodes (считается один раз)"""
+        if self._key is None:
+            self._key = installation_key(self.comfy_dir)
+        return self._key
+
+    def refresh(self) -> bool:
+        """
+        Запрашивает /object_info у ComfyUI и сохраняет ответ на диск
+
+        Returns:
+            True, если живой ответ получен
+        """
+        if self.client is None:
+            return False
+        try:
+            live = self.client.object_info()
+        except Exception as e:
+            logger.warning(f"Не удалось получить /object_info: {e}")
+            return False
+
+        try:
+            snapshot = {"key": self.key(), "object_info": live}
+            atomic_write(self.cache_path, json.dumps(snapshot).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить снимок /object_info: {e}")
+        with self._lock:
+            self._set(live, "live")
+        logger.info(f"Получены описания {len(live)} узлов ComfyUI")
+        return True
+
+    def fingerprint(self) -> str:
+        """Хэш текущего набора описаний (для ключей кэшей, зависящих от него)"""
+        self.get()
+        return self._fingerprint
+
+    def _set(self, data: Dict[str, Any], source: str):
+        merged = dict(self._read(self.bundled_path) or {})
+        merged.update(data)
+        self._data = merged
+        self._installed = data if source != "bundled" else None
+        self.source = source
+        payload = json.dumps(merged, sort_keys=True, separators=(",", ":"))
+        self._fingerprint = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+_store: Optional[ObjectInfoStore] = None
+
+
+def get_object_info_store() -> ObjectInfoStore:
+    """Общий снимок /object_info воркера"""
+    global _store
+    if _store is None:
+        from .client import get_client
+
+        _store = ObjectInfoStore(get_client())
+    return _store
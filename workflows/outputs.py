@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Сбор выходных файлов задачи по метаданным history ComfyUI
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Iterable
+import logging
+import os
+
+from .base import WorkflowType
+from .graph import WorkflowGraph
+
+logger = logging.getLogger(__name__)
+
+# Каталоги ComfyUI по значению поля `type` в history
+FOLDERS = {
+    "output": "/comfyui/output",
+    "temp": "/comfyui/temp",
+    "input": "/comfyui/input",
+}
+
+# Ключи результатов узлов и тип файлов в них (gifs - VHS_VideoCombine)
+RESULT_KEYS = {
+    "gifs": "video",
+    "videos": "video",
+    "images": "image",
+}
+
+VIDEO_EXTENSIONS = {".mp4", ".webm", ".mov", ".mkv", ".gif"}
+
+OUTPUT_WORKERS = int(os.environ.get("OUTPUT_WORKERS", "4"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_output_executor() -> ThreadPoolExecutor:
+    """Общий пул потоков для кодирования и загрузки выходных файлов"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=OUTPUT_WORKERS, thread_name_prefix="outputs")
+    return _executor
+
+
+def resolve_output_path(file_info: Dict[str, Any]) -> str:
+    """
+    Путь к файлу по полям filename/subfolder/type из history
+
+    Raises:
+        ValueError: если путь выходит за пределы каталога ComfyUI
+    """
+    base = FOLDERS.get(file_info.get("type") or "output", FOLDERS["output"])
+    path = os.path.normpath(os.path.join(base, file_info.get("subfolder") or "", file_info["filename"]))
+    if os.path.commonpath([base, path]) != base:
+        raise ValueError(f"Недопустимый путь выходного файла: {path}")
+    return path
+
+
+def expected_output_type(workflow_type: Optional[WorkflowType]) -> Optional[str]:
+    """Тип основного файла для типа воркфлоу"""
+    if workflow_type in (WorkflowType.T2V, WorkflowType.VIDEO_UPSCALE):
+        return "video"
+    if workflow_type in (WorkflowType.T2I, WorkflowType.IMG2IMG):
+        return "image"
+    return None
+
+
+def collect_output_files(
+    result: Dict[str, Any],
+    workflow_type: Optional[WorkflowType] = None,
+    node_ids: Optional[Iterable[str]] = None,
+    include_temp: bool = False,
+    graph: Optional[WorkflowGraph] = None
+) -> List[Dict[str, Any]]:
+    """
+    Собирает все выходные файлы задачи
+
+    Args:
+        result: Запись history задачи
+        workflow_type: Тип воркфлоу; файлы ожидаемого типа идут первыми
+        node_ids: Вернуть файлы только этих узлов (в указанном порядке)
+        include_temp: Включать временные файлы (превью); для явно
+            выбранных узлов они включаются всегда
+        graph: Граф воркфлоу; среди файлов одного вида первыми идут узлы,
+            дальше всего стоящие по графу (итог, а не промежуточное сохранение)
+
+    Returns:
+        Список описаний файлов: node_id, type, filename, subfolder, folder_type, path
+    """
+    outputs = result.get("outputs", {})
+    selected = [str(node_id) for node_id in node_ids] if node_ids else None
+    order = selected if selected is not None else list(outputs.keys())
+
+    files = []
+    for node_id in order:
+        node_result = outputs.get(node_id)
+        if not isinstance(node_result, dict):
+            if selected is not None:
+                logger.warning(f"Узел {node_id} не вернул выходных файлов")
+            continue
+
+        for key, file_type in RESULT_KEYS.items():
+            for file_info in node_result.get(key) or []:
+                if not isinstance(file_info, dict) or "filename" not in file_info:
+                    continue
+                folder_type = file_info.get("type") or "output"
+                if folder_type == "temp" and not (include_temp or selected is not None):
+                    continue
+                # VHS кладет в gifs и картинки, и видео - уточняем по расширению каждого файла
+                kind = file_type
+                if key == "gifs" and os.path.splitext(file_info["filename"])[1].lower() not in VIDEO_EXTENSIONS:
+                    kind = "image"
+                try:
+                    path = resolve_output_path(file_info)
+                except ValueError as e:
+                    logger.error(str(e))
+                    continue
+                files.append({
+                    "node_id": node_id,
+                    "type": kind,
+                    "filename": file_info["filename"],
+                    "subfolder": file_info.get("subfolder", ""),
+                    "folder_type": folder_type,
+                    "format": file_info.get("format"),
+                    "path": path
+                })
+
+    main_type = expected_output_type(workflow_type)
+    if main_type and selected is None:
+        # Стабильная сортировка: файлы ожидаемого типа первыми, затем по глубине узла в графе
+        files.sort(key=lambda f: (f["type"] != main_type, graph.output_rank(f["node_id"]) if graph else 0))
+
+    return files
+
+
+def select_output_files(files: List[Dict[str, Any]], node_ids: Optional[Iterable[str]]) -> List[Dict[str, Any]]:
+    """
+    Оставляет файлы указанных узлов в порядке node_ids (для уже собранного
+    списка, включая превью); без node_ids - все, кроме временных, как collect_output_files
+    """
+    if not node_ids:
+        return [f for f in files if f.get("folder_type") != "temp"]
+    selected = [str(node_id) for node_id in node_ids]
+    return [f for node_id in selected for f in files if f["node_id"] == node_id]
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Скомпилированные планы подстановки параметров в API воркфлоу
+"""
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from .graph import WorkflowGraph, is_link
+
+logger = logging.getLogger(__name__)
+
+TEXT_NODES = {"CLIPTextEncode", "TextEncode"}
+IMAGE_NODES = {"LoadImage", "ImageInput"}
+VIDEO_NODES = {"LoadVideo", "VideoInput", "VHS_LoadVideo"}
+# Заголовки узлов с негативным промптом (их текст не заменяется)
+NEGATIVE_MARKERS = ("negative", "bad")
+
+SELECTOR_PREFIXES = ("id", "class", "title")
+
+
+class WorkflowPlan:
+    """
+    Индекс воркфлоу, построенный один раз на структуру графа.
+
+    Хранит class_type -> узлы, имя входа -> узлы, заголовок -> узлы и
+    заранее найденные узлы промпта, входных файлов, сидов и filename_prefix.
+    Применение плана трогает только изменяемые поля: затронутые узлы
+    копируются, остальные разделяются с исходным воркфлоу.
+
+    Ключи опций - имя входа (`steps` - во всех узлах с таким входом) или
+    селектор `<узел>.<вход>`, где узел - id (`35.steps`), class_type
+    (`KSamplerAdvanced.steps`) или `_meta.title` (`High noise.steps`).
+    Явный вид селектора задается префиксом: `id:`, `class:`, `title:`.
+
+    Граф связей (`graph`) строится вместе с планом и общий для определения
+    типа, проверки и выбора выходных файлов.
+    """
+
+    def __init__(self, workflow: Dict[str, Any], key: Optional[str] = None):
+        self.structure_hash = key or structure_hash(workflow)
+        self.graph = WorkflowGraph(workflow)
+        self.by_class: Dict[str, List[str]] = {}
+        self.by_input: Dict[str, List[str]] = {}
+        self.by_title: Dict[str, List[str]] = {}
+        self.node_ids = set()
+        self.prompt_nodes: List[str] = []
+        self.image_nodes: List[str] = []
+        self.video_nodes: List[str] = []
+        self.seed_fields: List[Tuple[str, str]] = []
+        self.prefix_nodes: List[str] = []
+
+        for node_id, node_data in workflow.items():
+            if not isinstance(node_data, dict):
+                continue
+            node_id = str(node_id)
+            class_type = node_data.get("class_type", "")
+            inputs = node_data.get("inputs") or {}
+            title = node_data.get("_meta", {}).get("title", "")
+
+            self.node_ids.add(node_id)
+            self.by_class.setdefault(class_type, []).append(node_id)
+            if title:
+                self.by_title.setdefault(title.lower(), []).append(node_id)
+            for name in inputs:
+                self.by_input.setdefault(name, []).append(node_id)
+
+            if class_type in TEXT_NODES and "text" in inputs:
+                if not any(marker in title.lower() for marker in NEGATIVE_MARKERS):
+                    self.prompt_nodes.append(node_id)
+            if class_type in IMAGE_NODES and "image" in inputs:
+                self.image_nodes.append(node_id)
+            if class_type in VIDEO_NODES and "video" in inputs:
+                self.video_nodes.append(node_id)
+            if "KSampler" in class_type:
+                self.seed_fields.extend((node_id, key) for key in ("seed", "noise_seed") if key in inputs)
+            if "filename_prefix" in inputs:
+                self.prefix_nodes.append(node_id)
+
+    def select(self, selector: str) -> List[str]:
+        """
+        Узлы по селектору (id, class_type или заголовок)
+
+        Raises:
+            ValueError: если селектор не нашел ни одного узла
+        """
+        kind, _, value = selector.partition(":")
+        if kind not in SELECTOR_PREFIXES or not value:
+            kind, value = None, selector
+
+        if kind in (None, "id") and value in self.node_ids:
+            return [value]
+        if kind in (None, "class") and value in self.by_class:
+            return self.by_class[value]
+        if kind in (None, "title") and value.lower() in self.by_title:
+            return self.by_title[value.lower()]
+        raise ValueError(f"Селектор '{selector}' не соответствует ни одному узлу")
+
+    def resolve(self, key: str) -> List[Tuple[str, str]]:
+        """
+        Поля (узел, вход), которые меняет опция
+
+        Raises:
+            ValueError: если селектор указывает на узлы без такого входа
+        """
+        if "." not in key:
+            return [(node_id, key) for node_id in self.by_input.get(key, [])]
+
+        selector, input_name = key.rsplit(".", 1)
+        nodes = self.select(selector)
+        targets = [(node_id, input_name) for node_id in nodes if node_id in self.by_input.get(input_name, [])]
+        if not targets:
+            raise ValueError(f"У узлов '{selector}' нет входа '{input_name}'")
+        return targets
+
+    def apply(
+        self,
+        workflow: Dict[str, Any],
+        prompt: Optional[str] = None,
+        image_filename: Optional[str] = None,
+        video_filename: Optional[str] = None,
+        options: Optional[Dict[str, Any]] = None,
+        output_prefix: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Возвращает воркфлоу с подставленными значениями; исходный не изменяется"""
+        patches: Dict[Tuple[str, str], Any] = {}
+
+        if prompt:
+            patches.update({(node_id, "text"): prompt for node_id in self.prompt_nodes})
+        if image_filename:
+            patches.update({(node_id, "image"): image_filename for node_id in self.image_nodes})
+        if video_filename:
+            patches.update({(node_id, "video"): video_filename for node_id in self.video_nodes})
+
+        if options:
+            # Без явного сида результат делаем недетерминированным, как и раньше
+            seed = options.get("seed", int(time.time()))
+            patches.update({field: seed for field in self.seed_fields})
+            for key, value in options.items():
+                if key == "seed":
+                    continue
+                patches.update({field: value for field in self.resolve(key)})
+
+        if output_prefix:
+            for node_id in self.prefix_nodes:
+                prefix = workflow[node_id]["inputs"]["filename_prefix"]
+                if isinstance(prefix, str) and not prefix.startswith(f"{output_prefix}/"):
+                    patches[(node_id, "filename_prefix")] = f"{output_prefix}/{prefix}"
+
+        prepared = dict(workflow)
+        copied = set()
+        for (node_id, input_name), value in patches.items():
+            if node_id not in copied:
+                node = prepared[node_id]
+                prepared[node_id] = {**node, "inputs": dict(node.get("inputs") or {})}
+                copied.add(node_id)
+            prepared[node_id]["inputs"][input_name] = value
+            logger.debug(f"Обновлен параметр {input_name} в узле {node_id}")
+
+        return prepared
+
+
+def structure_hash(workflow: Dict[str, Any]) -> str:
+    """
+    Хэш структуры графа: узлы, их типы, имена входов, связи и заголовки.
+    Значения входов (кроме ссылок на узлы) не учитываются - воркфлоу,
+    отличающиеся только параметрами, используют один план.
+    """
+    structure = {
+        str(node_id): [
+            node_data.get("class_type"),
+            sorted(
+                [name, value if is_link(value) else None]
+                for name, value in (node_data.get("inputs") or {}).items()
+            ),
+            node_data.get("_meta", {}).get("title", "")
+        ]
+        for node_id, node_data in workflow.items()
+        if isinstance(node_data, dict)
+    }
+    payload = json.dumps(structure, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """LRU кэш скомпилированных планов по структурному хэшу"""
+
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self._plans: "OrderedDict[str, WorkflowPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, workflow: Dict[str, Any]) -> WorkflowPlan:
+        key = structure_hash(workflow)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+
+        plan = WorkflowPlan(workflow, key)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+        logger.debug(f"Скомпилирован план воркфлоу {key[:12]}")
+        return plan
+
+
+plan_cache = PlanCache()
+
+
+def compile_workflow(workflow: Dict[str, Any]) -> WorkflowPlan:
+    """План воркфлоу из кэша (компилируется при первом обращении к структуре)"""
+    return plan_cache.get(workflow)
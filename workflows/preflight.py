@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Предстартовые проверки воркера одним процессом: python -m workflows.preflight
+
+Проверки выполняются параллельно; результаты проверок образа (импорт
+torch, torchvision, xformers, заглушка torchaudio) кэшируются по версии
+образа из version.py, так что повторный старт контейнера их пропускает
+и не импортирует torch: GPU проверяется через nvidia-smi, без CUDA контекста.
+Пакеты во время старта не устанавливаются - сломанный образ нужно
+пересобрать. Итог с длительностью проверок пишется в JSON (PREFLIGHT_REPORT).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from .disk import atomic_write
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get("PREFLIGHT_CACHE_DIR", "/comfyui/cache")
+REPORT_PATH = os.environ.get("PREFLIGHT_REPORT", "/tmp/preflight.json")
+CUSTOM_NODES_DIR = "/comfyui/custom_nodes"
+NVIDIA_SMI = os.environ.get("NVIDIA_SMI", "nvidia-smi")
+
+REQUIRED_CUSTOM_NODES = ["ComfyUI_essentials", "ComfyUI-VideoHelperSuite"]
+
+TORCHAUDIO_ATTRS = ("lib", "transforms", "functional", "backend", "__version__")
+
+
+def image_version() -> Optional[str]:
+    """Версия образа из version.py (None - кэш не используется)"""
+    try:
+        import version
+    except ImportError:
+        return None
+    return version.get_version()
+
+
+# ----------------------------------------------------------------------
+# Проверки: возвращают словарь сведений или бросают исключение
+# ----------------------------------------------------------------------
+
+def check_torch() -> Dict[str, Any]:
+    import torch
+
+    return {"torch": torch.__version__, "cuda": torch.version.cuda}
+
+
+def check_torchvision() -> Dict[str, Any]:
+    import torchvision
+
+    return {"torchvision": torchvision.__version__}
+
+
+def check_xformers() -> Dict[str, Any]:
+    import xformers
+
+    return {"xformers": xformers.__version__}
+
+
+def check_torchaudio() -> Dict[str, Any]:
+    """Заглушка torchaudio из образа должна импортироваться со всеми атрибутами"""
+    import torchaudio
+
+    missing = [attr for attr in TORCHAUDIO_ATTRS if not hasattr(torchaudio, attr)]
+    if missing:
+        raise RuntimeError(f"В torchaudio отсутствуют атрибуты: {', '.join(missing)}")
+    return {"torchaudio": torchaudio.__version__}
+
+
+def check_gpu(command: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Первая GPU по nvidia-smi: на каждом старте (GPU зависит от хоста), но без
+    импорта torch и создания CUDA контекста
+    """
+    try:
+        completed = subprocess.run(
+            [command or NVIDIA_SMI, "--query-gpu=name,memory.total,driver_version", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, timeout=15
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise RuntimeError(f"nvidia-smi недоступен: {e}")
+    lines = [line for line in completed.stdout.splitlines() if line.strip()]
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(f"GPU не найдена: {completed.stderr.strip() or completed.stdout.strip()}")
+    name, memory_mb, driver = [part.strip() for part in lines[0].split(",")]
+    return {"gpu": name, "vram_gb": round(int(memory_mb) / 1024, 1), "driver": driver, "count": len(lines)}
+
+
+def check_models(manifest=None) -> Dict[str, Any]:
+    """
+    Модели из манифеста воркфлоу реестра: наличие и размер по stat
+    (параллельно - volume сетевой); хэши здесь не считаются
+    """
+    from .models import ModelManifest
+
+    if manifest is None:
+        manifest = ModelManifest.from_registry()
+    report = manifest.verify()
+    problems = [
+        f"{name} ({status})"
+        for status in ("missing", "size_mismatch") for name in report[status]
+    ]
+    if problems:
+        raise RuntimeError(f"Проблемы с моделями: {', '.join(problems)}")
+    return {"found": len(report["ok"]), "total_gb": round(report["total_bytes"] / 1024 ** 3, 1)}
+
+
+def check_custom_nodes(nodes_dir: str = CUSTOM_NODES_DIR) -> Dict[str, Any]:
+    missing = [name for name in REQUIRED_CUSTOM_NODES if not os.path.isdir(os.path.join(nodes_dir, name))]
+    if missing:
+        raise RuntimeError(f"Отсутствуют custom nodes: {', '.join(missing)}")
+    return {"found": len(REQUIRED_CUSTOM_NODES)}
+
+
+# (имя, функция, кэшируется ли результат по версии образа)
+CHECKS: List[Tuple[str, Callable[[], Dict[str, Any]], bool]] = [
+    ("torch", check_torch, True),
+    ("torchvision", check_torchvision, True),
+    ("xformers", check_xformers, True),
+    ("torchaudio", check_torchaudio, True),
+    ("gpu", check_gpu, False),
+    ("models", check_models, False),
+    ("custom_nodes", check_custom_nodes, False),
+]
+
+
+def _timed(check: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        record = {"status": "ok", **check()}
+    except Exception as e:
+        record = {"status": "error", "error": str(e)}
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_preflight(
+    checks: List[Tuple[str, Callable[[], Dict[str, Any]], bool]] = CHECKS,
+    version: Optional[str] = None,
+    cache_dir: str = CACHE_DIR
+) -> Dict[str, Any]:
+    """
+    Выполняет проверки параллельно
+
+    Returns:
+        Отчет: version, total_seconds, checks (status, seconds, сведения, cached)
+    """
+    start = time.perf_counter()
+    cache_path = os.path.join(cache_dir, f"preflight-{version}.json") if version else None
+    cached = _read(cache_path) if cache_path else {}
+
+    results: Dict[str, Dict[str, Any]] = {}
+    pending = []
+    for name, check, cacheable in checks:
+        if cacheable and name in cached:
+            results[name] = {**cached[name], "cached": True, "seconds": 0.0}
+        else:
+            pending.append((name, check, cacheable))
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="preflight") as executor:
+            futures = {name: executor.submit(_timed, check) for name, check, _ in pending}
+            for name, future in futures.items():
+                results[name] = future.result()
+
+    # Кэшируем только успешные проверки образа: неудачные повторятся при следующем старте
+    fresh = {
+        name: results[name] for name, _, cacheable in pending
+        if cacheable and results[name]["status"] == "ok"
+    }
+    if cache_path and fresh:
+        try:
+            atomic_write(cache_path, json.dumps({**cached, **fresh}).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш проверок: {e}")
+
+    return {
+        "version": version,
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "checks": {name: results[name] for name, _, _ in checks}
+    }
+
+
+def load_report(path: str = REPORT_PATH) -> Optional[Dict[str, Any]]:
+    """Отчет последнего запуска preflight (для отчета о запуске обработчика)"""
+    return _read(path) or None
+
+
+def _read(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    report = run_preflight(version=image_version())
+
+    for name, record in report["checks"].items():
+        details = {k: v for k, v in record.items() if k not in ("status", "seconds", "cached", "error")}
+        source = " (кэш)" if record.get("cached") else f" за {record['seconds']}с"
+        if record["status"] == "ok":
+            logger.info(f"✅ {name}{source}: {details}")
+        else:
+            logger.error(f"❌ {name}{source}: {record['error']}")
+    if report["checks"].get("models", {}).get("status") == "error":
+        logger.error("🔍 Диагностика volume: /diagnose_volume.sh")
+    logger.info(f"⏱  Предстартовые проверки: {report['total_seconds']}с")
+
+    try:
+        atomic_write(REPORT_PATH, json.dumps(report, ensure_ascii=False).encode("utf-8"))
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить отчет проверок: {e}")
+    # Проверки не блокируют запуск: ошибки видны в логе и отчете
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
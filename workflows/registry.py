@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Реестр именованных воркфлоу: загрузка с диска, версии и горячая перезагрузка
+"""
+from typing import Dict, Any, Optional, List, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from .base import WorkflowType, WorkflowAnalyzer
+from .converter import ensure_api_format
+from .plan import WorkflowPlan, compile_workflow
+
+logger = logging.getLogger(__name__)
+
+# workflow/ рядом с пакетом (в образе - /workflow)
+DEFAULT_WORKFLOW_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workflow")
+
+
+class RegisteredWorkflow:
+    """Загруженный воркфлоу: API граф, его тип, план и версия (хэш содержимого файла)"""
+
+    def __init__(self, name: str, path: str, workflow: Dict[str, Any], version: str, stat_key: Tuple[int, int]):
+        self.name = name
+        self.path = path
+        self.workflow = workflow
+        self.version = version
+        self.stat_key = stat_key
+        self.plan: WorkflowPlan = compile_workflow(workflow)
+        self.workflow_type: WorkflowType = WorkflowAnalyzer.analyze_workflow(workflow, self.plan)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "workflow_type": self.workflow_type.value,
+            "node_count": len(self.workflow),
+            "path": self.path
+        }
+
+
+class WorkflowRegistry:
+    """
+    Воркфлоу из каталогов `workflow/` и WORKFLOW_DIRS (в API или UI формате),
+    доступные по имени файла.
+
+    Файлы читаются, анализируются и компилируются один раз при старте;
+    фоновый поток следит за mtime/размером и перезагружает измененные файлы.
+    Предыдущие версии остаются доступны для запросов с закрепленной версией,
+    пока процесс жив (не больше HISTORY_SIZE на имя). Графы реестра общие
+    для всех задач и не должны изменяться - подготовка копирует только
+    затронутые узлы.
+    """
+
+    HISTORY_SIZE = 5
+
+    def __init__(self, directories: Optional[List[str]] = None, interval: float = 5.0):
+        if directories is None:
+            directories = [DEFAULT_WORKFLOW_DIR] + [
+                path for path in os.environ.get("WORKFLOW_DIRS", "").split(os.pathsep) if path
+            ]
+        self.directories = directories
+        self.interval = interval
+
+        self._entries: Dict[str, RegisteredWorkflow] = {}
+        self._history: Dict[str, Dict[str, RegisteredWorkflow]] = {}
+        # Файлы, которые не удалось загрузить: не перечитываем, пока они не изменятся
+        self._skipped: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, name: str, version: Optional[str] = None) -> RegisteredWorkflow:
+        """
+        Воркфлоу по имени (и, при необходимости, версии)
+
+        Raises:
+            ValueError: если воркфлоу или запрошенная версия не найдены
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                raise ValueError(f"Воркфлоу '{name}' не найден. Доступны: {sorted(self._entries)}")
+            if version and not entry.version.startswith(version):
+                entry = next(
+                    (old for old_version, old in self._history.get(name, {}).items() if old_version.startswith(version)),
+                    None
+                )
+                if entry is None:
+                    raise ValueError(f"Версия '{version}' воркфлоу '{name}' недоступна")
+            return entry
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [entry.info() for entry in sorted(self._entries.values(), key=lambda e: e.name)]
+
+    def reload(self) -> Dict[str, List[str]]:
+        """
+        Перечитывает каталоги; неизмененные файлы (по mtime и размеру) пропускаются
+
+        Returns:
+            Имена добавленных, обновленных и удаленных воркфлоу
+        """
+        changes = {"added": [], "updated": [], "removed": []}
+        seen = set()
+
+        for name, path in self._scan():
+            seen.add(name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+            current = self._entries.get(name)
+            if current is not None and current.path == path and current.stat_key == stat_key:
+                continue
+            if self._skipped.get(path) == stat_key:
+                continue
+
+            entry = self._load(name, path, stat_key)
+            if entry is None:
+                self._skipped[path] = stat_key
+                continue
+            self._skipped.pop(path, None)
+            with self._lock:
+                previous = self._entries.get(name)
+                self._entries[name] = entry
+                if previous is not None and previous.version != entry.version:
+                    history = self._history.setdefault(name, {})
+                    history[previous.version] = previous
+                    while len(history) > self.HISTORY_SIZE:
+                        history.pop(next(iter(history)))
+            if previous is None:
+                changes["added"].append(name)
+            elif previous.version != entry.version:
+                changes["updated"].append(name)
+
+        with self._lock:
+            for name in set(self._entries) - seen:
+                del self._entries[name]
+                changes["removed"].append(name)
+
+        for kind, names in changes.items():
+            if names:
+                logger.info(f"Реестр воркфлоу, {kind}: {', '.join(sorted(names))}")
+        return changes
+
+    def start(self):
+        """Первая загрузка и фоновая перезагрузка измененных файлов"""
+        self.reload()
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="workflow-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.warning(f"Ошибка перезагрузки реестра воркфлоу: {e}")
+
+    def _scan(self) -> List[Tuple[str, str]]:
+        """(имя, путь) всех *.json; при совпадении имен приоритет у каталога, указанного позже"""
+        found: Dict[str, str] = {}
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                if filename.endswith(".json"):
+                    found[filename[:-len(".json")]] = os.path.join(directory, filename)
+        return list(found.items())
+
+    def _load(self, name: str, path: str, stat_key: Tuple[int, int]) -> Optional[RegisteredWorkflow]:
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            # UI граф из редактора преобразуется в API (с кэшем по хэшу файла)
+            workflow = ensure_api_format(json.loads(raw), digest)
+            return RegisteredWorkflow(name, path, workflow, digest[:16], stat_key)
+        except Exception as e:
+            logger.error(f"Не удалось загрузить воркфлоу {path}: {e}")
+            return None
+
+
+_registry: Optional[WorkflowRegistry] = None
+
+
+def get_registry() -> WorkflowRegistry:
+    """Общий реестр воркфлоу воркера"""
+    global _registry
+    if _registry is None:
+        _registry = WorkflowRegistry(interval=float(os.environ.get("WORKFLOW_RELOAD_INTERVAL", "5")))
+    return _registry
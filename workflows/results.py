@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш результатов детерминированных задач
+"""
+from typing import Dict, Any, Optional, List, Iterable
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from .disk import atomic_write, touch, evict_lru
+from .inputs import InputStore
+
+logger = logging.getLogger(__name__)
+
+# Входы узлов, которые не влияют на содержимое результата
+IGNORED_INPUTS = {"filename_prefix"}
+
+# Входы загрузчиков моделей и каталоги models, где лежат эти файлы
+MODEL_INPUTS = {
+    "ckpt_name": ("checkpoints",),
+    "unet_name": ("unet", "diffusion_models"),
+    "clip_name": ("clip", "text_encoders"),
+    "clip_name1": ("clip", "text_encoders"),
+    "clip_name2": ("clip", "text_encoders"),
+    "vae_name": ("vae",),
+    "lora_name": ("loras",),
+    "model_name": ("upscale_models",),
+    "control_net_name": ("controlnet",),
+    "clip_vision_name": ("clip_vision",),
+}
+
+
+def seed_is_fixed(options: Optional[Dict[str, Any]]) -> bool:
+    """
+    Детерминирован ли результат по сиду: без опций сиды берутся из воркфлоу,
+    а с опциями без seed план подставляет текущее время
+    """
+    return not options or options.get("seed") is not None
+
+
+class ResultCache:
+    """
+    Хранит выходные файлы задач под ключом из канонического хэша
+    подготовленного API графа, содержимого входных файлов и идентичности
+    (размер, mtime) файлов моделей. Повторная задача с тем же ключом
+    получает сохраненные файлы без обращения к GPU.
+
+    Каталог записи: <key>/manifest.json и копии (жесткие ссылки) файлов.
+    Занятое место ограничено бюджетом, давно не использованные записи вытесняются.
+    """
+
+    CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "/comfyui/cache/results")
+    MAX_BYTES = int(float(os.environ.get("RESULT_CACHE_MAX_GB", "10")) * 1024 ** 3)
+    MODELS_DIR = "/comfyui/models"
+    MANIFEST = "manifest.json"
+    # Меняется при изменении формата ключа или записи
+    VERSION = 1
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        input_dir: Optional[str] = None,
+        models_dir: Optional[str] = None
+    ):
+        self.cache_dir = cache_dir or self.CACHE_DIR
+        self.max_bytes = self.MAX_BYTES if max_bytes is None else max_bytes
+        self.input_dir = input_dir or InputStore.INPUT_DIR
+        self.models_dir = models_dir or self.MODELS_DIR
+        self._lock = threading.Lock()
+
+    def key(self, workflow: Dict[str, Any]) -> str:
+        """Ключ кэша для подготовленного API воркфлоу"""
+        graph = {}
+        files = {}
+        for node_id, node_data in workflow.items():
+            if not isinstance(node_data, dict):
+                continue
+            inputs = {
+                name: value for name, value in (node_data.get("inputs") or {}).items()
+                if name not in IGNORED_INPUTS
+            }
+            graph[node_id] = {"class_type": node_data.get("class_type"), "inputs": inputs}
+            for name, value in inputs.items():
+                if isinstance(value, str):
+                    identity = self._file_identity(name, value)
+                    if identity is not None:
+                        files[f"{name}:{value}"] = identity
+
+        payload = json.dumps(
+            {"version": self.VERSION, "graph": graph, "files": files},
+            sort_keys=True, separators=(",", ":"), default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Сохраненный результат или None
+
+        Returns:
+            Манифест записи: files (описания с path внутри кэша), prompt_id, created_at
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        manifest_path = os.path.join(entry_dir, self.MANIFEST)
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        files = manifest.get("files") or []
+        if not files:
+            # Запись без файлов не результат: граф выполняется заново
+            return None
+        for file_info in files:
+            file_info["path"] = os.path.join(entry_dir, file_info["cached_name"])
+            if not os.path.exists(file_info["path"]):
+                logger.warning(f"Запись кэша {key} повреждена, пропускаем")
+                return None
+
+        touch(manifest_path)
+        logger.info(f"Результат найден в кэше: {key}")
+        return manifest
+
+    def store(self, key: str, output_files: List[Dict[str, Any]], prompt_id: Optional[str] = None):
+        """Сохраняет выходные файлы задачи (жесткими ссылками, если возможно)"""
+        entry_dir = os.path.join(self.cache_dir, key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            files = []
+            for index, file_info in enumerate(output_files):
+                cached_name = f"{index}_{file_info['filename']}"
+                self._link_or_copy(file_info["path"], os.path.join(tmp_dir, cached_name))
+                files.append({**{k: v for k, v in file_info.items() if k != "path"}, "cached_name": cached_name})
+
+            manifest = {"files": files, "prompt_id": prompt_id, "created_at": time.time()}
+            atomic_write(os.path.join(tmp_dir, self.MANIFEST), json.dumps(manifest).encode("utf-8"))
+
+            with self._lock:
+                if os.path.exists(entry_dir):
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(tmp_dir, entry_dir)
+            logger.info(f"Результат сохранен в кэш: {key} ({len(files)} файлов)")
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить результат в кэш: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def evict(self) -> Dict[str, int]:
+        """Вытесняет давно не использованные записи сверх бюджета"""
+        with self._lock:
+            removed, freed = evict_lru(self._entries(), self.max_bytes, remove=shutil.rmtree)
+        return {"removed": removed, "freed": freed}
+
+    def _entries(self) -> Iterable:
+        """Записи кэша как (каталог, размер, время последнего использования)"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            if ".tmp-" in key:
+                continue
+            entry_dir = os.path.join(self.cache_dir, key)
+            try:
+                used_at = os.path.getmtime(os.path.join(entry_dir, self.MANIFEST))
+                size = sum(
+                    os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir)
+                )
+            except OSError:
+                continue
+            entries.append((entry_dir, size, used_at))
+        return entries
+
+    def _file_identity(self, name: str, value: str) -> Optional[List[Any]]:
+        """Идентичность файла, на который ссылается вход узла (модель или входной файл)"""
+        if name in MODEL_INPUTS:
+            candidates = [os.path.join(self.models_dir, folder, value) for folder in MODEL_INPUTS[name]]
+        elif value.startswith(f"{InputStore.SUBDIR}/"):
+            # Имя в хранилище входных файлов уже содержит sha256 содержимого
+            return None
+        else:
+            candidates = [os.path.join(self.input_dir, value)]
+
+        for path in candidates:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if os.path.isfile(path):
+                return [stat.st_size, stat.st_mtime_ns]
+        return None
+
+    @staticmethod
+    def _link_or_copy(source: str, target: str):
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+
+_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """Общий кэш результатов воркера"""
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
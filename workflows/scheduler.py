@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Планировщик постановки задач в ComfyUI с учетом загруженных моделей
+"""
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, Callable, FrozenSet, List, Tuple
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Загрузчики моделей и входы, определяющие, что окажется в памяти
+MODEL_LOADERS = {
+    "UNETLoader": ("unet_name", "weight_dtype"),
+    "CheckpointLoaderSimple": ("ckpt_name",),
+    "LoraLoaderModelOnly": ("lora_name", "strength_model"),
+    "LoraLoader": ("lora_name", "strength_model", "strength_clip"),
+    "CLIPLoader": ("clip_name", "type"),
+    "DualCLIPLoader": ("clip_name1", "clip_name2", "type"),
+    "VAELoader": ("vae_name",),
+}
+
+
+def model_set(workflow: Dict[str, Any]) -> FrozenSet[Tuple[Any, ...]]:
+    """Набор моделей графа: (class_type, значения ключевых входов) по всем загрузчикам"""
+    models = set()
+    for node_data in workflow.values():
+        if not isinstance(node_data, dict):
+            continue
+        class_type = node_data.get("class_type")
+        keys = MODEL_LOADERS.get(class_type)
+        if keys is None:
+            continue
+        inputs = node_data.get("inputs") or {}
+        # Ссылки на другие узлы (списки) не хэшируются и не описывают файл модели
+        values = tuple(inputs.get(key) if not isinstance(inputs.get(key), list) else None for key in keys)
+        models.add((class_type,) + values)
+    return frozenset(models)
+
+
+class _Pending:
+    """Граф, ожидающий постановки в очередь ComfyUI"""
+
+    def __init__(self, workflow: Dict[str, Any], models: FrozenSet[Tuple[Any, ...]]):
+        self.workflow = workflow
+        self.models = models
+        self.future: Future = Future()
+        self.submitted_at = time.time()
+        self.skipped = 0
+
+
+class ModelAffinityScheduler:
+    """
+    Держит в очереди ComfyUI не больше max_inflight задач, остальные
+    графы ждут локально. Следующим отправляется граф, которому нужно
+    загрузить меньше всего моделей сверх набора последнего отправленного
+    (UNET, LoRA с силой, CLIP, VAE), при равенстве - самый старый.
+
+    Справедливость: граф, который обогнали max_skips раз или который ждет
+    дольше max_wait секунд, отправляется следующим независимо от моделей.
+
+    После завершения задачи вызывающий код обязан вызвать release(prompt_id),
+    а если ожидание не состоялось - cancel(future).
+    """
+
+    def __init__(
+        self,
+        submit: Callable[[Dict[str, Any]], str],
+        max_inflight: int = 2,
+        max_skips: int = 4,
+        max_wait: float = 120.0,
+        on_pending: Optional[Callable[[FrozenSet[Tuple[Any, ...]]], None]] = None
+    ):
+        self.submit_fn = submit
+        # Вызывается с набором моделей каждого нового графа (например, для копирования на локальный диск)
+        self.on_pending = on_pending
+        self.max_inflight = max(1, max_inflight)
+        self.max_skips = max_skips
+        self.max_wait = max_wait
+
+        self.loaded: FrozenSet[Tuple[Any, ...]] = frozenset()
+        self.swaps = 0
+        self.model_loads = 0
+        self.dispatched = 0
+        self.forced = 0
+
+        self._pending: List[_Pending] = []
+        # prompt_id -> набор моделей задачи в очереди ComfyUI
+        self._inflight: Dict[str, FrozenSet[Tuple[Any, ...]]] = {}
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, workflow: Dict[str, Any]) -> Future:
+        """
+        Ставит граф в локальную очередь
+
+        Returns:
+            Future с prompt_id ComfyUI (или исключением постановки)
+        """
+        item = _Pending(workflow, model_set(workflow))
+        if self.on_pending is not None:
+            try:
+                self.on_pending(item.models)
+            except Exception as e:
+                logger.warning(f"Ошибка обработчика нового графа: {e}")
+        with self._lock:
+            self._pending.append(item)
+        self._dispatch()
+        return item.future
+
+    def release(self, prompt_id: Optional[str]):
+        """Задача завершилась (или ожидание прервано) - освобождает место в очереди ComfyUI"""
+        with self._lock:
+            self._inflight.pop(prompt_id, None)
+        self._dispatch()
+
+    def cancel(self, *futures: Future):
+        """
+        Отзывает графы, переданные submit: ожидающие убираются из локальной
+        очереди, уже отправленные (или отправляемые) освобождают место
+        в очереди ComfyUI, как release. Ожидающие убираются до освобождения
+        мест, чтобы освободившееся место не занял отзываемый граф.
+        """
+        with self._lock:
+            remaining = set(futures)
+            kept = []
+            for item in self._pending:
+                if item.future in remaining:
+                    item.future.cancel()
+                    remaining.discard(item.future)
+                else:
+                    kept.append(item)
+            self._pending = kept
+
+        def release_sent(done: Future):
+            if not done.cancelled() and done.exception() is None:
+                self.release(done.result())
+
+        for future in futures:
+            if future in remaining:
+                future.add_done_callback(release_sent)
+
+    def needed_models(self) -> FrozenSet[Tuple[Any, ...]]:
+        """Модели графов, ожидающих отправки или выполняющихся в ComfyUI"""
+        with self._lock:
+            needed = set(self.loaded)
+            for item in self._pending:
+                needed |= item.models
+            for models in self._inflight.values():
+                needed |= models
+        return frozenset(needed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "inflight": len(self._inflight) + self._reserved,
+                "dispatched": self.dispatched,
+                "swaps": self.swaps,
+                "model_loads": self.model_loads,
+                "forced": self.forced,
+                "loaded_models": len(self.loaded)
+            }
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if not self._pending or len(self._inflight) + self._reserved >= self.max_inflight:
+                    return
+                item = self._select()
+                self._reserved += 1
+
+            try:
+                prompt_id = self.submit_fn(item.workflow)
+            except Exception as e:
+                with self._lock:
+                    self._reserved -= 1
+                item.future.set_exception(e)
+                continue
+
+            with self._lock:
+                self._reserved -= 1
+                self._inflight[prompt_id] = item.models
+            item.future.set_result(prompt_id)
+
+    def _select(self) -> _Pending:
+        """Выбирает и изымает следующий граф (вызывается под блокировкой)"""
+        now = time.time()
+        overdue = [
+            item for item in self._pending
+            if item.skipped >= self.max_skips or now - item.submitted_at >= self.max_wait
+        ]
+        if overdue:
+            chosen = overdue[0]
+            self.forced += 1
+        else:
+            # min по числу новых моделей; при равенстве остается самый старый
+            chosen = min(self._pending, key=lambda item: len(item.models - self.loaded))
+
+        position = self._pending.index(chosen)
+        for older in self._pending[:position]:
+            older.skipped += 1
+        del self._pending[position]
+
+        new_models = chosen.models - self.loaded
+        if chosen.models != self.loaded and self.dispatched:
+            self.swaps += 1
+            self.model_loads += len(new_models)
+            logger.info(
+                f"Смена набора моделей: загружается {len(new_models)}, в локальной очереди {len(self._pending)}"
+            )
+        self.loaded = chosen.models
+        self.dispatched += 1
+        return chosen
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Отчет о запуске воркера: длительность и результат этапов старта
+"""
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+import json
+import logging
+import os
+import time
+
+from .preflight import load_report
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """
+    Этапы старта (preflight и загрузка ComfyUI из скрипта запуска,
+    ожидание ComfyUI, описания узлов, реестр, прогрев...) с длительностью
+    и статусом. Итог пишется в лог одной строкой JSON
+    и доступен через action=metrics.
+    """
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at or time.time()
+        self.finished_at: Optional[float] = None
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Замеряет этап; исключение записывается в отчет и пробрасывается дальше.
+        Внутри этапа можно дополнить запись через возвращаемый словарь.
+        """
+        record: Dict[str, Any] = {"status": "ok"}
+        self.stages[name] = record
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 3)
+
+    def record(self, name: str, seconds: float, status: str = "ok", **details):
+        """Добавляет этап, замеренный вне процесса (например, скриптом запуска)"""
+        self.stages[name] = {"status": status, "seconds": round(seconds, 3), **details}
+
+    def load_boot_stages(self):
+        """
+        Этапы скрипта запуска до обработчика: загрузка ComfyUI
+        (COMFY_STARTED_AT/COMFY_READY_AT) и отчет preflight
+        """
+        comfy_started, comfy_ready = _env_time("COMFY_STARTED_AT"), _env_time("COMFY_READY_AT")
+        if comfy_started and comfy_ready:
+            self.record("comfy_boot", comfy_ready - comfy_started)
+
+        preflight = load_report()
+        if preflight:
+            failed = [name for name, check in preflight["checks"].items() if check["status"] != "ok"]
+            self.record(
+                "preflight", preflight["total_seconds"], "error" if failed else "ok",
+                version=preflight.get("version"),
+                checks={name: check["seconds"] for name, check in preflight["checks"].items()},
+                cached=[name for name, check in preflight["checks"].items() if check.get("cached")],
+                failed=failed
+            )
+
+    def finish(self) -> Dict[str, Any]:
+        self.finished_at = time.time()
+        report = self.as_dict()
+        logger.info(f"Отчет о запуске: {json.dumps(report, ensure_ascii=False)}")
+        return report
+
+    def as_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "total_seconds": round(end - self.started_at, 3),
+            "ready": self.finished_at is not None,
+            "stages": self.stages
+        }
+
+
+_report: Optional[StartupReport] = None
+
+
+def get_startup_report() -> StartupReport:
+    """Отчет о запуске текущего процесса (отсчет - от старта контейнера, BOOT_STARTED_AT)"""
+    global _report
+    if _report is None:
+        _report = StartupReport(_env_time("BOOT_STARTED_AT"))
+        _report.load_boot_stages()
+    return _report
+
+
+def _env_time(name: str) -> Optional[float]:
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return None
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Доставка выходных файлов в S3-совместимое хранилище вместо base64 в ответе
+"""
+from typing import Dict, Any, Optional
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class S3Settings:
+    """
+    Настройки S3-совместимого хранилища.
+
+    Значения по умолчанию берутся из переменных окружения S3_*, запрос может
+    переопределить их через `output_storage`. Куда загружать (bucket,
+    endpoint_url, region) запрос меняет только вместе с собственными ключами
+    доступа: ключи воркера не подписывают загрузки на чужой хост или в
+    другой бакет. Без своих ключей переопределяются только PUBLIC поля.
+    """
+
+    ENV = {
+        "bucket": "S3_BUCKET",
+        "endpoint_url": "S3_ENDPOINT_URL",
+        "region": "S3_REGION",
+        "access_key_id": "S3_ACCESS_KEY_ID",
+        "secret_access_key": "S3_SECRET_ACCESS_KEY",
+        "prefix": "S3_PREFIX",
+        "url_expires": "S3_URL_EXPIRES",
+        "part_size_mb": "S3_PART_SIZE_MB",
+        "max_concurrency": "S3_MAX_CONCURRENCY",
+    }
+
+    # Поля, которые запрос может менять при ключах из окружения
+    PUBLIC = {"prefix", "url_expires", "part_size_mb", "max_concurrency"}
+    CREDENTIALS = ("access_key_id", "secret_access_key")
+
+    DEFAULTS = {
+        "prefix": "outputs",
+        "url_expires": 3600,
+        "part_size_mb": 8,
+        "max_concurrency": 8,
+    }
+
+    def __init__(self, **values):
+        self.bucket: Optional[str] = values.get("bucket")
+        self.endpoint_url: Optional[str] = values.get("endpoint_url")
+        self.region: Optional[str] = values.get("region")
+        self.access_key_id: Optional[str] = values.get("access_key_id")
+        self.secret_access_key: Optional[str] = values.get("secret_access_key")
+        self.prefix: str = (values.get("prefix") or self.DEFAULTS["prefix"]).strip("/")
+        self.url_expires = int(values.get("url_expires") or self.DEFAULTS["url_expires"])
+        self.part_size_mb = int(values.get("part_size_mb") or self.DEFAULTS["part_size_mb"])
+        self.max_concurrency = int(values.get("max_concurrency") or self.DEFAULTS["max_concurrency"])
+
+    @classmethod
+    def resolve(cls, overrides: Optional[Dict[str, Any]] = None) -> Optional["S3Settings"]:
+        """
+        Собирает настройки из окружения и запроса
+
+        Returns:
+            Настройки или None, если бакет не задан (файлы отдаются в base64)
+        """
+        settings = cls.from_env(overrides)
+        return settings if settings.bucket else None
+
+    @classmethod
+    def from_env(cls, overrides: Optional[Dict[str, Any]] = None) -> "S3Settings":
+        """
+        Настройки из окружения и запроса, в том числе без бакета (для чтения s3:// ссылок)
+
+        Raises:
+            ValueError: если запрос меняет bucket, endpoint_url или region
+                без собственной пары ключей доступа
+        """
+        values = {key: os.environ.get(env) for key, env in cls.ENV.items()}
+        overrides = {k: v for k, v in (overrides or {}).items() if k in cls.ENV and v is not None}
+        own_keys = [key for key in cls.CREDENTIALS if key in overrides]
+        if own_keys and len(own_keys) != len(cls.CREDENTIALS):
+            raise ValueError("output_storage должен содержать оба ключа: access_key_id и secret_access_key")
+        if not own_keys:
+            restricted = sorted(set(overrides) - cls.PUBLIC)
+            if restricted:
+                raise ValueError(
+                    f"output_storage: {', '.join(restricted)} можно переопределить "
+                    f"только с собственными access_key_id и secret_access_key"
+                )
+        values.update(overrides)
+        return cls(**values)
+
+    def client_key(self) -> tuple:
+        return (self.endpoint_url, self.region, self.access_key_id, self.secret_access_key)
+
+
+class S3OutputSink:
+    """Загружает файлы многопоточным multipart upload и выдает presigned URL"""
+
+    _clients: Dict[tuple, Any] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, settings: S3Settings):
+        self.settings = settings
+        self.client = self._get_client(settings)
+
+    @classmethod
+    def _get_client(cls, settings: S3Settings):
+        """boto3 клиент кэшируется: его создание занимает десятки миллисекунд"""
+        import boto3
+        from botocore.config import Config
+
+        key = settings.client_key()
+        with cls._clients_lock:
+            client = cls._clients.get(key)
+            if client is None:
+                client = boto3.client(
+                    "s3",
+                    endpoint_url=settings.endpoint_url,
+                    region_name=settings.region,
+                    aws_access_key_id=settings.access_key_id,
+                    aws_secret_access_key=settings.secret_access_key,
+                    config=Config(
+                        signature_version="s3v4",
+                        max_pool_connections=max(10, settings.max_concurrency * 2),
+                        retries={"max_attempts": 5, "mode": "adaptive"}
+                    )
+                )
+                cls._clients[key] = client
+            return client
+
+    def upload(self, path: str, key: str, content_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Загружает файл и возвращает ссылку на него
+
+        Args:
+            path: Локальный путь к файлу
+            key: Ключ объекта относительно префикса настроек
+            content_type: MIME тип (по умолчанию определяется по расширению)
+
+        Returns:
+            Словарь url, bucket, key, size, sha256
+        """
+        from boto3.s3.transfer import TransferConfig
+
+        part_size = self.settings.part_size_mb * 1024 * 1024
+        transfer_config = TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=self.settings.max_concurrency,
+            use_threads=True
+        )
+
+        object_key = f"{self.settings.prefix}/{key}" if self.settings.prefix else key
+        size = os.path.getsize(path)
+        sha256 = file_sha256(path)
+        content_type = content_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+        self.client.upload_file(
+            path,
+            self.settings.bucket,
+            object_key,
+            ExtraArgs={"ContentType": content_type, "Metadata": {"sha256": sha256}},
+            Config=transfer_config
+        )
+
+        url = self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.settings.bucket, "Key": object_key},
+            ExpiresIn=self.settings.url_expires
+        )
+        logger.info(f"Файл {os.path.basename(path)} ({size} байт) загружен в s3://{self.settings.bucket}/{object_key}")
+
+        return {
+            "url": url,
+            "bucket": self.settings.bucket,
+            "key": object_key,
+            "size": size,
+            "sha256": sha256,
+            "content_type": content_type,
+            "expires_in": self.settings.url_expires
+        }
+
+
+def file_sha256(path: str, block_size: int = 4 * 1024 * 1024) -> str:
+    """SHA-256 файла блоками, без чтения целиком в память"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_output_sink(overrides: Optional[Dict[str, Any]] = None) -> Optional[S3OutputSink]:
+    """
+    Возвращает приемник выходных файлов для запроса
+
+    Args:
+        overrides: Настройки из `output_storage` запроса; `{"type": "base64"}`
+            отключает загрузку даже при настроенном окружении
+
+    Returns:
+        S3OutputSink или None, если файлы нужно вернуть в base64
+    """
+    overrides = overrides or {}
+    if overrides.get("type", "s3") != "s3":
+        return None
+    settings = S3Settings.resolve(overrides)
+    return S3OutputSink(settings) if settings else None
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный уровень хранения моделей: копии моделей с сетевого volume на диске контейнера
+
+    python -m workflows.tier setup   # каталоги уровня и extra_model_paths.yaml для ComfyUI
+"""
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Optional, Callable, Iterable, List, Set, Tuple
+import fcntl
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from .disk import atomic_write, touch, scan_files, evict_lru
+from .results import MODEL_INPUTS
+from .scheduler import MODEL_LOADERS
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = "/comfyui/models"
+# Каталог локального уровня (пусто - уровень отключен, модели читаются с volume)
+TIER_DIR = os.environ.get("MODEL_TIER_DIR", "")
+TIER_MAX_GB = float(os.environ.get("MODEL_TIER_MAX_GB", "100"))
+EXTRA_PATHS_FILE = os.environ.get("MODEL_TIER_EXTRA_PATHS", "/comfyui/extra_model_paths.yaml")
+
+# ioctl FICLONE: reflink без копирования данных (btrfs/xfs, в пределах одной ФС)
+FICLONE = 0x40049409
+
+
+def model_files(models: Iterable[Tuple[Any, ...]]) -> Set[Tuple[str, ...]]:
+    """Файлы моделей из наборов планировщика: (имя файла, каталоги models...)"""
+    files = set()
+    for model in models:
+        keys = MODEL_LOADERS.get(model[0], ())
+        for key, value in zip(keys, model[1:]):
+            if key in MODEL_INPUTS and isinstance(value, str):
+                files.add((value,) + MODEL_INPUTS[key])
+    return files
+
+
+def extra_model_paths(tier_dir: str) -> str:
+    """
+    Конфигурация ComfyUI: каталоги уровня идут первыми (is_default), поэтому
+    готовая локальная копия используется вместо файла на volume
+    """
+    folders = sorted({folder for folders in MODEL_INPUTS.values() for folder in folders})
+    lines = ["model_tier:", f"    base_path: {tier_dir}", "    is_default: true"]
+    lines += [f"    {folder}: {folder}" for folder in folders]
+    return "\n".join(lines) + "\n"
+
+
+def setup(tier_dir: str = TIER_DIR, config_path: str = EXTRA_PATHS_FILE):
+    """Создает каталоги уровня, удаляет недокопированные файлы и пишет extra_model_paths.yaml"""
+    folders = {folder for folders in MODEL_INPUTS.values() for folder in folders}
+    for folder in folders:
+        os.makedirs(os.path.join(tier_dir, folder), exist_ok=True)
+    for root, _dirs, names in os.walk(tier_dir):
+        for name in names:
+            if name.startswith(".tmp-"):
+                os.remove(os.path.join(root, name))
+    atomic_write(config_path, extra_model_paths(tier_dir).encode("utf-8"))
+    logger.info(f"Локальный уровень моделей: {tier_dir} ({config_path})")
+
+
+class ModelTier:
+    """
+    Копирует нужные задачам модели с volume на локальный диск в фоне.
+
+    Копия пишется во временный файл и появляется под своим именем только
+    целиком (os.replace), так что ComfyUI, которому каталоги уровня
+    переданы первыми через extra_model_paths.yaml, никогда не загрузит
+    недокопированную модель: до этого момента файл читается с volume.
+
+    При нехватке бюджета вытесняются давно не использованные копии,
+    кроме моделей, которые нужны ожидающим и выполняющимся задачам.
+    """
+
+    def __init__(
+        self,
+        tier_dir: str,
+        source_dir: str = MODELS_DIR,
+        max_bytes: int = int(TIER_MAX_GB * 1024 ** 3),
+        needed: Optional[Callable[[], Iterable[Tuple[Any, ...]]]] = None
+    ):
+        self.tier_dir = tier_dir
+        self.source_dir = source_dir
+        self.max_bytes = max_bytes
+        self.needed = needed
+        os.makedirs(tier_dir, exist_ok=True)
+
+        self.hits = 0
+        self.copies = 0
+        self.copied_bytes = 0
+        self.evicted = 0
+        self.failed = 0
+
+        self._copying: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        # Копирование по одному файлу: параллельные копии делят одну полосу сети
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tier")
+
+    def request(self, models: Iterable[Tuple[Any, ...]]) -> List[Future]:
+        """
+        Модели графа (набор планировщика) должны оказаться на локальном диске
+
+        Returns:
+            Future копирования для моделей, которых еще нет в уровне
+        """
+        futures = []
+        for entry in model_files(models):
+            relpath = self._source(entry)
+            if relpath is None:
+                continue
+            local = os.path.join(self.tier_dir, relpath)
+            if os.path.isfile(local) and os.path.getsize(local) != os.path.getsize(os.path.join(self.source_dir, relpath)):
+                # Модель на volume заменена - устаревшая копия не должна загружаться
+                logger.info(f"Локальная копия {relpath} устарела, копируется заново")
+                os.remove(local)
+            if os.path.isfile(local):
+                touch(local)
+                with self._lock:
+                    self.hits += 1
+                continue
+            with self._lock:
+                future = self._copying.get(relpath)
+                if future is None:
+                    future = self._copying[relpath] = self._executor.submit(self._copy, relpath)
+            futures.append(future)
+        return futures
+
+    def stats(self) -> Dict[str, Any]:
+        files = scan_files(self.tier_dir)
+        with self._lock:
+            return {
+                "files": len(files),
+                "bytes": sum(size for _path, size, _used in files),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "copies": self.copies,
+                "copied_bytes": self.copied_bytes,
+                "evicted": self.evicted,
+                "failed": self.failed,
+                "copying": sorted(self._copying)
+            }
+
+    def _source(self, entry: Tuple[str, ...]) -> Optional[str]:
+        """Путь модели относительно models/ (каталог, где ее находит ComfyUI) или None"""
+        name, folders = entry[0], entry[1:]
+        for folder in folders:
+            if os.path.isfile(os.path.join(self.source_dir, folder, name)):
+                return os.path.join(folder, name)
+        return None
+
+    def _protected(self) -> Set[str]:
+        if self.needed is None:
+            return set()
+        return {
+            os.path.join(self.tier_dir, relpath)
+            for relpath in map(self._source, model_files(self.needed())) if relpath
+        }
+
+    def _copy(self, relpath: str):
+        source = os.path.join(self.source_dir, relpath)
+        target = os.path.join(self.tier_dir, relpath)
+        try:
+            size = os.path.getsize(source)
+            if not self._make_room(size):
+                logger.info(f"Модель {relpath} не помещается в локальный уровень, читается с volume")
+                return
+
+            start = time.perf_counter()
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".tmp-")
+            try:
+                with open(source, "rb") as src, os.fdopen(fd, "wb") as dst:
+                    try:
+                        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                    except OSError:
+                        shutil.copyfileobj(src, dst, 16 * 1024 * 1024)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                if os.path.getsize(tmp_path) != size:
+                    raise OSError(f"размер копии не совпадает с исходным ({size} байт)")
+                os.replace(tmp_path, target)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.copies += 1
+                self.copied_bytes += size
+            logger.info(
+                f"Модель {relpath} скопирована на локальный диск: {size / 1024 ** 3:.1f} ГБ"
+                f" за {elapsed:.1f}с ({size / 1024 ** 2 / max(elapsed, 1e-6):.0f} МБ/с)"
+            )
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logger.warning(f"Не удалось скопировать модель {relpath}: {e}")
+        finally:
+            with self._lock:
+                self._copying.pop(relpath, None)
+
+    def _make_room(self, size: int) -> bool:
+        """Вытесняет старые копии (кроме нужных задачам), чтобы поместился файл size байт"""
+        protected = self._protected()
+        entries = scan_files(self.tier_dir)
+        protected_bytes = sum(entry[1] for entry in entries if entry[0] in protected)
+        budget = self.max_bytes - protected_bytes - size
+        if budget < 0:
+            return False
+
+        removed, _freed = evict_lru([entry for entry in entries if entry[0] not in protected], budget)
+        with self._lock:
+            self.evicted += removed
+        return shutil.disk_usage(self.tier_dir).free >= size
+
+
+_tier: Optional[ModelTier] = None
+
+
+def get_model_tier(needed: Optional[Callable[[], Iterable[Tuple[Any, ...]]]] = None) -> Optional[ModelTier]:
+    """Общий локальный уровень моделей (None, если MODEL_TIER_DIR не задан)"""
+    global _tier
+    if _tier is None and TIER_DIR:
+        _tier = ModelTier(TIER_DIR, needed=needed)
+    return _tier
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if TIER_DIR and sys.argv[1:] == ["setup"]:
+        setup()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Разбивка времени задачи по этапам и по узлам графа
+"""
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class JobTimings:
+    """
+    Длительность этапов задачи (входные файлы, подготовка графа, ожидание
+    планировщика и очереди ComfyUI, выполнение, сбор и доставка файлов)
+    и время выполнения каждого узла по событиям сокета ComfyUI.
+
+    Время узла - от его события `executing` до следующего `executing`
+    (следующий узел или завершение задачи); узлы из кэша ComfyUI
+    отмечаются отдельно. Итог попадает в metadata.timings ответа
+    и одной строкой JSON в лог.
+    """
+
+    def __init__(self, workflow: Optional[Dict[str, Any]] = None):
+        self.workflow = workflow or {}
+        self.started_at = time.time()
+        self.stages: Dict[str, float] = {}
+
+        self.queued_at: Optional[float] = None
+        self.execution_started_at: Optional[float] = None
+        self.execution_finished_at: Optional[float] = None
+        self.nodes: Dict[str, float] = {}
+        self.cached_nodes: List[str] = []
+        self._current: Optional[str] = None
+        self._current_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замеряет этап; повторные замеры одного этапа складываются"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def queued(self):
+        """Граф поставлен в очередь ComfyUI - отсюда считается ожидание очереди"""
+        self.queued_at = time.time()
+
+    def on_event(self, msg_type: str, data: Dict[str, Any]):
+        """Обработчик событий сокета задачи (вызывается из потока трекера)"""
+        now = time.time()
+        with self._lock:
+            if msg_type == "execution_start":
+                self.execution_started_at = now
+            elif msg_type == "execution_cached":
+                self.cached_nodes.extend(str(node) for node in data.get("nodes") or [])
+            elif msg_type == "executing":
+                if self.execution_started_at is None:
+                    self.execution_started_at = now
+                if self._current is not None:
+                    self.nodes[self._current] = self.nodes.get(self._current, 0.0) + now - self._current_since
+                node = data.get("node")
+                self._current, self._current_since = (str(node), now) if node is not None else (None, None)
+                if node is None:
+                    self.execution_finished_at = now
+
+    def apply_history(self, result: Optional[Dict[str, Any]]):
+        """
+        Дополняет тайминги сообщениями из записи /history (если события сокета
+        не дошли): время выполнения по меткам ComfyUI и узлы из кэша
+        """
+        messages = ((result or {}).get("status") or {}).get("messages") or []
+        stamps = {}
+        for msg_type, data in messages:
+            if isinstance(data, dict) and "timestamp" in data:
+                stamps[msg_type] = data["timestamp"] / 1000.0
+            if msg_type == "execution_cached" and not self.cached_nodes:
+                self.cached_nodes = [str(node) for node in data.get("nodes") or []]
+        if self.execution_started_at is None and "execution_start" in stamps:
+            self.execution_started_at = stamps["execution_start"]
+            finished = stamps.get("execution_success") or stamps.get("execution_error")
+            if finished:
+                self.execution_finished_at = finished
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = dict(self.stages)
+            if self.queued_at and self.execution_started_at:
+                stages["queue_wait"] = max(0.0, self.execution_started_at - self.queued_at)
+            if self.execution_started_at and self.execution_finished_at:
+                stages["execution"] = self.execution_finished_at - self.execution_started_at
+
+            nodes = {}
+            by_class: Dict[str, float] = {}
+            for node_id, seconds in sorted(self.nodes.items(), key=lambda item: -item[1]):
+                class_type = (self.workflow.get(node_id) or {}).get("class_type")
+                nodes[node_id] = {"class_type": class_type, "seconds": round(seconds, 3)}
+                by_class[class_type] = by_class.get(class_type, 0.0) + seconds
+            for node_id in self.cached_nodes:
+                nodes.setdefault(node_id, {
+                    "class_type": (self.workflow.get(node_id) or {}).get("class_type"),
+                    "cached": True
+                })
+
+        return {
+            "total_seconds": round(time.time() - self.started_at, 3),
+            "stages": {name: round(seconds, 3) for name, seconds in stages.items()},
+            "nodes": nodes,
+            "by_class": {name: round(seconds, 3) for name, seconds in sorted(by_class.items(), key=lambda item: -item[1])}
+        }
+
+    def log(self, job_id: Optional[str], prompt_id: Optional[str] = None) -> Dict[str, Any]:
+        """Пишет тайминги задачи одной строкой JSON и возвращает их"""
+        timings = self.as_dict()
+        record = {"job_id": job_id, "prompt_id": prompt_id, **timings}
+        logger.info(f"Тайминги задачи: {json.dumps(record, ensure_ascii=False)}")
+        return timings
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+Отслеживание завершения задач ComfyUI через WebSocket (/ws?clientId=)
+с откатом на адаптивный опрос /history при обрыве соединения
+"""
+from typing import Dict, Any, Optional, Callable, List
+import json
+import logging
+import threading
+import time
+import uuid
+
+import requests
+
+from .client import ComfyClient, ComfyAPIError
+
+try:
+    import websocket  # websocket-client
+except ImportError:  # pragma: no cover - зависимость опциональна
+    websocket = None
+
+logger = logging.getLogger(__name__)
+
+
+class _PromptState:
+    """Состояние одной задачи, собранное из сообщений сокета"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Optional[Dict[str, Any]] = None
+        self.interrupted = False
+        self.current_node: Optional[str] = None
+        self.cached_nodes = []
+        self.executed_nodes = []
+        self.listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self.updated_at = time.time()
+
+
+class CompletionTracker:
+    """
+    Подписывается на поток событий ComfyUI и завершает ожидание задачи
+    в момент прихода `executing` с `node: null` для её prompt_id.
+
+    Один экземпляр обслуживает все задачи процесса: задачи нужно ставить
+    в очередь с `client_id` трекера, иначе ComfyUI не пришлет по ним события.
+    """
+
+    # Пределы адаптивного опроса /history при недоступном сокете
+    MIN_POLL_INTERVAL = 0.25
+    MAX_POLL_INTERVAL = 5.0
+
+    # Как часто перепроверять /history при живом сокете (страховка от потерянных сообщений)
+    SAFETY_CHECK_INTERVAL = 30.0
+
+    RECONNECT_MIN_DELAY = 0.5
+    RECONNECT_MAX_DELAY = 10.0
+
+    # Сколько хранить состояния задач, которых никто не ждет
+    STATE_TTL = 3600
+
+    def __init__(self, client: ComfyClient, client_id: Optional[str] = None):
+        self.client = client
+        self.base_url = client.base_url
+        self.client_id = client_id or uuid.uuid4().hex
+        self.queue_remaining: Optional[int] = None
+
+        self._states: Dict[str, _PromptState] = {}
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ws = None
+
+    @property
+    def ws_url(self) -> str:
+        scheme, _, rest = self.base_url.partition("://")
+        ws_scheme = "wss" if scheme == "https" else "ws"
+        return f"{ws_scheme}://{rest}/ws?clientId={self.client_id}"
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def start(self):
+        """Запускает фоновый поток чтения сокета (идемпотентно)"""
+        if websocket is None:
+            logger.warning("websocket-client не установлен, используем только опрос /history")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="comfy-ws", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает поток чтения сокета"""
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def wait(
+        self,
+        prompt_id: str,
+        timeout: float = 600,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Ждет завершения задачи и возвращает её запись из /history
+
+        Args:
+            prompt_id: Идентификатор задачи ComfyUI
+            timeout: Максимальное время ожидания в секундах
+            on_event: Колбэк (тип, data) для событий задачи из сокета
+                (execution_start, executing, progress, executed, ...);
+                вызывается из потока сокета
+
+        Returns:
+            Запись history для prompt_id
+        """
+        state = self._get_state(prompt_id)
+        if on_event is not None:
+            state.listeners.append(on_event)
+        deadline = time.time() + timeout
+        poll_interval = self.MIN_POLL_INTERVAL
+        last_check = time.time()
+
+        try:
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"Генерация не завершилась за {timeout} секунд")
+
+                if self.connected:
+                    poll_interval = self.MIN_POLL_INTERVAL
+                    if state.done.wait(min(remaining, 1.0)):
+                        break
+                    if time.time() - last_check < self.SAFETY_CHECK_INTERVAL:
+                        continue
+                elif state.done.wait(min(remaining, poll_interval)):
+                    break
+                else:
+                    poll_interval = min(poll_interval * 2, self.MAX_POLL_INTERVAL)
+
+                last_check = time.time()
+                result = self._check_history(prompt_id)
+                if result is not None:
+                    return result
+
+            self._raise_if_failed(state)
+            return self._fetch_result(prompt_id, deadline)
+        finally:
+            self._forget(prompt_id)
+
+    # ------------------------------------------------------------------
+    # Обработка сообщений сокета
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        delay = self.RECONNECT_MIN_DELAY
+        while not self._stop.is_set():
+            try:
+                self._ws = websocket.create_connection(self.ws_url, timeout=10)
+                self._ws.settimeout(self.SAFETY_CHECK_INTERVAL)
+                self._connected.set()
+                delay = self.RECONNECT_MIN_DELAY
+                logger.info(f"WebSocket ComfyUI подключен: clientId={self.client_id}")
+
+                while not self._stop.is_set():
+                    try:
+                        message = self._ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    if isinstance(message, str):
+                        self.handle_message(message)
+                    # Бинарные сообщения - превью кадров, они нам не нужны
+
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning(f"WebSocket ComfyUI недоступен ({e}), переходим на опрос /history")
+            finally:
+                self._connected.clear()
+                if self._ws is not None:
+                    try:
+                        self._ws.close()
+                    except Exception:
+                        pass
+                    self._ws = None
+
+            self._stop.wait(delay)
+            delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+
+    def handle_message(self, raw: str):
+        """Разбирает одно текстовое сообщение сокета ComfyUI"""
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+
+        msg_type = message.get("type")
+        data = message.get("data") or {}
+
+        if msg_type == "status":
+            exec_info = data.get("status", {}).get("exec_info", {})
+            if "queue_remaining" in exec_info:
+                self.queue_remaining = exec_info["queue_remaining"]
+            return
+
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+
+        state = self._get_state(prompt_id)
+        state.updated_at = time.time()
+
+        # Слушатели получают событие до сигнала о завершении, чтобы не потерять последние
+        for listener in list(state.listeners):
+            try:
+                listener(msg_type, data)
+            except Exception as e:
+                logger.warning(f"Ошибка обработчика события {msg_type}: {e}")
+
+        if msg_type == "executing":
+            node = data.get("node")
+            state.current_node = node
+            if node is None:
+                state.done.set()
+        elif msg_type == "execution_cached":
+            state.cached_nodes.extend(data.get("nodes") or [])
+        elif msg_type == "executed":
+            state.executed_nodes.append(data.get("node"))
+        elif msg_type == "execution_error":
+            state.error = data
+            state.done.set()
+        elif msg_type == "execution_interrupted":
+            state.interrupted = True
+            state.done.set()
+
+    # ------------------------------------------------------------------
+    # Вспомогательные методы
+    # ------------------------------------------------------------------
+
+    def _get_state(self, prompt_id: str) -> _PromptState:
+        with self._lock:
+            state = self._states.get(prompt_id)
+            if state is None:
+                self._prune_states()
+                state = self._states[prompt_id] = _PromptState()
+            return state
+
+    def _forget(self, prompt_id: str):
+        with self._lock:
+            self._states.pop(prompt_id, None)
+
+    def _prune_states(self):
+        """Удаляет состояния, по которым давно нет событий и никто не ждет"""
+        threshold = time.time() - self.STATE_TTL
+        for prompt_id in [p for p, s in self._states.items() if s.updated_at < threshold]:
+            del self._states[prompt_id]
+
+    @staticmethod
+    def _raise_if_failed(state: _PromptState):
+        if state.error is not None:
+            error = state.error
+            raise Exception(
+                f"Ошибка генерации в узле {error.get('node_id')} ({error.get('node_type')}): "
+                f"{error.get('exception_message', error)}"
+            )
+        if state.interrupted:
+            raise Exception("Генерация прервана")
+
+    def _get_history(self, prompt_id: str) -> Optional[Dict[str, Any]]:
+        return self.client.get_history(prompt_id).get(prompt_id)
+
+    def _check_history(self, prompt_id: str) -> Optional[Dict[str, Any]]:
+        """Проверяет /history и возвращает результат, если задача завершилась"""
+        try:
+            result = self._get_history(prompt_id)
+        except (requests.exceptions.RequestException, ComfyAPIError) as e:
+            logger.warning(f"Ошибка проверки статуса: {e}")
+            return None
+
+        if not result:
+            return None
+        status = result.get("status", {})
+        if status.get("status_str") == "error" or "error" in status:
+            raise Exception(f"Ошибка генерации: {status.get('error', status.get('messages'))}")
+        if status.get("completed", False):
+            return result
+        return None
+
+    def _fetch_result(self, prompt_id: str, deadline: float) -> Dict[str, Any]:
+        """Забирает запись history после сигнала о завершении из сокета"""
+        delay = 0.05
+        while time.time() < deadline:
+            result = self._check_history(prompt_id)
+            if result is not None:
+                return result
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        raise TimeoutError(f"История задачи {prompt_id} не появилась в /history")
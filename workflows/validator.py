@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка подготовленного графа по описаниям узлов /object_info до постановки в очередь
+"""
+from typing import Dict, Any, Optional, List, Set
+import logging
+import os
+import threading
+
+from .graph import is_link
+from .models import MODELS_DIR
+from .object_info import ObjectInfoStore
+from .results import MODEL_INPUTS
+from .scheduler import MODEL_LOADERS
+
+logger = logging.getLogger(__name__)
+
+PREFLIGHT_VALIDATION = os.environ.get("PREFLIGHT_VALIDATION", "1") == "1"
+# Ошибок в одном сообщении (остальные только считаются)
+MAX_REPORTED_ERRORS = 20
+
+
+def _input_spec(spec: Dict[str, Any], name: str) -> Optional[list]:
+    section = spec.get("input") or {}
+    for kind in ("required", "optional"):
+        entry = (section.get(kind) or {}).get(name)
+        if entry is not None:
+            return entry if isinstance(entry, list) else [entry]
+    return None
+
+
+def _types_compatible(source: str, target: str) -> bool:
+    if "*" in (source, target) or source == target:
+        return True
+    return bool(set(source.split(",")) & set(target.split(",")))
+
+
+class WorkflowValidator:
+    """
+    Проверяет граф так же, как ComfyUI при /prompt, но до GPU и сети:
+    существование типов узлов, обязательные входы, значения списков
+    (для имен моделей - наличие файла на volume), границы чисел и
+    совместимость типов по ссылкам. Возвращает все ошибки сразу.
+
+    Работает только по описаниям установленного ComfyUI (живой ответ
+    или снимок той же версии): снимок из пакета может не совпадать
+    с установленными custom nodes, и с ним проверка пропускается.
+    """
+
+    def __init__(self, store: ObjectInfoStore, models_dir: str = MODELS_DIR):
+        self.store = store
+        self.models_dir = models_dir
+        # Найденные файлы моделей; отсутствующие проверяются заново (их могут докачать)
+        self._present: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def validate(self, workflow: Dict[str, Any]) -> List[str]:
+        """Список ошибок графа (пустой, если граф корректен или описаний нет)"""
+        object_info = self.store.installed()
+        if not object_info:
+            return []
+
+        errors = []
+        for node_id, node_data in workflow.items():
+            if not isinstance(node_data, dict):
+                continue
+            class_type = node_data.get("class_type")
+            spec = object_info.get(class_type)
+            where = f"узел {node_id} ({class_type})"
+            if spec is None:
+                errors.append(f"{where}: тип узла не установлен в ComfyUI")
+                continue
+
+            inputs = node_data.get("inputs") or {}
+            for name in (spec.get("input") or {}).get("required") or {}:
+                if name not in inputs:
+                    errors.append(f"{where}: нет обязательного входа '{name}'")
+
+            for name, value in inputs.items():
+                input_spec = _input_spec(spec, name)
+                if input_spec is None:
+                    continue
+                if is_link(value):
+                    error = self._check_link(workflow, object_info, value, input_spec)
+                else:
+                    error = self._check_value(class_type, name, value, input_spec)
+                if error:
+                    errors.append(f"{where}, вход '{name}': {error}")
+        return errors
+
+    def check(self, workflow: Dict[str, Any]):
+        """
+        Raises:
+            ValueError: со всеми ошибками графа
+        """
+        errors = self.validate(workflow)
+        if errors:
+            shown = "; ".join(errors[:MAX_REPORTED_ERRORS])
+            more = f" (и еще {len(errors) - MAX_REPORTED_ERRORS})" if len(errors) > MAX_REPORTED_ERRORS else ""
+            raise ValueError(f"Граф не прошел проверку ({len(errors)} ошибок): {shown}{more}")
+
+    def _check_link(self, workflow: Dict[str, Any], object_info: Dict[str, Any], link: list, input_spec: list) -> Optional[str]:
+        source_id, slot = str(link[0]), link[1]
+        source = workflow.get(source_id)
+        if not isinstance(source, dict):
+            return f"ссылка на отсутствующий узел {source_id}"
+        source_spec = object_info.get(source.get("class_type"))
+        if source_spec is None:
+            # Ошибка уже записана для самого узла-источника
+            return None
+        outputs = source_spec.get("output") or []
+        if not 0 <= slot < len(outputs):
+            return f"у узла {source_id} нет выхода {slot}"
+        target_type = input_spec[0]
+        source_type = outputs[slot]
+        if isinstance(target_type, str) and isinstance(source_type, str) and not _types_compatible(source_type, target_type):
+            return f"выход {source_id}:{slot} типа {source_type}, ожидается {target_type}"
+        return None
+
+    def _check_value(self, class_type: str, name: str, value: Any, input_spec: list) -> Optional[str]:
+        kind = input_spec[0]
+        options = input_spec[1] if len(input_spec) > 1 and isinstance(input_spec[1], dict) else {}
+        if kind == "COMBO":
+            kind = options.get("options") or []
+
+        # Список моделей в снимке мог устареть - проверяем сам файл
+        if name in MODEL_INPUTS and name in MODEL_LOADERS.get(class_type, ()) and isinstance(value, str):
+            return None if self._model_present(name, value) else f"файл модели '{value}' не найден на volume"
+
+        if isinstance(kind, list):
+            # Имена загруженных файлов и пустые списки снимка не проверяем
+            if not kind or any(key.endswith("_upload") for key in options):
+                return None
+            if value not in kind:
+                return f"значение '{value}' не из списка ({', '.join(map(str, kind[:10]))}{'...' if len(kind) > 10 else ''})"
+            return None
+
+        if kind in ("INT", "FLOAT"):
+            if isinstance(value, bool):
+                return f"ожидается {kind}, получено {value!r}"
+            try:
+                number = int(value) if kind == "INT" else float(value)
+            except (TypeError, ValueError):
+                return f"ожидается {kind}, получено {value!r}"
+            if "min" in options and number < options["min"]:
+                return f"значение {number} меньше минимума {options['min']}"
+            if "max" in options and number > options["max"]:
+                return f"значение {number} больше максимума {options['max']}"
+        return None
+
+    def _model_present(self, name: str, value: str) -> bool:
+        for folder in MODEL_INPUTS[name]:
+            path = os.path.join(self.models_dir, folder, value)
+            with self._lock:
+                if path in self._present:
+                    return True
+            if os.path.isfile(path):
+                with self._lock:
+                    self._present.add(path)
+                return True
+        return False
+
+
+_validator: Optional[WorkflowValidator] = None
+
+
+def get_validator() -> Optional[WorkflowValidator]:
+    """Общий валидатор воркфлоу (None, если проверка выключена PREFLIGHT_VALIDATION=0)"""
+    global _validator
+    if not PREFLIGHT_VALIDATION:
+        return None
+    if _validator is None:
+        from .object_info import get_object_info_store
+
+        _validator = WorkflowValidator(get_object_info_store())
+    return _validator
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Прогрев воркера при старте: минимальный прогон воркфлоу из реестра
+"""
+from typing import Dict, Any, Callable, Optional
+import logging
+import os
+
+from .inputs import get_input_store
+from .outputs import collect_output_files
+from .registry import WorkflowRegistry
+
+logger = logging.getLogger(__name__)
+
+# Имя воркфлоу реестра для прогрева (пусто - прогрев отключен)
+WARMUP_WORKFLOW = os.environ.get("WARMUP_WORKFLOW", "")
+WARMUP_SIZE = int(os.environ.get("WARMUP_SIZE", "256"))
+# Для WAN длина видео должна быть 4n+1
+WARMUP_FRAMES = int(os.environ.get("WARMUP_FRAMES", "5"))
+WARMUP_TIMEOUT = float(os.environ.get("WARMUP_TIMEOUT", "900"))
+
+WARMUP_PREFIX = "warmup"
+# Конец последнего отрезка семплирования ("до конца")
+LAST_STEP = 10000
+
+
+def minimal_workflow(entry, size: int = WARMUP_SIZE, frames: int = WARMUP_FRAMES) -> Dict[str, Any]:
+    """
+    Минимальная версия воркфлоу реестра: те же загрузчики моделей и узлы,
+    но каждый семплер делает один шаг, разрешение size×size, frames кадров,
+    фиксированный сид и заглушка вместо входного изображения
+
+    Raises:
+        ValueError: если воркфлоу требует входное видео
+    """
+    plan = entry.plan
+    if plan.video_nodes:
+        raise ValueError(f"Воркфлоу '{entry.name}' требует входное видео и не подходит для прогрева")
+
+    image_filename = get_input_store().placeholder(size, size) if plan.image_nodes else None
+    workflow = plan.apply(entry.workflow, image_filename=image_filename, output_prefix=WARMUP_PREFIX)
+
+    patches: Dict[str, Dict[str, Any]] = {}
+    for name in ("width", "height"):
+        for node_id in plan.by_input.get(name, []):
+            patches.setdefault(node_id, {})[name] = size
+    for class_type, node_ids in plan.by_class.items():
+        if class_type.startswith("Empty") and "Latent" in class_type:
+            for node_id in node_ids:
+                inputs = workflow[node_id].get("inputs") or {}
+                if "length" in inputs:
+                    patches.setdefault(node_id, {})["length"] = frames
+                if "batch_size" in inputs:
+                    patches.setdefault(node_id, {})["batch_size"] = 1
+    for node_id, field in plan.seed_fields:
+        patches.setdefault(node_id, {})[field] = 0
+
+    # Цепочка KSamplerAdvanced (high/low noise) - по одному шагу на семплер,
+    # чтобы загрузились и скомпилировались все UNET
+    advanced = sorted(
+        plan.by_class.get("KSamplerAdvanced", []),
+        key=lambda node_id: _as_int(workflow[node_id]["inputs"].get("start_at_step"))
+    )
+    for index, node_id in enumerate(advanced):
+        patches.setdefault(node_id, {}).update({
+            "steps": len(advanced),
+            "start_at_step": index,
+            "end_at_step": index + 1 if index + 1 < len(advanced) else LAST_STEP
+        })
+    for node_id in plan.by_class.get("KSampler", []):
+        patches.setdefault(node_id, {})["steps"] = 1
+
+    for node_id, values in patches.items():
+        node = workflow[node_id]
+        workflow[node_id] = {**node, "inputs": {**(node.get("inputs") or {}), **values}}
+    return workflow
+
+
+def warm_up(
+    registry: WorkflowRegistry,
+    execute: Callable[[Dict[str, Any], float], Dict[str, Any]],
+    name: Optional[str] = None,
+    timeout: float = WARMUP_TIMEOUT
+) -> Dict[str, Any]:
+    """
+    Прогоняет минимальную версию воркфлоу, чтобы ComfyUI загрузил модели
+    и скомпилировал ядра до первой задачи; выходные файлы удаляются
+
+    Args:
+        registry: Реестр воркфлоу
+        execute: Выполняет граф и возвращает запись history (граф, таймаут)
+        name: Имя воркфлоу (по умолчанию WARMUP_WORKFLOW)
+
+    Returns:
+        Сведения для отчета о запуске
+    """
+    name = name or WARMUP_WORKFLOW
+    entry = registry.get(name)
+    workflow = minimal_workflow(entry)
+    logger.info(f"Прогрев: {name} ({entry.version}), {WARMUP_SIZE}px, {WARMUP_FRAMES} кадров")
+
+    result = execute(workflow, timeout)
+
+    removed = 0
+    for file_info in collect_output_files(result, include_temp=True):
+        try:
+            os.remove(file_info["path"])
+            removed += 1
+        except OSError:
+            pass
+    return {"workflow": name, "version": entry.version, "outputs_removed": removed}
+
+
+def _as_int(value: Any) -> int:
+    return value if isinstance(value, int) else 0